@@ -2,13 +2,14 @@
 from rest_framework import permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.db.models import Count, Sum, Q
+from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import timedelta
 from users.models import User
 from projects.models import Project, ProjectCategory, ProjectTemplate
 from proposals.models import Proposal
 from payments.models import Transaction, Escrow
+from payments.fx import base_currency, converted_totals, unconverted_report
 from skills.models import (
     Skill, SkillCategory, UserSkill, SkillAssessment,
     AssessmentQuestion, QuestionOption
@@ -49,20 +50,22 @@ def admin_dashboard_stats(request):
 
     # Financial Statistics
     total_transactions = Transaction.objects.filter(status='completed').count()
-    total_revenue = Transaction.objects.filter(
+    # Amounts are converted to the base currency in SQL before summing; amounts
+    # in currencies without a rate are reported separately rather than dropped
+    total_revenue, unconverted_revenue = converted_totals(Transaction.objects.filter(
         status='completed',
         transaction_type__in=['commission', 'escrow_hold']
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    ), 'amount')
 
-    total_payments = Transaction.objects.filter(
+    total_payments, unconverted_payments = converted_totals(Transaction.objects.filter(
         status='completed',
         transaction_type='escrow_release'
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    ), 'amount')
 
     active_escrows = Escrow.objects.filter(status__in=['funded', 'in_progress']).count()
-    total_escrow_amount = Escrow.objects.filter(
+    total_escrow_amount, unconverted_escrow_amount = converted_totals(Escrow.objects.filter(
         status__in=['funded', 'in_progress']
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    ), 'amount')
 
     # Skill Statistics
     total_skills = Skill.objects.count()
@@ -95,11 +98,17 @@ def admin_dashboard_stats(request):
             'pending': pending_proposals
         },
         'financial': {
+            'currency': base_currency(),
             'total_revenue': float(total_revenue),
             'total_payments': float(total_payments),
             'active_escrows': active_escrows,
             'total_escrow_amount': float(total_escrow_amount or 0),
-            'total_transactions': total_transactions
+            'total_transactions': total_transactions,
+            'unconverted': unconverted_report(
+                total_revenue=unconverted_revenue,
+                total_payments=unconverted_payments,
+                total_escrow_amount=unconverted_escrow_amount,
+            ),
         },
         'skills': {
             'total_skills': total_skills,
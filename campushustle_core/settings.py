@@ -110,10 +110,14 @@ TIME_ZONE = "UTC"
 USE_I18N = True
 USE_TZ = True
 
+# Reverse proxies in front of the app. X-Forwarded-For is only trusted when this
+# is set, so client IPs (e.g. for the login throttles) cannot be spoofed.
+NUM_PROXIES = os.environ.get("NUM_PROXIES")
+
 # REST Framework configuration
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
@@ -121,6 +125,7 @@ REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ("django_filters.rest_framework.DjangoFilterBackend",),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
+    "NUM_PROXIES": int(NUM_PROXIES) if NUM_PROXIES else None,
 }
 
 # JWT Settings
@@ -129,8 +134,33 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
+    # Revocation goes through users.revocation rather than the token_blacklist app
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.TokenRefreshSerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "users.serializers.TokenBlacklistSerializer",
+}
+
+# Token-bucket throttles for login and verification codes (users.throttling):
+# {scope: (burst capacity, seconds to refill it)}. Point AUTH_THROTTLE_CACHE at a
+# shared cache in production so the buckets hold across workers.
+AUTH_THROTTLE_CACHE = os.environ.get("AUTH_THROTTLE_CACHE", "default")
+AUTH_THROTTLE_RATES = {
+    "login_ip": (20, 60),
+    "login_account": (10, 600),
+    "send_code_ip": (5, 600),
+    "send_code_email": (3, 600),
+    "verify_code_ip": (10, 60),
+    "verify_code_email": (5, 600),
 }
 
+# Bloom filter of revoked refresh tokens (users.revocation)
+TOKEN_BLACKLIST_BLOOM_CAPACITY = int(os.environ.get("TOKEN_BLACKLIST_BLOOM_CAPACITY", 1000000))
+TOKEN_BLACKLIST_BLOOM_ERROR_RATE = float(os.environ.get("TOKEN_BLACKLIST_BLOOM_ERROR_RATE", 0.001))
+TOKEN_BLACKLIST_SYNC_SECONDS = int(os.environ.get("TOKEN_BLACKLIST_SYNC_SECONDS", 5))
+TOKEN_BLACKLIST_REBUILD_SECONDS = int(os.environ.get("TOKEN_BLACKLIST_REBUILD_SECONDS", 3600))
+
+# How long an authenticated user and their profile stay cached between requests
+AUTH_USER_CACHE_SECONDS = int(os.environ.get("AUTH_USER_CACHE_SECONDS", 60))
+
 # CORS Settings
 # CORS Settings - EXPAND THESE
 CORS_ALLOWED_ORIGINS = [
@@ -178,3 +208,19 @@ EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER", "")
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD", "")
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Currency that mixed-currency payment totals are converted into (see payments.fx)
+FX_BASE_CURRENCY = os.environ.get("FX_BASE_CURRENCY", "USD")
+
+# Payment gateway backend and webhook signing (see payments.gateways)
+PAYMENT_GATEWAY = os.environ.get("PAYMENT_GATEWAY", "payments.gateways.SimulatorGateway")
+PAYMENT_WEBHOOK_SECRET = os.environ.get("PAYMENT_WEBHOOK_SECRET", SECRET_KEY)
+PAYMENT_SIMULATOR_FAILURE_RATE = float(os.environ.get("PAYMENT_SIMULATOR_FAILURE_RATE", 0))
+
+# Real-time event stream (see messaging.events). LocalTransport wakes streams in
+# the publishing process only; RedisTransport fans wake-ups out to every worker.
+MESSAGING_EVENT_TRANSPORT = os.environ.get("MESSAGING_EVENT_TRANSPORT", "messaging.events.LocalTransport")
+MESSAGING_EVENT_REDIS_URL = os.environ.get("MESSAGING_EVENT_REDIS_URL", "redis://localhost:6379/0")
+
+# Messages older than this, in conversations idle since then, move to the archive tier
+MESSAGE_ARCHIVE_AFTER_DAYS = int(os.environ.get("MESSAGE_ARCHIVE_AFTER_DAYS", 180))
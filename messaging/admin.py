@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Conversation, Message, MessageReadReceipt
+from .conversations import refresh_participant_key
+from .models import Conversation, Message, MessageReadReceipt, InboxEntry, ConversationReadState, MessageArchiveSegment
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
@@ -7,6 +8,10 @@ class ConversationAdmin(admin.ModelAdmin):
     list_filter = ['created_at', 'last_message_at']
     search_fields = ['subject']
     filter_horizontal = ['participants']
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        refresh_participant_key(form.instance)
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
@@ -20,3 +25,21 @@ class MessageReadReceiptAdmin(admin.ModelAdmin):
     list_display = ['message', 'reader', 'read_at']
     list_filter = ['read_at']
     search_fields = ['message__content', 'reader__username']
+
+@admin.register(InboxEntry)
+class InboxEntryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'conversation', 'unread_count', 'last_message_at']
+    search_fields = ['user__username']
+    raw_id_fields = ['user', 'conversation', 'last_message']
+
+@admin.register(ConversationReadState)
+class ConversationReadStateAdmin(admin.ModelAdmin):
+    list_display = ['user', 'conversation', 'last_read_message_id', 'last_read_at']
+    search_fields = ['user__username']
+    raw_id_fields = ['user', 'conversation']
+
+@admin.register(MessageArchiveSegment)
+class MessageArchiveSegmentAdmin(admin.ModelAdmin):
+    list_display = ['conversation', 'message_count', 'first_created_at', 'last_created_at', 'created_at']
+    raw_id_fields = ['conversation']
+    exclude = ['data']
@@ -0,0 +1,146 @@
+"""
+System-message fan-out for platform announcements.
+
+Each recipient gets the announcement in their one-to-one conversation with
+the sending admin, found or created by participant key. Recipients are
+handled ANNOUNCEMENT_CHUNK_SIZE at a time, and each chunk is one
+transaction of set-based statements: bulk inserts for missing
+conversations, participants, inbox entries and messages, then one UPDATE
+each for the conversations, the inbox entries and the sender's watermarks.
+A chunk is about a dozen statements however many recipients it holds.
+
+The sender gets no stream events for announcements they send.
+"""
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.utils import timezone
+from .conversations import participant_key
+from .events import publish_events
+from .models import Conversation, ConversationReadState, InboxEntry, Message
+from users.models import User
+
+ANNOUNCEMENT_CHUNK_SIZE = 1000
+
+
+def announcement_recipients(sender, user_types=None, active_days=None, verified_only=False, user_ids=None):
+    """Active users in the targeted segment, excluding the sender."""
+    users = User.objects.filter(is_active=True).exclude(id=sender.id)
+    if user_types:
+        users = users.filter(user_type__in=user_types)
+    if active_days is not None:
+        users = users.filter(last_login__gte=timezone.now() - timedelta(days=active_days))
+    if verified_only:
+        users = users.filter(is_email_verified=True)
+    if user_ids:
+        users = users.filter(id__in=user_ids)
+    return users.order_by('id')
+
+
+def direct_conversations(sender, recipient_ids, subject):
+    """
+    ({recipient_id: conversation_id}, created) for the sender's one-to-one
+    threads, creating the missing ones with their participants.
+    """
+    keys = {participant_key([sender.id, recipient_id]): recipient_id for recipient_id in recipient_ids}
+    existing = dict(Conversation.objects.filter(participant_key__in=keys).values_list('participant_key', 'id'))
+    missing = [key for key in keys if key not in existing]
+    created = []
+    if missing:
+        now = timezone.now()
+        Conversation.objects.bulk_create(
+            [Conversation(participant_key=key, subject=subject, created_at=now) for key in missing],
+            ignore_conflicts=True,
+        )
+        created = list(Conversation.objects.filter(participant_key__in=missing).values_list('participant_key', 'id'))
+        Participant = Conversation.participants.through
+        rows = []
+        for key, conversation_id in created:
+            rows.append(Participant(conversation_id=conversation_id, user_id=sender.id))
+            rows.append(Participant(conversation_id=conversation_id, user_id=keys[key]))
+            existing[key] = conversation_id
+        Participant.objects.bulk_create(rows, ignore_conflicts=True)
+    return {keys[key]: conversation_id for key, conversation_id in existing.items()}, len(created)
+
+
+def deliver_chunk(sender, recipient_ids, content, subject):
+    """Send `content` to one chunk of recipients in one transaction. Returns the number of conversations created."""
+    now = timezone.now()
+    with transaction.atomic():
+        threads, created = direct_conversations(sender, recipient_ids, subject)
+        conversation_ids = list(threads.values())
+        pairs = [
+            (conversation_id, user_id)
+            for recipient_id, conversation_id in threads.items()
+            for user_id in (sender.id, recipient_id)
+        ]
+        # Existing threads already have theirs; only new ones are inserted.
+        InboxEntry.objects.bulk_create(
+            [InboxEntry(conversation_id=conversation_id, user_id=user_id, last_message_at=now) for conversation_id, user_id in pairs],
+            ignore_conflicts=True,
+        )
+        ConversationReadState.objects.bulk_create(
+            [ConversationReadState(conversation_id=conversation_id, user_id=user_id) for conversation_id, user_id in pairs],
+            ignore_conflicts=True,
+        )
+
+        messages = Message.objects.bulk_create([
+            Message(
+                conversation_id=conversation_id,
+                sender=sender,
+                message_type='system',
+                content=content,
+                is_read=True,
+                created_at=now,
+            )
+            for conversation_id in conversation_ids
+        ])
+        # Each entry points at the message just inserted into its own conversation,
+        # found through the (conversation, created_at) index.
+        latest = Subquery(
+            Message.objects.filter(conversation_id=OuterRef('conversation_id'), created_at=now)
+            .order_by('-id')
+            .values('id')[:1]
+        )
+        Conversation.objects.filter(id__in=conversation_ids).update(last_message_at=now)
+        InboxEntry.objects.filter(conversation_id__in=conversation_ids).update(
+            last_message_id=latest,
+            last_message_at=now,
+            unread_count=Case(
+                When(user_id=sender.id, then=Value(0)),
+                default=F('unread_count') + 1,
+            ),
+        )
+        ConversationReadState.objects.filter(
+            conversation_id__in=conversation_ids, user_id=sender.id
+        ).update(last_read_message_id=latest, last_read_at=now)
+
+        message_ids = {message.conversation_id: message.id for message in messages}
+        publish_events('message.created', {
+            recipient_id: {
+                'id': message_ids[conversation_id],
+                'conversation': conversation_id,
+                'sender': sender.id,
+                'message_type': 'system',
+                'content': content,
+                'created_at': now.isoformat(),
+            }
+            for recipient_id, conversation_id in threads.items()
+        })
+    return created
+
+
+def send_announcement(sender, recipients, content, subject='Announcement', chunk_size=ANNOUNCEMENT_CHUNK_SIZE):
+    """
+    Deliver `content` as a system message from `sender` to every user in
+    the `recipients` queryset. Yields (recipients, conversations created)
+    after each chunk.
+    """
+    after_id = 0
+    while True:
+        recipient_ids = list(recipients.filter(id__gt=after_id).values_list('id', flat=True)[:chunk_size])
+        if not recipient_ids:
+            return
+        created = deliver_chunk(sender, recipient_ids, content, subject)
+        after_id = recipient_ids[-1]
+        yield len(recipient_ids), created
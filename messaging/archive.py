@@ -0,0 +1,182 @@
+"""
+Cold storage for old message history.
+
+archive_conversations() moves the messages of conversations that have been
+idle since the cutoff out of Message and into MessageArchiveSegment rows,
+ARCHIVE_SEGMENT_SIZE messages per segment as zlib-compressed JSON. The
+newest message of each conversation stays hot so the inbox preview and the
+first page of history never need the archive.
+
+Archived messages are always older than every hot message in the same
+conversation, so MessageCursorPagination reads the hot table first and only
+continues into the segments once a reader scrolls past its oldest message.
+Segments come back as unsaved Message instances that serialize exactly like
+hot ones. Archived messages drop out of full-text search and lose their
+legacy MessageReadReceipt rows; read watermarks are by id and are unaffected.
+"""
+import json
+import zlib
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from users.models import User
+from .models import Conversation, Message, MessageArchiveSegment
+
+ARCHIVE_SEGMENT_SIZE = 500
+
+ARCHIVED_FIELDS = ('id', 'sender_id', 'message_type', 'content', 'attachment', 'is_read', 'read_at', 'created_at')
+
+
+def archive_cutoff(days=None):
+    if days is None:
+        days = settings.MESSAGE_ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_conversations(cutoff):
+    """Conversations with no message since `cutoff` that still have more than one hot message."""
+    return (
+        Conversation.objects.filter(
+            Q(last_message_at__lt=cutoff) | Q(last_message_at__isnull=True, created_at__lt=cutoff)
+        )
+        .annotate(hot_messages=Count('messages'), newest_message_id=Max('messages__id'))
+        .filter(hot_messages__gt=1)
+        .order_by('id')
+    )
+
+
+def compress_messages(rows):
+    payload = [
+        {
+            **row,
+            'attachment': row['attachment'] or None,
+            'read_at': row['read_at'].isoformat() if row['read_at'] else None,
+            'created_at': row['created_at'].isoformat(),
+        }
+        for row in rows
+    ]
+    return zlib.compress(json.dumps(payload, separators=(',', ':')).encode())
+
+
+def decompress_messages(segment):
+    """The messages in `segment` as unsaved Message instances, oldest first."""
+    messages = []
+    for row in json.loads(zlib.decompress(bytes(segment.data))):
+        row['read_at'] = parse_datetime(row['read_at']) if row['read_at'] else None
+        row['created_at'] = parse_datetime(row['created_at'])
+        messages.append(Message(conversation_id=segment.conversation_id, **row))
+    return messages
+
+
+def archive_conversation(conversation_id, cutoff, keep_message_id, segment_size=ARCHIVE_SEGMENT_SIZE):
+    """
+    Move the conversation's messages older than `cutoff`, except
+    `keep_message_id`, into segments. Each segment is written and its
+    messages deleted in one transaction. Returns (segments, messages).
+    """
+    hot = (
+        Message.objects.filter(conversation_id=conversation_id, created_at__lt=cutoff)
+        .exclude(id=keep_message_id)
+        .order_by('created_at', 'id')
+        .values(*ARCHIVED_FIELDS)
+    )
+    segments = messages = 0
+    while True:
+        with transaction.atomic():
+            rows = list(hot[:segment_size])
+            if not rows:
+                return segments, messages
+            MessageArchiveSegment.objects.create(
+                conversation_id=conversation_id,
+                first_message_id=rows[0]['id'],
+                last_message_id=rows[-1]['id'],
+                first_created_at=rows[0]['created_at'],
+                last_created_at=rows[-1]['created_at'],
+                message_count=len(rows),
+                data=compress_messages(rows),
+            )
+            Message.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        segments += 1
+        messages += len(rows)
+
+
+def archive_conversations(cutoff, limit=None, segment_size=ARCHIVE_SEGMENT_SIZE):
+    """Archive every idle conversation (or the first `limit`). Returns a report dict."""
+    report = {'conversations': 0, 'segments': 0, 'messages': 0}
+    conversations = archivable_conversations(cutoff).values_list('id', 'newest_message_id')
+    if limit:
+        conversations = conversations[:limit]
+    for conversation_id, newest_message_id in conversations:
+        segments, messages = archive_conversation(conversation_id, cutoff, newest_message_id, segment_size)
+        if messages:
+            report['conversations'] += 1
+            report['segments'] += segments
+            report['messages'] += messages
+    return report
+
+
+def attach_senders(messages):
+    senders = User.objects.select_related('profile').in_bulk({message.sender_id for message in messages})
+    for message in messages:
+        message.sender = senders.get(message.sender_id)
+    return messages
+
+
+def archived_anchor(conversation_id, message_id):
+    """{'id', 'created_at'} of an archived message, or None if it is not in the archive."""
+    segment = MessageArchiveSegment.objects.filter(
+        conversation_id=conversation_id,
+        first_message_id__lte=message_id,
+        last_message_id__gte=message_id,
+    ).first()
+    if segment is None:
+        return None
+    for message in decompress_messages(segment):
+        if message.id == message_id:
+            return {'id': message.id, 'created_at': message.created_at, 'archived': True}
+    return None
+
+
+def _key(message):
+    return (message.created_at, message.id)
+
+
+def archived_older_than(conversation_id, anchor, size, inclusive=False):
+    """
+    Up to `size` archived messages before `anchor` (None means the newest),
+    oldest first, and whether more remain. Decompresses only the segments
+    the page actually reaches.
+    """
+    segments = MessageArchiveSegment.objects.filter(conversation_id=conversation_id)
+    if anchor is not None:
+        segments = segments.filter(first_created_at__lte=anchor['created_at'])
+        limit = (anchor['created_at'], anchor['id'])
+    rows = []
+    for segment in segments.order_by('-first_created_at', '-first_message_id').iterator():
+        for message in reversed(decompress_messages(segment)):
+            if anchor is not None and (_key(message) > limit or (_key(message) == limit and not inclusive)):
+                continue
+            rows.append(message)
+            if len(rows) > size:
+                return attach_senders(rows[:size][::-1]), True
+    return attach_senders(rows[::-1]), False
+
+
+def archived_newer_than(conversation_id, anchor, size):
+    """Up to `size` archived messages after `anchor`, oldest first, and whether more remain in the archive."""
+    segments = MessageArchiveSegment.objects.filter(
+        conversation_id=conversation_id, last_created_at__gte=anchor['created_at']
+    )
+    limit = (anchor['created_at'], anchor['id'])
+    rows = []
+    for segment in segments.order_by('first_created_at', 'first_message_id').iterator():
+        for message in decompress_messages(segment):
+            if _key(message) <= limit:
+                continue
+            rows.append(message)
+            if len(rows) > size:
+                return attach_senders(rows[:size]), True
+    return attach_senders(rows), False
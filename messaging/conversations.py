@@ -0,0 +1,57 @@
+"""
+Conversation dedupe by participant set.
+
+Every conversation stores participant_key, a SHA-256 of its project id and
+sorted participant ids, under a unique index. Finding the thread for a set
+of people and a project is then one indexed lookup instead of an M2M
+intersection. When several legacy threads share a set, only the most
+recently active one holds the key.
+"""
+import hashlib
+from django.db import IntegrityError, transaction
+from .inbox import add_participants
+from .models import Conversation
+from .sending import participant_ids
+
+
+def participant_key(user_ids, project_id=None):
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return None
+    raw = f"{project_id or ''}:{','.join(str(user_id) for user_id in user_ids)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def refresh_participant_key(conversation):
+    """
+    Recompute the key after participants or project change. If another
+    conversation already holds the new key, this one is left without one.
+    """
+    key = participant_key(participant_ids(conversation.id), conversation.project_id)
+    if key == conversation.participant_key:
+        return
+    try:
+        with transaction.atomic():
+            Conversation.objects.filter(id=conversation.id).update(participant_key=key)
+    except IntegrityError:
+        key = None
+        Conversation.objects.filter(id=conversation.id).update(participant_key=None)
+    conversation.participant_key = key
+
+
+def get_or_create_conversation(user_ids, project_id=None, subject=''):
+    """The conversation between exactly `user_ids` about `project_id`, created if missing. Returns (conversation, created)."""
+    user_ids = sorted(set(user_ids))
+    key = participant_key(user_ids, project_id)
+    conversation = Conversation.objects.filter(participant_key=key).first()
+    if conversation is not None:
+        return conversation, False
+    try:
+        with transaction.atomic():
+            conversation = Conversation.objects.create(participant_key=key, project_id=project_id, subject=subject)
+            conversation.participants.set(user_ids)
+            add_participants(conversation, user_ids)
+    except IntegrityError:
+        # A concurrent request created it first.
+        return Conversation.objects.get(participant_key=key), False
+    return conversation, True
@@ -0,0 +1,208 @@
+"""
+Real-time events for messaging and proposals.
+
+publish_event() appends one StreamEvent row per recipient and, once the
+transaction commits, asks the transport to wake those recipients' open
+streams. Streams park on an in-process EventHub: under ASGI as coroutines,
+so an idle connection holds no thread, and under WSGI as a worker thread
+blocked on a threading.Event. When woken they read their new rows by
+(user, id), which is also what makes Last-Event-ID resumption exact.
+
+EventSource cannot send an Authorization header, so streams authenticate
+with a stream ticket: a random, single-use token valid for
+STREAM_TICKET_SECONDS that only opens an event stream, so no JWT ever
+appears in a URL.
+
+The transport is settings.MESSAGING_EVENT_TRANSPORT. LocalTransport only
+wakes streams in the publishing process; streams elsewhere notice the event
+at their next heartbeat. RedisTransport fans wake-ups out over Redis pub/sub
+so every worker's streams react immediately.
+"""
+import asyncio
+import json
+import secrets
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import StreamEvent
+
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_BATCH_SIZE = 100
+STREAM_EVENT_RETENTION_HOURS = 48
+STREAM_TICKET_SECONDS = 30
+
+
+class Waiter:
+    """
+    One parked stream, which other threads can wake safely: an asyncio.Event
+    for a coroutine on `loop`, or a threading.Event when there is no loop.
+    """
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else threading.Event()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            # The stream's event loop has already closed.
+            pass
+
+
+class EventHub:
+    """Process-wide registry of parked streams, keyed by user id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = {}
+
+    def subscribe(self, user_id):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        waiter = Waiter(loop)
+        with self._lock:
+            self._waiters.setdefault(user_id, set()).add(waiter)
+        return waiter
+
+    def unsubscribe(self, user_id, waiter):
+        with self._lock:
+            waiters = self._waiters.get(user_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[user_id]
+
+    def notify(self, user_ids):
+        with self._lock:
+            waiters = [waiter for user_id in user_ids for waiter in self._waiters.get(user_id, ())]
+        for waiter in waiters:
+            waiter.wake()
+
+
+hub = EventHub()
+
+
+class LocalTransport:
+    """Wakes streams in this process only."""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def publish(self, user_ids):
+        self.hub.notify(user_ids)
+
+    def listen(self):
+        """Called before a stream parks; cross-worker transports start their listener here."""
+
+
+class RedisTransport(LocalTransport):
+    """Broadcasts wake-ups to every worker through a Redis pub/sub channel."""
+    channel = 'messaging:events'
+
+    def __init__(self, hub, url=None):
+        import redis
+        super().__init__(hub)
+        self.client = redis.Redis.from_url(url or settings.MESSAGING_EVENT_REDIS_URL)
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def publish(self, user_ids):
+        self.client.publish(self.channel, json.dumps(list(user_ids)))
+
+    def listen(self):
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._run, name='messaging-events', daemon=True)
+                self._listener.start()
+
+    def _run(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        for message in pubsub.listen():
+            try:
+                self.hub.notify(json.loads(message['data']))
+            except (TypeError, ValueError):
+                continue
+
+
+_transport = None
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        _transport = import_string(settings.MESSAGING_EVENT_TRANSPORT)(hub)
+    return _transport
+
+
+def publish_event(user_ids, event_type, payload):
+    """Record `event_type` for every user in `user_ids` and wake their streams after commit."""
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    StreamEvent.objects.bulk_create([
+        StreamEvent(user_id=user_id, event_type=event_type, payload=payload)
+        for user_id in user_ids
+    ])
+    transaction.on_commit(lambda: get_transport().publish(user_ids))
+
+
+def publish_events(event_type, payloads):
+    """Like publish_event, with a different payload per user: `payloads` maps user id to payload."""
+    if not payloads:
+        return
+    StreamEvent.objects.bulk_create([
+        StreamEvent(user_id=user_id, event_type=event_type, payload=payload)
+        for user_id, payload in payloads.items()
+    ])
+    user_ids = sorted(payloads)
+    transaction.on_commit(lambda: get_transport().publish(user_ids))
+
+
+def stream_ticket_key(ticket):
+    return f'messaging:stream-ticket:{ticket}'
+
+
+def issue_stream_ticket(user_id):
+    ticket = secrets.token_urlsafe(32)
+    cache.set(stream_ticket_key(ticket), user_id, STREAM_TICKET_SECONDS)
+    return ticket
+
+
+def redeem_stream_ticket(ticket):
+    """The user id the ticket was issued to, or None. A ticket works once."""
+    key = stream_ticket_key(ticket)
+    user_id = cache.get(key)
+    # Only the request whose delete succeeds may use it.
+    if user_id is None or not cache.delete(key):
+        return None
+    return user_id
+
+
+def latest_event_id(user_id):
+    return StreamEvent.objects.filter(user_id=user_id).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def events_after(user_id, last_event_id, limit=STREAM_BATCH_SIZE):
+    return list(
+        StreamEvent.objects.filter(user_id=user_id, id__gt=last_event_id)
+        .order_by('id')
+        .values('id', 'event_type', 'payload', 'created_at')[:limit]
+    )
+
+
+def prune_events(hours=STREAM_EVENT_RETENTION_HOURS):
+    """Delete events older than `hours`; clients offline that long reload instead of resuming."""
+    cutoff = timezone.now() - timedelta(hours=hours)
+    deleted, _ = StreamEvent.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
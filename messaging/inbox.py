@@ -0,0 +1,104 @@
+"""
+Materialized per-user inbox and read watermarks.
+
+InboxEntry rows are written by the paths that change what an inbox shows:
+creating a conversation, sending a message and reading one. Each write is a
+single set-based statement, so keeping the inbox current costs a constant
+number of queries however many participants a conversation has.
+
+Reading is tracked per participant as a ConversationReadState watermark;
+InboxEntry.unread_count is the number of other people's messages after it.
+"""
+from django.db.models import Case, Count, F, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .events import publish_event
+from .models import ConversationReadState, InboxEntry, Message
+
+
+def add_participants(conversation, user_ids):
+    """Create inbox entries for `user_ids`, leaving existing entries alone."""
+    InboxEntry.objects.bulk_create(
+        [
+            InboxEntry(
+                user_id=user_id,
+                conversation=conversation,
+                last_message_at=conversation.last_message_at or conversation.created_at,
+            )
+            for user_id in user_ids
+        ],
+        ignore_conflicts=True,
+    )
+    ConversationReadState.objects.bulk_create(
+        [ConversationReadState(user_id=user_id, conversation=conversation) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def record_message(message):
+    """
+    Point every participant's entry at `message` and count it as unread for
+    everyone but the sender, whose watermark moves up to it.
+    """
+    updated = InboxEntry.objects.filter(conversation_id=message.conversation_id).update(
+        last_message=message,
+        last_message_at=message.created_at,
+        unread_count=Case(
+            When(user_id=message.sender_id, then=Value(0)),
+            default=F('unread_count') + 1,
+        ),
+    )
+    ConversationReadState.objects.filter(
+        conversation_id=message.conversation_id,
+        user_id=message.sender_id,
+        last_read_message_id__lt=message.id
+    ).update(last_read_message_id=message.id, last_read_at=message.created_at)
+    return updated
+
+
+def unread_after(user, conversation_id, message_id):
+    """Subquery counting other participants' messages after `message_id`."""
+    return Coalesce(
+        Subquery(
+            Message.objects.filter(conversation_id=conversation_id, id__gt=message_id)
+            .exclude(sender=user)
+            .order_by()
+            .values('conversation_id')
+            .annotate(unread=Count('id'))
+            .values('unread')[:1]
+        ),
+        Value(0),
+    )
+
+
+def mark_read_up_to(user, conversation_id, message_id):
+    """
+    Advance the user's watermark to `message_id` with one UPDATE; watermarks
+    never move backwards. Returns True when it moved, and then refreshes the
+    user's unread count for the conversation.
+    """
+    now = timezone.now()
+    advanced = ConversationReadState.objects.filter(
+        conversation_id=conversation_id,
+        user=user,
+        last_read_message_id__lt=message_id
+    ).update(last_read_message_id=message_id, last_read_at=now)
+    if not advanced:
+        # Participants added outside add_participants() have no row yet.
+        _, advanced = ConversationReadState.objects.get_or_create(
+            conversation_id=conversation_id,
+            user=user,
+            defaults={'last_read_message_id': message_id, 'last_read_at': now}
+        )
+    if advanced:
+        InboxEntry.objects.filter(user=user, conversation_id=conversation_id).update(
+            unread_count=unread_after(user, conversation_id, message_id)
+        )
+        participants = InboxEntry.objects.filter(conversation_id=conversation_id).values_list('user_id', flat=True)
+        publish_event(participants, 'conversation.read', {
+            'conversation': conversation_id,
+            'user': user.id,
+            'last_read_message_id': message_id,
+            'read_at': now.isoformat(),
+        })
+    return bool(advanced)
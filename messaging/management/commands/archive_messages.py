@@ -0,0 +1,33 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from messaging.archive import ARCHIVE_SEGMENT_SIZE, archivable_conversations, archive_conversations, archive_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Move old messages of idle conversations into compressed archive segments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.MESSAGE_ARCHIVE_AFTER_DAYS,
+                            help='Archive messages older than this many days')
+        parser.add_argument('--limit', type=int,
+                            help='Archive at most this many conversations')
+        parser.add_argument('--segment-size', type=int, default=ARCHIVE_SEGMENT_SIZE,
+                            help='Messages per compressed segment')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many conversations would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['days'])
+        if options['dry_run']:
+            count = archivable_conversations(cutoff).count()
+            self.stdout.write(f'{count} conversations have been idle for more than {options["days"]} days')
+            return
+
+        started = time.monotonic()
+        report = archive_conversations(cutoff, options['limit'], options['segment_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✓ Archived {report["messages"]} messages from {report["conversations"]} conversations '
+            f'into {report["segments"]} segments in {elapsed:.2f}s'
+        ))
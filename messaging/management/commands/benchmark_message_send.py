@@ -0,0 +1,85 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from messaging.inbox import add_participants
+from messaging.models import Conversation, Message, MessageReadReceipt
+from messaging.sending import send_message
+from users.models import User
+
+
+def legacy_send(conversation, sender, content):
+    """
+    MessageList.perform_create as it was before the inbox, read watermarks
+    and send_message(): one autocommit per step, and a read receipt row for
+    the sender on every message.
+    """
+    message = Message.objects.create(conversation=conversation, sender=sender, content=content)
+    conversation.last_message_at = timezone.now()
+    conversation.save(update_fields=['last_message_at'])
+    MessageReadReceipt.objects.get_or_create(
+        message=message,
+        reader=sender,
+        defaults={'read_at': timezone.now()}
+    )
+    message.is_read = True
+    message.save(update_fields=['is_read'])
+    return message
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure message send throughput of the old per-step path against send_message(), '
+        'on a throwaway test database (in memory on SQLite unless DATABASES TEST NAME is set)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000, help='Messages sent per path')
+        parser.add_argument('--participants', type=int, default=2, help='People in the benchmark conversation')
+
+    def run(self, label, send, conversation, users, count):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            send(conversation, users[0], 'warm-up')
+        started = time.perf_counter()
+        for i in range(count):
+            send(conversation, users[i % len(users)], f'benchmark message {i}')
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(f'  - {label}: {rate:,.0f} messages/s ({counter.count} statements per send)')
+        return rate
+
+    def handle(self, *args, **options):
+        # Both paths commit for real, so they run on a test database rather
+        # than inside a rolled-back transaction, which would hide commit costs.
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            rates = self.compare(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        before, after = rates
+        speedup = after / before if before else 0
+        self.stdout.write(self.style.SUCCESS(f'\n✓ send_message is {speedup:.1f}x the old path'))
+
+    def compare(self, options):
+        users = [
+            User.objects.create_user(username=f'bench_send_{i}', email=f'bench_send_{i}@example.com')
+            for i in range(max(options['participants'], 2))
+        ]
+        rates = []
+        for label, send in (('before (per-step saves)', legacy_send), ('after (send_message)', send_message)):
+            conversation = Conversation.objects.create(subject='Send benchmark')
+            conversation.participants.set(users)
+            add_participants(conversation, [user.id for user in users])
+            rates.append(self.run(label, send, conversation, users, options['messages']))
+        return rates
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from messaging.events import STREAM_EVENT_RETENTION_HOURS, prune_events
+
+
+class Command(BaseCommand):
+    help = 'Delete real-time stream events older than the retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=STREAM_EVENT_RETENTION_HOURS,
+                            help='Keep events newer than this many hours')
+
+    def handle(self, *args, **options):
+        deleted = prune_events(hours=options['hours'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Deleted {deleted} stream events older than {options["hours"]}h'))
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def backfill_inbox(apps, schema_editor):
+    Conversation = apps.get_model('messaging', 'Conversation')
+    Message = apps.get_model('messaging', 'Message')
+    MessageReadReceipt = apps.get_model('messaging', 'MessageReadReceipt')
+    InboxEntry = apps.get_model('messaging', 'InboxEntry')
+
+    for conversation in Conversation.objects.prefetch_related('participants').iterator(chunk_size=500):
+        messages = Message.objects.filter(conversation=conversation)
+        last_message = messages.order_by('-created_at', '-id').first()
+        entries = []
+        for user in conversation.participants.all():
+            read = MessageReadReceipt.objects.filter(message=OuterRef('pk'), reader=user)
+            entries.append(InboxEntry(
+                user=user,
+                conversation=conversation,
+                last_message=last_message,
+                last_message_at=last_message.created_at if last_message else conversation.created_at,
+                unread_count=messages.exclude(sender=user).filter(~Exists(read)).count(),
+            ))
+        InboxEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to='messaging.conversation')),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='messaging.message')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-last_message_at'],
+                'indexes': [models.Index(fields=['user', '-last_message_at'], name='messaging_i_user_id_500d06_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'conversation'), name='unique_inbox_entry')],
+            },
+        ),
+        migrations.RunPython(backfill_inbox, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_watermarks(apps, schema_editor):
+    """
+    Each participant's watermark is the newest message they have a receipt
+    for or sent themselves; inbox unread counts are recomputed from it.
+    """
+    Message = apps.get_model('messaging', 'Message')
+    MessageReadReceipt = apps.get_model('messaging', 'MessageReadReceipt')
+    ConversationReadState = apps.get_model('messaging', 'ConversationReadState')
+    InboxEntry = apps.get_model('messaging', 'InboxEntry')
+
+    read = {
+        (row['message__conversation_id'], row['reader_id']): row['last']
+        for row in MessageReadReceipt.objects.values('message__conversation_id', 'reader_id')
+        .annotate(last=Max('message_id')).order_by()
+    }
+    for row in Message.objects.values('conversation_id', 'sender_id').annotate(last=Max('id')).order_by():
+        key = (row['conversation_id'], row['sender_id'])
+        read[key] = max(read.get(key, 0), row['last'])
+
+    states = []
+    for entry in InboxEntry.objects.all().iterator(chunk_size=1000):
+        watermark = read.get((entry.conversation_id, entry.user_id), 0)
+        states.append(ConversationReadState(
+            conversation_id=entry.conversation_id,
+            user_id=entry.user_id,
+            last_read_message_id=watermark,
+        ))
+        unread = Message.objects.filter(
+            conversation_id=entry.conversation_id, id__gt=watermark
+        ).exclude(sender_id=entry.user_id).count()
+        if unread != entry.unread_count:
+            InboxEntry.objects.filter(pk=entry.pk).update(unread_count=unread)
+    ConversationReadState.objects.bulk_create(states, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_inboxentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.BigIntegerField(default=0)),
+                ('last_read_at', models.DateTimeField(blank=True, null=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='messaging.conversation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_read_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('conversation', 'user'), name='unique_conversation_read_state')],
+            },
+        ),
+        migrations.RunPython(backfill_watermarks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_message_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_message_id', models.BigIntegerField()),
+                ('last_message_id', models.BigIntegerField()),
+                ('first_created_at', models.DateTimeField()),
+                ('last_created_at', models.DateTimeField()),
+                ('message_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_segments', to='messaging.conversation')),
+            ],
+            options={
+                'ordering': ['conversation', 'first_created_at'],
+                'indexes': [models.Index(fields=['conversation', 'first_created_at'], name='messaging_m_convers_5e50cb_idx'), models.Index(fields=['conversation', 'last_created_at'], name='messaging_m_convers_7a2acc_idx')],
+            },
+        ),
+    ]
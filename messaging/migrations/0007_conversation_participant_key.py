@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:05
+
+import hashlib
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_participant_keys(apps, schema_editor):
+    Conversation = apps.get_model('messaging', 'Conversation')
+    Participant = Conversation.participants.through
+
+    members = {}
+    for conversation_id, user_id in Participant.objects.values_list('conversation_id', 'user_id').iterator():
+        members.setdefault(conversation_id, []).append(user_id)
+
+    # Most recently active first, so that thread keeps the key when sets repeat.
+    conversations = Conversation.objects.order_by(
+        F('last_message_at').desc(nulls_last=True), '-created_at', '-id'
+    ).values_list('id', 'project_id')
+    claimed = set()
+    for conversation_id, project_id in conversations.iterator():
+        user_ids = sorted(set(members.get(conversation_id, ())))
+        if not user_ids:
+            continue
+        raw = f"{project_id or ''}:{','.join(str(user_id) for user_id in user_ids)}"
+        key = hashlib.sha256(raw.encode()).hexdigest()
+        if key in claimed:
+            continue
+        claimed.add(key)
+        Conversation.objects.filter(id=conversation_id).update(participant_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0006_messagearchivesegment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='participant_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_participant_keys, migrations.RunPython.noop),
+    ]
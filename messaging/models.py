@@ -7,6 +7,9 @@ class Conversation(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='conversations', null=True, blank=True)
     participants = models.ManyToManyField(User, related_name='conversations')
     subject = models.CharField(max_length=200, blank=True)
+    # Hash of the sorted participant ids and the project id (messaging.conversations).
+    # Held by at most one conversation per participant set; older duplicates have none.
+    participant_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
     last_message_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
@@ -56,3 +59,94 @@ class MessageReadReceipt(models.Model):
     
     def __str__(self):
         return f"{self.reader.username} read message {self.message.id}"
+
+class ConversationReadState(models.Model):
+    """
+    Read watermark: every message in the conversation with an id up to
+    last_read_message_id counts as read by the user. One row per participant
+    replaces a receipt per message per reader; unread counts are the
+    messages after the watermark (see messaging.inbox).
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='read_states')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_read_states')
+    last_read_message_id = models.BigIntegerField(default=0)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'user'], name='unique_conversation_read_state'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} read conversation {self.conversation_id} up to {self.last_read_message_id}"
+
+class InboxEntry(models.Model):
+    """
+    One row per participant per conversation, kept current by the send and
+    read paths (see messaging.inbox), so a user's inbox is one indexed query.
+    last_message_at is the conversation's creation time until a message is sent.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inbox_entries')
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='inbox_entries')
+    last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(default=timezone.now)
+    unread_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-last_message_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'conversation'], name='unique_inbox_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-last_message_at']),
+        ]
+    
+    def __str__(self):
+        return f"Inbox of {self.user.username} - conversation {self.conversation_id}"
+
+class StreamEvent(models.Model):
+    """
+    Per-recipient event log behind the real-time stream (see
+    messaging.events). The id doubles as the SSE event id, so a client that
+    reconnects with Last-Event-ID resumes exactly where it left off.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stream_events')
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id']),
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} for {self.user_id} ({self.id})"
+
+class MessageArchiveSegment(models.Model):
+    """
+    A run of consecutive messages from one conversation, moved out of Message
+    by archive_messages and stored as zlib-compressed JSON (see
+    messaging.archive). Message history pagination reads through to these
+    once a reader scrolls past the messages still in the hot table.
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='archive_segments')
+    first_message_id = models.BigIntegerField()
+    last_message_id = models.BigIntegerField()
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+    message_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['conversation', 'first_created_at']
+        indexes = [
+            models.Index(fields=['conversation', 'first_created_at']),
+            models.Index(fields=['conversation', 'last_created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Conversation {self.conversation_id} archive: {self.message_count} messages"
@@ -0,0 +1,144 @@
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .archive import archived_anchor, archived_newer_than, archived_older_than
+from .models import MessageArchiveSegment
+
+
+class MessageCursorPagination(BasePagination):
+    """
+    Keyset pagination over (created_at, id) for one conversation's messages,
+    served by the (conversation, created_at) index. Never uses OFFSET or a
+    total count.
+
+    ?before=<id>  messages older than that message
+    ?after=<id>   messages newer than that message
+    ?around=<id>  that message with up to half a page either side, for
+                  jumping to a search hit or the first unread message
+    (none)        the newest page
+
+    Every page is returned oldest first; `previous` and `next` link to the
+    adjacent older and newer pages, or are null at either end.
+
+    When the view exposes the `conversation` being read, paging continues
+    past the oldest hot message into its archive segments (messaging.archive),
+    and cursors may point at archived messages.
+    """
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'limit'
+    cursor_params = ('before', 'after', 'around')
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            raise ValidationError({self.page_size_query_param: 'Must be an integer.'})
+        return max(1, min(size, self.max_page_size))
+
+    def get_anchor(self, queryset, message_id):
+        try:
+            return queryset.values('id', 'created_at').get(id=int(message_id))
+        except (TypeError, ValueError):
+            raise ValidationError({'cursor': 'Message ids must be integers.'})
+        except queryset.model.DoesNotExist:
+            anchor = self.conversation and archived_anchor(self.conversation.id, int(message_id))
+            if anchor is None:
+                raise NotFound('Message not found in this conversation.')
+            return anchor
+
+    def older_than(self, queryset, anchor, size, inclusive=False):
+        if anchor.get('archived'):
+            return archived_older_than(self.conversation.id, anchor, size, inclusive)
+        older = Q(created_at__lt=anchor['created_at']) | Q(created_at=anchor['created_at'], id__lt=anchor['id'])
+        if inclusive:
+            older |= Q(id=anchor['id'])
+        rows = list(queryset.filter(older).order_by('-created_at', '-id')[:size + 1])
+        return self.with_archive(rows[:size][::-1], len(rows) > size, size)
+
+    def with_archive(self, page, has_older, size):
+        """
+        Top up a page that reached the oldest hot message with archived
+        messages, which are all older than anything still hot.
+        """
+        if has_older or self.conversation is None:
+            return page, has_older
+        if len(page) == size:
+            return page, MessageArchiveSegment.objects.filter(conversation=self.conversation).exists()
+        archived, has_older = archived_older_than(self.conversation.id, None, size - len(page))
+        return archived + page, has_older
+
+    def newer_than(self, queryset, anchor, size):
+        archived = []
+        if anchor.get('archived'):
+            archived, has_newer = archived_newer_than(self.conversation.id, anchor, size)
+            if has_newer:
+                return archived, True
+            size -= len(archived)
+        newer = Q(created_at__gt=anchor['created_at']) | Q(created_at=anchor['created_at'], id__gt=anchor['id'])
+        rows = list(queryset.filter(newer).order_by('created_at', 'id')[:size + 1])
+        return archived + rows[:size], len(rows) > size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.conversation = getattr(view, 'conversation', None)
+        size = self.get_page_size(request)
+        params = request.query_params
+
+        if params.get('after'):
+            page, self.has_newer = self.newer_than(queryset, self.get_anchor(queryset, params['after']), size)
+            self.has_older = True
+        elif params.get('before'):
+            page, self.has_older = self.older_than(queryset, self.get_anchor(queryset, params['before']), size)
+            self.has_newer = True
+        elif params.get('around'):
+            anchor = self.get_anchor(queryset, params['around'])
+            older, self.has_older = self.older_than(queryset, anchor, size // 2 + 1, inclusive=True)
+            newer, self.has_newer = self.newer_than(queryset, anchor, size - len(older))
+            page = older + newer
+        else:
+            page, self.has_older = self.latest(queryset, size)
+            self.has_newer = False
+
+        self.page = page
+        return page
+
+    def latest(self, queryset, size):
+        rows = list(queryset.order_by('-created_at', '-id')[:size + 1])
+        return self.with_archive(rows[:size][::-1], len(rows) > size, size)
+
+    def cursor_link(self, param, message_id):
+        url = self.request.build_absolute_uri()
+        for name in self.cursor_params:
+            url = remove_query_param(url, name)
+        return replace_query_param(url, param, message_id)
+
+    def get_previous_link(self):
+        if not self.page or not self.has_older:
+            return None
+        return self.cursor_link('before', self.page[0].id)
+
+    def get_next_link(self):
+        if not self.page or not self.has_newer:
+            return None
+        return self.cursor_link('after', self.page[-1].id)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
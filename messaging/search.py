@@ -0,0 +1,140 @@
+"""
+Full-text search over the messages a user can see.
+
+The index lives in the database (migration 0005): a generated, GIN-indexed
+tsvector column on PostgreSQL, an FTS5 table kept in sync by triggers on
+SQLite. Both are updated by the INSERT itself, so bulk inserts are covered
+too. The participant join sits inside the index query, so a user's hits are
+ranked and limited without ever materializing other people's matches.
+
+Results are ordered by (rank, id) descending and paginated by keyset on
+that pair.
+"""
+import html
+import re
+from datetime import timezone as dt_timezone
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+
+# Highlight markers that cannot occur in user text; swapped for <mark> after escaping.
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+POSTGRES_SEARCH = """
+    SELECT hits.*, ts_headline(
+        'english', message.content, websearch_to_tsquery('english', %(q)s),
+        'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxFragments=2, MaxWords=18, MinWords=6'
+    ) AS snippet
+    FROM (
+        SELECT m.id, m.conversation_id, m.sender_id, m.created_at,
+               ts_rank(m.search_vector, websearch_to_tsquery('english', %(q)s)) AS rank
+        FROM messaging_message m
+        JOIN messaging_conversation_participants p
+          ON p.conversation_id = m.conversation_id AND p.user_id = %(user_id)s
+        WHERE m.search_vector @@ websearch_to_tsquery('english', %(q)s)
+    ) hits
+    JOIN messaging_message message ON message.id = hits.id
+    WHERE %(rank)s::real IS NULL
+       OR hits.rank < %(rank)s::real
+       OR (hits.rank = %(rank)s::real AND hits.id < %(last_id)s)
+    ORDER BY hits.rank DESC, hits.id DESC
+    LIMIT %(limit)s
+"""
+
+SQLITE_SEARCH = """
+    SELECT * FROM (
+        SELECT m.id, m.conversation_id, m.sender_id, m.created_at,
+               -bm25(messaging_message_fts) AS rank,
+               snippet(messaging_message_fts, 0, char(2), char(3), '...', 16) AS snippet
+        FROM messaging_message_fts
+        JOIN messaging_message m ON m.id = messaging_message_fts.rowid
+        JOIN messaging_conversation_participants p
+          ON p.conversation_id = m.conversation_id AND p.user_id = %(user_id)s
+        WHERE messaging_message_fts MATCH %(q)s
+    ) hits
+    WHERE %(rank)s IS NULL
+       OR hits.rank < %(rank)s
+       OR (hits.rank = %(rank)s AND hits.id < %(last_id)s)
+    ORDER BY hits.rank DESC, hits.id DESC
+    LIMIT %(limit)s
+"""
+
+
+class SearchNotSupported(Exception):
+    pass
+
+
+def fts5_query(text):
+    """Every word as a quoted FTS5 term, so user input can never be parsed as query syntax."""
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', text))
+
+
+def highlight(snippet):
+    escaped = html.escape(snippet or '')
+    return escaped.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def encode_cursor(rank, message_id):
+    return f'{rank!r}_{message_id}'
+
+
+def decode_cursor(cursor):
+    """Returns (rank, id); raises ValueError for anything malformed."""
+    rank, _, message_id = cursor.rpartition('_')
+    return float(rank), int(message_id)
+
+
+def _datetime(value):
+    # SQLite hands raw-cursor timestamps back as text.
+    if isinstance(value, str):
+        value = parse_datetime(value)
+        if value is not None and timezone.is_naive(value):
+            value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def search_messages(user, text, cursor=None, limit=SEARCH_PAGE_SIZE):
+    """
+    One page of the user's messages matching `text`, best match first.
+    Returns (hits, next_cursor).
+    """
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        sql, query = POSTGRES_SEARCH, text
+    elif vendor == 'sqlite':
+        sql, query = SQLITE_SEARCH, fts5_query(text)
+        if not query:
+            return [], None
+    else:
+        raise SearchNotSupported(f'Message search is not available on {vendor}')
+
+    rank, last_id = decode_cursor(cursor) if cursor else (None, None)
+    params = {
+        'q': query,
+        'user_id': user.id,
+        'rank': rank,
+        'last_id': last_id,
+        'limit': limit + 1,
+    }
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        columns = [column[0] for column in db_cursor.description]
+        rows = [dict(zip(columns, row)) for row in db_cursor.fetchall()]
+
+    next_cursor = encode_cursor(rows[limit - 1]['rank'], rows[limit - 1]['id']) if len(rows) > limit else None
+    hits = [
+        {
+            'message': row['id'],
+            'conversation': row['conversation_id'],
+            'sender': row['sender_id'],
+            'created_at': _datetime(row['created_at']),
+            'rank': row['rank'],
+            'snippet': highlight(row['snippet']),
+        }
+        for row in rows[:limit]
+    ]
+    return hits, next_cursor
@@ -0,0 +1,55 @@
+"""
+Message send path.
+
+send_message() writes the message in its final state with one INSERT, then
+moves the conversation, every participant's inbox entry and the sender's
+read watermark forward with set-based UPDATEs, and queues the participants'
+stream events, all in one transaction: a send is a fixed handful of
+statements however many people are in the conversation, and never
+half-applied.
+"""
+from django.db import transaction
+from django.utils import timezone
+from .events import publish_event
+from .inbox import record_message
+from .models import Conversation, Message
+
+
+def participant_ids(conversation_id):
+    return list(
+        Conversation.participants.through.objects.filter(conversation_id=conversation_id)
+        .values_list('user_id', flat=True)
+    )
+
+
+def is_participant(conversation_id, user_id):
+    return Conversation.participants.through.objects.filter(
+        conversation_id=conversation_id, user_id=user_id
+    ).exists()
+
+
+def send_message(conversation, sender, content, message_type='text', attachment=None):
+    now = timezone.now()
+    with transaction.atomic():
+        message = Message.objects.create(
+            conversation=conversation,
+            sender=sender,
+            message_type=message_type,
+            content=content,
+            attachment=attachment,
+            # Seen by the sender; recipients' state lives in their read watermarks.
+            is_read=True,
+            created_at=now,
+        )
+        Conversation.objects.filter(pk=conversation.pk).update(last_message_at=now)
+        record_message(message)
+        publish_event(participant_ids(conversation.pk), 'message.created', {
+            'id': message.id,
+            'conversation': conversation.pk,
+            'sender': sender.id,
+            'message_type': message_type,
+            'content': content,
+            'created_at': now.isoformat(),
+        })
+    conversation.last_message_at = now
+    return message
@@ -1,8 +1,15 @@
+from django.utils.text import Truncator
 from rest_framework import serializers
+from .conversations import get_or_create_conversation
 from .models import Conversation, Message, MessageReadReceipt
+from .sending import send_message
+from users.models import User
 from users.serializers import UserSerializer
+from projects.models import Project
 from projects.serializers import ProjectSerializer
 
+MESSAGE_PREVIEW_LENGTH = 140
+
 class MessageSerializer(serializers.ModelSerializer):
     sender = UserSerializer(read_only=True)
     
@@ -12,8 +19,7 @@ class MessageSerializer(serializers.ModelSerializer):
         read_only_fields = ('sender', 'created_at', 'is_read', 'read_at')
     
     def create(self, validated_data):
-        validated_data['sender'] = self.context['request'].user
-        return super().create(validated_data)
+        return send_message(sender=self.context['request'].user, **validated_data)
 
 class ConversationSerializer(serializers.ModelSerializer):
     participants = UserSerializer(many=True, read_only=True)
@@ -31,14 +37,66 @@ class ConversationSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('last_message_at', 'created_at', 'updated_at')
     
+    def validate(self, attrs):
+        if self.instance is None:
+            user_ids = set(attrs.get('participant_ids') or []) | {self.context['request'].user.id}
+            if len(user_ids) < 2:
+                raise serializers.ValidationError({'participant_ids': 'At least one other participant is required'})
+            if User.objects.filter(id__in=user_ids).count() != len(user_ids):
+                raise serializers.ValidationError({'participant_ids': 'Unknown participant'})
+            project_id = attrs.get('project_id')
+            if project_id is not None and not Project.objects.filter(id=project_id).exists():
+                raise serializers.ValidationError({'project_id': 'Project not found'})
+        return attrs
+    
     def create(self, validated_data):
-        participant_ids = validated_data.pop('participant_ids', [])
-        conversation = Conversation.objects.create(**validated_data)
-        if participant_ids:
-            from users.models import User
-            conversation.participants.set(User.objects.filter(id__in=participant_ids))
+        # The caller's existing thread with the same people and project is reused, never duplicated
+        user_ids = set(validated_data['participant_ids']) | {self.context['request'].user.id}
+        conversation, self.created = get_or_create_conversation(
+            user_ids, validated_data.get('project_id'), subject=validated_data.get('subject', '')
+        )
         return conversation
 
+class ParticipantSummarySerializer(serializers.Serializer):
+    id = serializers.IntegerField(read_only=True)
+    username = serializers.CharField(read_only=True)
+    avatar = serializers.SerializerMethodField()
+    
+    def get_avatar(self, obj):
+        profile = getattr(obj, 'profile', None)
+        if profile is None or not profile.profile_picture:
+            return None
+        url = profile.profile_picture.url
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+class ProjectSummarySerializer(serializers.Serializer):
+    id = serializers.IntegerField(read_only=True)
+    title = serializers.CharField(read_only=True)
+
+class LastMessagePreviewSerializer(serializers.Serializer):
+    id = serializers.IntegerField(read_only=True)
+    sender = serializers.IntegerField(source='sender_id', read_only=True)
+    message_type = serializers.CharField(read_only=True)
+    # Truncated, but keeps the MessageSerializer key the frontend reads
+    content = serializers.SerializerMethodField()
+    created_at = serializers.DateTimeField(read_only=True)
+    
+    def get_content(self, obj):
+        return Truncator(obj.content).chars(MESSAGE_PREVIEW_LENGTH)
+
+class ConversationListSerializer(serializers.ModelSerializer):
+    """Lightweight serializer for the inbox; see ConversationList for the matching prefetch plan"""
+    participants = ParticipantSummarySerializer(many=True, read_only=True)
+    project = ProjectSummarySerializer(read_only=True)
+    last_message = LastMessagePreviewSerializer(read_only=True)
+    unread_count = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = Conversation
+        fields = ('id', 'subject', 'participants', 'project', 'last_message', 'last_message_at', 'unread_count')
+        read_only_fields = fields
+
 class MessageReadReceiptSerializer(serializers.ModelSerializer):
     reader = UserSerializer(read_only=True)
     
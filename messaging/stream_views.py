@@ -0,0 +1,194 @@
+"""
+Endpoints for the real-time event stream (see messaging.events).
+
+These are plain Django async views rather than DRF views. Under ASGI an
+idle stream is then a parked coroutine instead of a blocked worker thread.
+The stream itself has a generator for each server type. Under WSGI, Django
+would drain an async generator with async_to_sync before sending anything,
+so WSGI requests get a synchronous generator instead. It holds its worker
+thread while connected, and ends after STREAM_WSGI_MAX_SECONDS so that
+workers are handed back. Clients then reconnect with Last-Event-ID.
+"""
+import asyncio
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from users.authentication import CachedJWTAuthentication, cached_user
+from .events import (
+    STREAM_BATCH_SIZE, STREAM_HEARTBEAT_SECONDS, events_after, get_transport, hub, latest_event_id,
+    redeem_stream_ticket,
+)
+
+LONG_POLL_DEFAULT_TIMEOUT = 25
+LONG_POLL_MAX_TIMEOUT = 55
+SSE_RETRY_MILLISECONDS = 3000
+STREAM_WSGI_MAX_SECONDS = 300
+
+
+def _authenticate(request):
+    """
+    A stream ticket from ?ticket= (EventSource cannot set headers; see
+    messaging.views.stream_ticket), or a JWT in the Authorization header.
+    """
+    ticket = request.GET.get('ticket')
+    if ticket:
+        user_id = redeem_stream_ticket(ticket)
+        if user_id is None:
+            return None
+        user, _ = cached_user(user_id)
+        return user if user is not None and user.is_active else None
+
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+        return result[0] if result else None
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+
+
+def _unauthorized():
+    return JsonResponse({'error': 'Authentication credentials were not provided or are invalid'}, status=401)
+
+
+def _cursor(request, param):
+    value = request.headers.get('Last-Event-ID') or request.GET.get(param)
+    if value in (None, ''):
+        return None
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        return None
+
+
+def _event_data(event):
+    return {
+        'id': event['id'],
+        'type': event['event_type'],
+        'payload': event['payload'],
+        'created_at': event['created_at'],
+    }
+
+
+def format_sse(event):
+    data = json.dumps(_event_data(event), cls=DjangoJSONEncoder)
+    return f"id: {event['id']}\nevent: {event['event_type']}\ndata: {data}\n\n"
+
+
+async def sse_events(user_id, last_event_id):
+    """The stream under ASGI: parks as a coroutine between events."""
+    get_transport().listen()
+    waiter = hub.subscribe(user_id)
+    try:
+        yield f'retry: {SSE_RETRY_MILLISECONDS}\n\n'
+        while True:
+            # Clear before reading so an event published mid-read still wakes us.
+            waiter.event.clear()
+            events = await sync_to_async(events_after)(user_id, last_event_id)
+            for event in events:
+                last_event_id = event['id']
+                yield format_sse(event)
+            if len(events) == STREAM_BATCH_SIZE:
+                continue
+            try:
+                await asyncio.wait_for(waiter.event.wait(), STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': heartbeat\n\n'
+    finally:
+        hub.unsubscribe(user_id, waiter)
+
+
+def sse_events_sync(user_id, last_event_id, max_seconds=STREAM_WSGI_MAX_SECONDS):
+    """The stream under WSGI: blocks its worker thread between events, for at most `max_seconds`."""
+    get_transport().listen()
+    waiter = hub.subscribe(user_id)
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield f'retry: {SSE_RETRY_MILLISECONDS}\n\n'
+        while True:
+            waiter.event.clear()
+            events = events_after(user_id, last_event_id)
+            for event in events:
+                last_event_id = event['id']
+                yield format_sse(event)
+            if len(events) == STREAM_BATCH_SIZE:
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if not waiter.event.wait(min(STREAM_HEARTBEAT_SECONDS, remaining)):
+                yield ': heartbeat\n\n'
+    finally:
+        hub.unsubscribe(user_id, waiter)
+
+
+@require_GET
+async def event_stream(request):
+    """Server-Sent Events: new messages, read-state changes and proposal status updates."""
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return _unauthorized()
+
+    last_event_id = _cursor(request, 'last_event_id')
+    if last_event_id is None:
+        last_event_id = await sync_to_async(latest_event_id)(user.id)
+
+    if isinstance(request, ASGIRequest):
+        stream = sse_events(user.id, last_event_id)
+    else:
+        stream = sse_events_sync(user.id, last_event_id)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_GET
+async def event_poll(request):
+    """
+    Long-poll fallback: returns as soon as there are events after ?after=
+    (or Last-Event-ID), or an empty list after ?timeout= seconds. Without a
+    cursor it returns immediately with the id to poll from.
+    """
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return _unauthorized()
+
+    after = _cursor(request, 'after')
+    if after is None:
+        latest = await sync_to_async(latest_event_id)(user.id)
+        return JsonResponse({'events': [], 'last_event_id': latest})
+
+    try:
+        timeout = float(request.GET.get('timeout', LONG_POLL_DEFAULT_TIMEOUT))
+    except ValueError:
+        timeout = LONG_POLL_DEFAULT_TIMEOUT
+    deadline = time.monotonic() + min(max(timeout, 0), LONG_POLL_MAX_TIMEOUT)
+
+    get_transport().listen()
+    waiter = hub.subscribe(user.id)
+    try:
+        while True:
+            waiter.event.clear()
+            events = await sync_to_async(events_after)(user.id, after)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(waiter.event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        hub.unsubscribe(user.id, waiter)
+
+    return JsonResponse(
+        {
+            'events': [_event_data(event) for event in events],
+            'last_event_id': events[-1]['id'] if events else after,
+        },
+        encoder=DjangoJSONEncoder,
+    )
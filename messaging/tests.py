@@ -1,3 +1,271 @@
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from users.models import User
+from .announcements import announcement_recipients, deliver_chunk, send_announcement
+from .conversations import get_or_create_conversation
+from .models import Conversation, ConversationReadState, InboxEntry, Message
+from .serializers import MESSAGE_PREVIEW_LENGTH
+from .sending import send_message
 
-# Create your tests here.
+
+class ConversationFixtureMixin:
+    """Three users and helpers to start conversations and read inbox state."""
+
+    def create_users(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='pass12345')
+        self.carol = User.objects.create_user(username='carol', email='carol@example.com', password='pass12345')
+
+    def api_for(self, user):
+        api = APIClient()
+        api.force_authenticate(user)
+        return api
+
+    def conversation(self, *users, project_id=None):
+        conversation, _ = get_or_create_conversation([user.id for user in users], project_id)
+        return conversation
+
+    def unread(self, user, conversation):
+        return InboxEntry.objects.get(user=user, conversation=conversation).unread_count
+
+    def watermark(self, user, conversation):
+        return ConversationReadState.objects.get(user=user, conversation=conversation).last_read_message_id
+
+
+class ConversationListTests(ConversationFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_users()
+
+    def create_conversations(self, count):
+        for _ in range(count):
+            n = User.objects.count()
+            other = User.objects.create_user(username=f'user{n}', email=f'user{n}@example.com', password='pass12345')
+            conversation = self.conversation(self.alice, self.bob, other)
+            send_message(conversation, other, f'message {n} ' + 'x' * 300)
+
+    def test_inbox_is_constant_queries(self):
+        api = self.api_for(self.alice)
+        self.create_conversations(2)
+        with self.assertNumQueries(3):
+            api.get(reverse('conversation-list'))
+
+        self.create_conversations(8)
+        with self.assertNumQueries(3):
+            response = api.get(reverse('conversation-list'))
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(len(results), 10)
+
+        conversation = results[0]
+        self.assertEqual(len(conversation['participants']), 3)
+        self.assertEqual(conversation['unread_count'], 1)
+        preview = conversation['last_message']['content']
+        self.assertTrue(preview.startswith('message 12 xxx'))
+        self.assertEqual(len(preview), MESSAGE_PREVIEW_LENGTH)
+        self.assertTrue(preview.endswith('…'))
+
+
+class ConversationCreateTests(ConversationFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_users()
+
+    def test_posting_the_same_participants_twice_returns_the_existing_thread(self):
+        url = reverse('conversation-list')
+        first = self.api_for(self.alice).post(url, {'participant_ids': [self.bob.id], 'subject': 'Hi'}, format='json')
+        self.assertEqual(first.status_code, 201)
+
+        again = self.api_for(self.alice).post(url, {'participant_ids': [self.bob.id, self.alice.id]}, format='json')
+        from_bob = self.api_for(self.bob).post(url, {'participant_ids': [self.alice.id]}, format='json')
+        self.assertEqual((again.status_code, from_bob.status_code), (200, 200))
+        self.assertEqual({again.data['id'], from_bob.data['id']}, {first.data['id']})
+        self.assertEqual(Conversation.objects.count(), 1)
+        self.assertEqual(InboxEntry.objects.filter(conversation_id=first.data['id']).count(), 2)
+
+        group = self.api_for(self.alice).post(url, {'participant_ids': [self.bob.id, self.carol.id]}, format='json')
+        self.assertEqual(group.status_code, 201)
+        self.assertEqual(Conversation.objects.count(), 2)
+
+    def test_unknown_or_missing_participants_are_rejected(self):
+        url = reverse('conversation-list')
+        api = self.api_for(self.alice)
+        self.assertEqual(api.post(url, {'participant_ids': [self.alice.id]}, format='json').status_code, 400)
+        self.assertEqual(api.post(url, {'participant_ids': [self.bob.id, 999999]}, format='json').status_code, 400)
+        self.assertFalse(Conversation.objects.exists())
+
+
+class InboxWatermarkTests(ConversationFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_users()
+        self.group = self.conversation(self.alice, self.bob, self.carol)
+
+    def test_send_counts_as_unread_for_recipients_only(self):
+        api = self.api_for(self.alice)
+        for content in ('one', 'two'):
+            response = api.post(reverse('message-list'), {'conversation': self.group.id, 'content': content}, format='json')
+            self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(self.unread(self.alice, self.group), 0)
+        self.assertEqual(self.unread(self.bob, self.group), 2)
+        self.assertEqual(self.unread(self.carol, self.group), 2)
+        self.assertEqual(self.watermark(self.alice, self.group), response.data['id'])
+
+        # Replying reads the thread for the sender and adds to everyone else's count.
+        send_message(self.group, self.bob, 'three')
+        self.assertEqual(self.unread(self.alice, self.group), 1)
+        self.assertEqual(self.unread(self.bob, self.group), 0)
+        self.assertEqual(self.unread(self.carol, self.group), 3)
+
+    def test_read_up_to_zeroes_the_count_and_never_moves_back(self):
+        first, second, last = [send_message(self.group, self.alice, f'message {n}') for n in range(3)]
+        url = reverse('conversation-read-up-to', args=[self.group.id])
+        api = self.api_for(self.bob)
+
+        response = api.post(url, {'message_id': second.id}, format='json')
+        self.assertEqual(response.data, {'advanced': True, 'last_read_message_id': second.id})
+        self.assertEqual(self.unread(self.bob, self.group), 1)
+
+        response = api.post(url, {}, format='json')
+        self.assertEqual(response.data, {'advanced': True, 'last_read_message_id': last.id})
+        self.assertEqual(self.unread(self.bob, self.group), 0)
+
+        response = api.post(url, {'message_id': first.id}, format='json')
+        self.assertFalse(response.data['advanced'])
+        self.assertEqual(self.watermark(self.bob, self.group), last.id)
+        self.assertEqual(self.unread(self.bob, self.group), 0)
+        self.assertEqual(self.unread(self.carol, self.group), 3)
+
+    def test_legacy_read_endpoint_advances_the_watermark(self):
+        first, second = [send_message(self.group, self.alice, f'message {n}') for n in range(2)]
+        api = self.api_for(self.bob)
+
+        response = api.post(reverse('message-mark-read', args=[first.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.watermark(self.bob, self.group), first.id)
+        self.assertEqual(self.unread(self.bob, self.group), 1)
+
+        api.post(reverse('message-mark-read', args=[second.id]))
+        api.post(reverse('message-mark-read', args=[first.id]))
+        self.assertEqual(self.watermark(self.bob, self.group), second.id)
+        self.assertEqual(self.unread(self.bob, self.group), 0)
+
+        response = self.api_for(self.alice).post(reverse('message-mark-read', args=[first.id]))
+        self.assertEqual(response.status_code, 400)
+
+    def test_unread_count_is_the_sum_over_conversations(self):
+        direct = self.conversation(self.carol, self.bob)
+        for n in range(3):
+            send_message(self.group, self.alice, f'group {n}')
+        for n in range(2):
+            send_message(direct, self.carol, f'direct {n}')
+        self.api_for(self.bob).post(reverse('conversation-read-up-to', args=[direct.id]), {}, format='json')
+        send_message(direct, self.carol, 'one more')
+
+        response = self.api_for(self.bob).get(reverse('unread-count'))
+        self.assertEqual(response.data['unread_count'], 4)
+        self.assertEqual(response.data['unread_count'], sum(
+            InboxEntry.objects.filter(user=self.bob).values_list('unread_count', flat=True)
+        ))
+        self.assertEqual(self.api_for(self.carol).get(reverse('unread-count')).data['unread_count'], 3)
+
+
+class MessageSearchTests(ConversationFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_users()
+
+    def walk(self, user, text, limit):
+        """Every hit from following `next` through the pages, in order."""
+        api = self.api_for(user)
+        response = api.get(reverse('message-search'), {'q': text, 'limit': limit})
+        hits = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), limit)
+            hits.extend(hit['message'] for hit in response.data['results'])
+            if not response.data['next']:
+                return hits
+            response = api.get(response.data['next'])
+
+    def test_pages_return_every_hit_once(self):
+        group = self.conversation(self.alice, self.bob, self.carol)
+        direct = self.conversation(self.alice, self.bob)
+        expected = []
+        for n in range(7):
+            # Repeated texts give equal ranks, so the id tiebreak is exercised too.
+            filler = ' padding' * (n % 3)
+            expected.append(send_message(group, self.bob, f'the invoice is attached{filler}').id)
+            expected.append(send_message(direct, self.alice, f'invoice {n} paid{filler}').id)
+        send_message(direct, self.bob, 'nothing to see here')
+
+        for limit in (1, 3, 50):
+            with self.subTest(limit=limit):
+                hits = self.walk(self.alice, 'invoice', limit)
+                self.assertEqual(len(hits), len(set(hits)))
+                self.assertEqual(set(hits), set(expected))
+
+    def test_messages_from_other_conversations_are_not_visible(self):
+        shared = self.conversation(self.alice, self.bob)
+        private = self.conversation(self.bob, self.carol)
+        visible = send_message(shared, self.bob, 'quarterly invoice')
+        send_message(private, self.carol, 'secret invoice details')
+        send_message(private, self.bob, 'another invoice')
+
+        self.assertEqual(self.walk(self.alice, 'invoice', 1), [visible.id])
+        self.assertEqual(self.walk(self.alice, 'secret', 10), [])
+        self.assertEqual(len(self.walk(self.bob, 'invoice', 1)), 3)
+
+
+class AnnouncementTests(ConversationFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_users()
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='pass12345', is_staff=True)
+        self.existing = self.conversation(self.admin, self.alice)
+        send_message(self.existing, self.alice, 'hello admin')
+
+    def announcements(self, user):
+        """{conversation id: announcement ids} in the user's threads with the admin."""
+        threads = {}
+        for conversation_id, message_id in Message.objects.filter(
+            conversation__participants=user, message_type='system'
+        ).values_list('conversation_id', 'id'):
+            threads.setdefault(conversation_id, []).append(message_id)
+        return threads
+
+    def test_announcements_reuse_one_to_one_threads(self):
+        recipients = [self.alice.id, self.bob.id, self.carol.id]
+        self.assertEqual(deliver_chunk(self.admin, recipients, 'Maintenance tonight', 'Announcement'), 2)
+        self.assertEqual(deliver_chunk(self.admin, recipients, 'Maintenance is over', 'Announcement'), 0)
+
+        self.assertEqual(Conversation.objects.count(), 3)
+        self.assertEqual(list(self.announcements(self.alice)), [self.existing.id])
+        for user in (self.alice, self.bob, self.carol):
+            threads = self.announcements(user)
+            self.assertEqual(len(threads), 1)
+            [(conversation_id, message_ids)] = threads.items()
+            self.assertEqual(len(message_ids), 2)
+            self.assertEqual(self.unread(user, Conversation(id=conversation_id)), 2)
+            self.assertEqual(
+                set(Conversation.objects.get(id=conversation_id).participants.values_list('id', flat=True)),
+                {self.admin.id, user.id},
+            )
+
+    def test_unread_counts_and_last_message_follow_the_announcement(self):
+        recipients = announcement_recipients(self.admin)
+        self.assertEqual(list(send_announcement(self.admin, recipients, 'Welcome', chunk_size=2)), [(2, 1), (1, 1)])
+
+        for user in (self.alice, self.bob, self.carol):
+            [(conversation_id, [message_id])] = self.announcements(user).items()
+            entry = InboxEntry.objects.get(user=user, conversation_id=conversation_id)
+            self.assertEqual(entry.unread_count, 1)
+            self.assertEqual(entry.last_message_id, message_id)
+
+            sender_entry = InboxEntry.objects.get(user=self.admin, conversation_id=conversation_id)
+            self.assertEqual(sender_entry.unread_count, 0)
+            self.assertEqual(sender_entry.last_message_id, message_id)
+            self.assertEqual(self.watermark(self.admin, Conversation(id=conversation_id)), message_id)
+
+        # Alice's unread reply before the announcement is read by the admin sending into the thread.
+        self.assertEqual(self.unread(self.alice, self.existing), 1)
+        self.assertEqual(self.unread(self.admin, self.existing), 0)
@@ -1,15 +1,23 @@
 from django.urls import path
-from . import views
+from . import stream_views, views
 
 urlpatterns = [
     # Conversations
     path('conversations/', views.ConversationList.as_view(), name='conversation-list'),
+    path('conversations/get-or-create/', views.find_or_create_conversation, name='conversation-get-or-create'),
     path('conversations/<int:pk>/', views.ConversationDetail.as_view(), name='conversation-detail'),
+    path('conversations/<int:pk>/read-up-to/', views.read_up_to, name='conversation-read-up-to'),
     
     # Messages
     path('messages/', views.MessageList.as_view(), name='message-list'),
     path('messages/<int:pk>/', views.MessageDetail.as_view(), name='message-detail'),
     path('messages/<int:pk>/read/', views.mark_message_read, name='message-mark-read'),
     path('unread-count/', views.unread_count, name='unread-count'),
+    path('search/', views.search_messages, name='message-search'),
+    
+    # Real-time events
+    path('events/', stream_views.event_stream, name='event-stream'),
+    path('events/ticket/', views.stream_ticket, name='event-stream-ticket'),
+    path('events/poll/', stream_views.event_poll, name='event-poll'),
 ]
 
@@ -1,36 +1,73 @@
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
-from django.db.models import Q, Max
-from .models import Conversation, Message, MessageReadReceipt
-from .serializers import ConversationSerializer, MessageSerializer, MessageReadReceiptSerializer
+from rest_framework.utils.urls import replace_query_param
+from django.db.models import Prefetch, Sum
+from django.db.models.functions import Coalesce
+from . import search
+from .conversations import get_or_create_conversation, refresh_participant_key
+from .events import STREAM_TICKET_SECONDS, issue_stream_ticket
+from .inbox import mark_read_up_to
+from .models import Conversation, InboxEntry, Message
+from .pagination import MessageCursorPagination
+from .sending import is_participant
+from .serializers import ConversationListSerializer, ConversationSerializer, MessageSerializer
+from projects.models import Project
+from users.models import User
 
 class ConversationList(generics.ListCreateAPIView):
     serializer_class = ConversationSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    def get_serializer_class(self):
+        if self.request.method == 'GET':
+            return ConversationListSerializer
+        return ConversationSerializer
+    
     def get_queryset(self):
-        user = self.request.user
-        conversations = Conversation.objects.filter(participants=user).annotate(
-            last_message_time=Max('messages__created_at')
-        ).order_by('-last_message_time', '-created_at')
+        # Materialized inbox: one indexed, paginated query on (user, last_message_at),
+        # plus one for the page's participants. Only the columns the compact
+        # ConversationListSerializer renders are loaded.
+        return InboxEntry.objects.filter(user=self.request.user).select_related(
+            'conversation__project',
+            'last_message',
+        ).only(
+            'id', 'unread_count', 'last_message_at',
+            'conversation__id', 'conversation__subject', 'conversation__last_message_at',
+            'conversation__project__id', 'conversation__project__title',
+            'last_message__id', 'last_message__sender_id', 'last_message__message_type',
+            'last_message__content', 'last_message__created_at',
+        ).prefetch_related(
+            Prefetch(
+                'conversation__participants',
+                queryset=User.objects.select_related('profile').only('id', 'username', 'profile__profile_picture'),
+            ),
+        ).order_by('-last_message_at', '-id')
+    
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        page = self.paginate_queryset(queryset)
+        entries = page if page is not None else list(queryset)
         
-        # Add unread count and last message to each conversation
-        for conv in conversations:
-            conv.unread_count = Message.objects.filter(
-                conversation=conv,
-                is_read=False
-            ).exclude(sender=user).count()
-            
-            last_msg = Message.objects.filter(conversation=conv).order_by('-created_at').first()
-            conv.last_message = last_msg
+        conversations = []
+        for entry in entries:
+            conversation = entry.conversation
+            conversation.unread_count = entry.unread_count
+            conversation.last_message = entry.last_message
+            conversations.append(conversation)
         
-        return conversations
+        serializer = self.get_serializer(conversations, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
     
-    def perform_create(self, serializer):
-        conversation = serializer.save()
-        # Add current user to participants
-        conversation.participants.add(self.request.user)
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        # 200 with the existing thread when these participants already have one
+        return Response(serializer.data, status=status.HTTP_201_CREATED if serializer.created else status.HTTP_200_OK)
 
 class ConversationDetail(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ConversationSerializer
@@ -38,10 +75,15 @@ class ConversationDetail(generics.RetrieveUpdateDestroyAPIView):
     
     def get_queryset(self):
         return Conversation.objects.filter(participants=self.request.user)
+    
+    def perform_update(self, serializer):
+        refresh_participant_key(serializer.save())
 
 class MessageList(generics.ListCreateAPIView):
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessageCursorPagination
+    conversation = None
     
     def get_queryset(self):
         conversation_id = self.request.query_params.get('conversation', None)
@@ -52,27 +94,19 @@ class MessageList(generics.ListCreateAPIView):
                     id=conversation_id,
                     participants=self.request.user
                 )
-                return Message.objects.filter(conversation=conversation).order_by('created_at')
-            except Conversation.DoesNotExist:
+                # Lets the paginator continue into this conversation's archive
+                self.conversation = conversation
+                return Message.objects.filter(conversation=conversation).select_related('sender__profile')
+            except (Conversation.DoesNotExist, ValueError):
                 return Message.objects.none()
         return Message.objects.none()
     
     def perform_create(self, serializer):
-        message = serializer.save()
-        # Update conversation last message time
-        conversation = message.conversation
-        from django.utils import timezone
-        conversation.last_message_at = timezone.now()
-        conversation.save(update_fields=['last_message_at'])
-        
-        # Mark as read for sender
-        MessageReadReceipt.objects.get_or_create(
-            message=message,
-            reader=self.request.user,
-            defaults={'read_at': timezone.now()}
-        )
-        message.is_read = True
-        message.save(update_fields=['is_read'])
+        conversation = serializer.validated_data['conversation']
+        if not is_participant(conversation.id, self.request.user.id):
+            raise PermissionDenied('You are not a participant in this conversation')
+        # One transaction: message, conversation, inbox entries and watermark
+        serializer.save()
 
 class MessageDetail(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = MessageSerializer
@@ -86,30 +120,115 @@ class MessageDetail(generics.RetrieveUpdateDestroyAPIView):
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def mark_message_read(request, pk):
+    # Kept for older clients: reading one message reads everything up to it.
     try:
-        message = Message.objects.get(
+        message = Message.objects.only('id', 'conversation_id', 'sender_id').get(
             pk=pk,
             conversation__participants=request.user
         )
-        if message.sender != request.user:
-            MessageReadReceipt.objects.get_or_create(
-                message=message,
-                reader=request.user
-            )
-            message.is_read = True
-            from django.utils import timezone
-            message.read_at = timezone.now()
-            message.save(update_fields=['is_read', 'read_at'])
+        if message.sender_id != request.user.id:
+            mark_read_up_to(request.user, message.conversation_id, message.id)
             return Response({'message': 'Message marked as read'}, status=status.HTTP_200_OK)
         return Response({'error': 'Cannot mark own message as read'}, status=status.HTTP_400_BAD_REQUEST)
     except Message.DoesNotExist:
         return Response({'error': 'Message not found'}, status=status.HTTP_404_NOT_FOUND)
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def read_up_to(request, pk):
+    """Advance the caller's read watermark to message_id, or to the latest message if omitted."""
+    if not Conversation.objects.filter(pk=pk, participants=request.user).exists():
+        return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    messages = Message.objects.filter(conversation_id=pk)
+    message_id = request.data.get('message_id')
+    if message_id in (None, ''):
+        message_id = messages.order_by('-id').values_list('id', flat=True).first()
+        if message_id is None:
+            return Response({'advanced': False, 'last_read_message_id': None}, status=status.HTTP_200_OK)
+    else:
+        try:
+            message_id = int(message_id)
+        except (TypeError, ValueError):
+            return Response({'error': 'message_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not messages.filter(id=message_id).exists():
+            return Response({'error': 'Message not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    advanced = mark_read_up_to(request.user, pk, message_id)
+    return Response({'advanced': advanced, 'last_read_message_id': message_id}, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def find_or_create_conversation(request):
+    """
+    The caller's conversation with participant_ids about project_id, found by
+    participant key in one indexed lookup, or created if there is none.
+    """
+    try:
+        user_ids = {int(user_id) for user_id in request.data.get('participant_ids') or []}
+        project_id = request.data.get('project_id')
+        project_id = int(project_id) if project_id not in (None, '') else None
+    except (TypeError, ValueError):
+        return Response({'error': 'participant_ids and project_id must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    user_ids.add(request.user.id)
+    if len(user_ids) < 2:
+        return Response({'error': 'At least one other participant is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if User.objects.filter(id__in=user_ids).count() != len(user_ids):
+        return Response({'error': 'Unknown participant'}, status=status.HTTP_400_BAD_REQUEST)
+    if project_id is not None and not Project.objects.filter(id=project_id).exists():
+        return Response({'error': 'Project not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    conversation, created = get_or_create_conversation(
+        user_ids, project_id, subject=request.data.get('subject', '')
+    )
+    serializer = ConversationSerializer(conversation, context={'request': request})
+    return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def search_messages(request):
+    """Ranked full-text search over conversations the caller participates in."""
+    text = request.query_params.get('q', '').strip()
+    if len(text) < 2:
+        return Response({'error': 'Search query must be at least 2 characters'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        limit = min(max(int(request.query_params.get('limit', search.SEARCH_PAGE_SIZE)), 1), search.SEARCH_MAX_PAGE_SIZE)
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            search.decode_cursor(cursor)
+    except ValueError:
+        return Response({'error': 'Invalid limit or cursor'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        hits, next_cursor = search.search_messages(request.user, text, cursor=cursor, limit=limit)
+    except search.SearchNotSupported as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+    
+    next_url = None
+    if next_cursor:
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor)
+    return Response({'next': next_url, 'results': hits}, status=status.HTTP_200_OK)
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def unread_count(request):
-    count = Message.objects.filter(
-        conversation__participants=request.user,
-        is_read=False
-    ).exclude(sender=request.user).count()
+    # Inbox unread counts are maintained from the read watermarks
+    count = InboxEntry.objects.filter(user=request.user).aggregate(
+        total=Coalesce(Sum('unread_count'), 0)
+    )['total']
     return Response({'unread_count': count}, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def stream_ticket(request):
+    """
+    A single-use ticket for opening the event stream as ?ticket=, since
+    EventSource cannot send the Authorization header. Fetch a new one for
+    every (re)connection.
+    """
+    return Response({
+        'ticket': issue_stream_ticket(request.user.id),
+        'expires_in': STREAM_TICKET_SECONDS,
+    }, status=status.HTTP_201_CREATED)
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import PaymentMethod, Wallet, Transaction, Escrow, Invoice
+from django.utils import timezone
+from .models import PaymentMethod, Wallet, Transaction, Escrow, Invoice, InvoiceSequence, FxRate, PayoutBatch, WebhookEvent, RiskHold
 
 @admin.register(PaymentMethod)
 class PaymentMethodAdmin(admin.ModelAdmin):
@@ -23,8 +24,8 @@ class TransactionAdmin(admin.ModelAdmin):
 
 @admin.register(Escrow)
 class EscrowAdmin(admin.ModelAdmin):
-    list_display = ['project', 'client', 'freelancer', 'amount', 'status', 'created_at']
-    list_filter = ['status', 'created_at']
+    list_display = ['project', 'client', 'freelancer', 'amount', 'status', 'stale_flagged_at', 'created_at']
+    list_filter = ['status', 'stale_flagged_at', 'created_at']
     search_fields = ['project__title', 'client__username', 'freelancer__username']
     readonly_fields = ['created_at', 'updated_at', 'funded_at', 'released_at', 'refunded_at']
 
@@ -34,3 +35,49 @@ class InvoiceAdmin(admin.ModelAdmin):
     list_filter = ['status', 'due_date', 'created_at']
     search_fields = ['invoice_number', 'project__title', 'client__username', 'freelancer__username']
     readonly_fields = ['created_at', 'updated_at', 'paid_at']
+
+@admin.register(InvoiceSequence)
+class InvoiceSequenceAdmin(admin.ModelAdmin):
+    list_display = ['name', 'next_value', 'updated_at']
+    readonly_fields = ['updated_at']
+
+@admin.register(FxRate)
+class FxRateAdmin(admin.ModelAdmin):
+    list_display = ['currency', 'date', 'rate']
+    list_filter = ['currency']
+    date_hierarchy = 'date'
+
+@admin.register(PayoutBatch)
+class PayoutBatchAdmin(admin.ModelAdmin):
+    list_display = ['id', 'currency', 'status', 'total_amount', 'payee_count', 'release_count', 'created_at']
+    list_filter = ['status', 'currency', 'created_at']
+    readonly_fields = ['created_at', 'submitted_at']
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'gateway', 'event_type', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'gateway', 'event_type']
+    search_fields = ['event_id']
+    readonly_fields = ['received_at', 'processed_at']
+
+@admin.register(RiskHold)
+class RiskHoldAdmin(admin.ModelAdmin):
+    list_display = ['user', 'action', 'target', 'amount', 'ip_address', 'status', 'created_at', 'consumed_at']
+    list_filter = ['status', 'action', 'created_at']
+    search_fields = ['user__username', 'target', 'ip_address']
+    readonly_fields = ['created_at', 'reviewed_by', 'reviewed_at', 'consumed_at']
+    actions = ['approve_holds', 'reject_holds']
+    
+    def _review(self, request, queryset, new_status):
+        updated = queryset.filter(status='pending').update(
+            status=new_status, reviewed_by=request.user, reviewed_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} holds {new_status}.')
+    
+    @admin.action(description='Approve selected holds')
+    def approve_holds(self, request, queryset):
+        self._review(request, queryset, 'approved')
+    
+    @admin.action(description='Reject selected holds')
+    def reject_holds(self, request, queryset):
+        self._review(request, queryset, 'rejected')
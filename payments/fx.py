@@ -0,0 +1,129 @@
+"""
+Currency conversion for payment aggregates.
+
+Amounts are converted into settings.FX_BASE_CURRENCY using the latest FxRate
+on or before the row's date. Aggregations do the conversion in SQL through
+converted_amount(), so a mixed-currency total is still a single query.
+Rows with no known rate cannot be converted; converted_totals() and
+converted_groups() report them per currency instead of leaving them out of
+the total unnoticed.
+"""
+import csv
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.utils.dateparse import parse_date
+from .models import FxRate
+
+RATE_FIELD = DecimalField(max_digits=18, decimal_places=8)
+AMOUNT_FIELD = DecimalField(max_digits=20, decimal_places=2)
+
+
+def base_currency():
+    return getattr(settings, 'FX_BASE_CURRENCY', 'USD')
+
+
+def rate_expression(currency_field='currency', date_field='created_at'):
+    """
+    SQL expression for the rate applying to each row: the latest FxRate for
+    the row's currency dated on or before the row, 1 for the base currency,
+    NULL when no rate is known (so Sum() skips the row rather than guess).
+    """
+    latest_rate = FxRate.objects.filter(
+        currency=OuterRef(currency_field),
+        date__lte=OuterRef(date_field),
+    ).order_by('-date').values('rate')[:1]
+    return Case(
+        When(**{currency_field: base_currency()}, then=Value(Decimal('1'), output_field=RATE_FIELD)),
+        default=Subquery(latest_rate, output_field=RATE_FIELD),
+        output_field=RATE_FIELD,
+    )
+
+
+def converted_amount(amount_field, currency_field='currency', date_field='created_at'):
+    """`amount_field` expressed in the base currency, as an SQL expression."""
+    return Cast(
+        F(amount_field) * rate_expression(currency_field, date_field),
+        output_field=AMOUNT_FIELD,
+    )
+
+
+def converted_groups(queryset, group_by, amount_field, currency_field='currency', date_field='created_at'):
+    """
+    converted_totals() for each distinct value of the `group_by` fields, in
+    one query: {(values...): (total, unconverted)}. Groups whose rows all
+    lack a rate are still present, with a zero total.
+    """
+    rows = queryset.annotate(
+        fx_rate=rate_expression(currency_field, date_field),
+    ).values(*group_by, currency_field).annotate(
+        converted=Sum(Cast(F(amount_field) * F('fx_rate'), output_field=AMOUNT_FIELD)),
+        unconverted=Sum(Case(
+            When(fx_rate__isnull=True, then=F(amount_field)),
+            output_field=AMOUNT_FIELD,
+        )),
+    ).order_by()
+
+    groups = {}
+    for row in rows:
+        key = tuple(row[field] for field in group_by)
+        total, unconverted = groups.get(key, (Decimal('0.00'), {}))
+        total += row['converted'] or Decimal('0.00')
+        if row['unconverted']:
+            unconverted[row[currency_field]] = Decimal(row['unconverted']).quantize(Decimal('0.01'))
+        groups[key] = (Decimal(total).quantize(Decimal('0.01')), unconverted)
+    return groups
+
+
+def converted_totals(queryset, amount_field, currency_field='currency', date_field='created_at'):
+    """
+    (total, unconverted) for `amount_field` in one query: the sum of every
+    convertible row in the base currency, and {currency: amount} for rows
+    with no rate on or before their date, which the total leaves out.
+    """
+    groups = converted_groups(queryset, (), amount_field, currency_field, date_field)
+    return groups.get((), (Decimal('0.00'), {}))
+
+
+def unconverted_report(**amounts):
+    """{metric: {currency: amount}} for the metrics that left something unconverted, as floats for JSON."""
+    return {
+        name: {currency: float(amount) for currency, amount in unconverted.items()}
+        for name, unconverted in amounts.items() if unconverted
+    }
+
+
+def load_rates_file(path, batch_size=1000):
+    """
+    Upsert rates from a CSV file with currency,date,rate columns.
+    Returns the number of rows loaded.
+    """
+    loaded = 0
+    batch = []
+    with open(path, newline='') as rates_file:
+        for row in csv.DictReader(rates_file):
+            day = parse_date(row['date'].strip())
+            if day is None:
+                raise ValueError(f"Invalid date {row['date']!r} for {row['currency']}")
+            batch.append(FxRate(
+                currency=row['currency'].strip().upper(),
+                date=day,
+                rate=Decimal(row['rate'].strip()),
+            ))
+            if len(batch) >= batch_size:
+                loaded += _upsert(batch)
+                batch = []
+    if batch:
+        loaded += _upsert(batch)
+    return loaded
+
+
+def _upsert(rates):
+    FxRate.objects.bulk_create(
+        rates,
+        update_conflicts=True,
+        unique_fields=['currency', 'date'],
+        update_fields=['rate'],
+    )
+    return len(rates)
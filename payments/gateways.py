@@ -0,0 +1,111 @@
+"""
+Payment gateway backends.
+
+settings.PAYMENT_GATEWAY names the backend class. A backend only *starts* a
+charge: charge() returns the gateway's reference straight away and the
+outcome arrives later as a webhook, which lands in the WebhookEvent inbox and
+is applied by process_webhooks. Request threads never wait on settlement.
+"""
+import hashlib
+import hmac
+import json
+import random
+import uuid
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+_gateway = None
+
+
+class WebhookError(Exception):
+    """Raised when a webhook delivery is malformed or its signature does not match."""
+
+
+class PaymentGateway:
+    """Interface every gateway backend implements."""
+    name = None
+
+    def charge(self, payment):
+        """
+        Start charging `payment` (a Transaction) and return the gateway's
+        reference for it. Must not wait for the charge to settle.
+        """
+        raise NotImplementedError
+
+    def parse_webhook(self, request):
+        """
+        Verify an incoming webhook request and return its events as a list
+        of {'id', 'type', 'data'} dicts. Raises WebhookError if invalid.
+        """
+        raise NotImplementedError
+
+
+def sign_payload(body, secret=None):
+    secret = secret or settings.PAYMENT_WEBHOOK_SECRET
+    return hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+class SimulatorGateway(PaymentGateway):
+    """
+    Local stand-in for a real processor. Charges settle as soon as the
+    creating transaction commits: the simulator "delivers" a signed
+    charge.succeeded (or charge.failed, at PAYMENT_SIMULATOR_FAILURE_RATE)
+    event into the webhook inbox, exactly as the HTTP endpoint would.
+    """
+    name = 'simulator'
+    signature_header = 'X-Simulator-Signature'
+
+    def __init__(self, failure_rate=None):
+        if failure_rate is None:
+            failure_rate = getattr(settings, 'PAYMENT_SIMULATOR_FAILURE_RATE', 0)
+        self.failure_rate = failure_rate
+
+    def charge(self, payment):
+        reference = f'sim_ch_{uuid.uuid4().hex}'
+        succeeded = random.random() >= self.failure_rate
+        event = {
+            'id': f'sim_evt_{uuid.uuid4().hex}',
+            'type': 'charge.succeeded' if succeeded else 'charge.failed',
+            'data': {
+                'charge': reference,
+                'amount': str(payment.amount),
+                'currency': payment.currency,
+            },
+        }
+        transaction.on_commit(lambda: self.deliver([event]))
+        return reference
+
+    def webhook_body(self, events):
+        """Serialized, signed body for `events`, as it would arrive over HTTP."""
+        body = json.dumps({'events': events}).encode('utf-8')
+        return body, sign_payload(body)
+
+    def deliver(self, events):
+        from .webhooks import record_events
+        body, signature = self.webhook_body(events)
+        return record_events(self.name, self.verify(body, signature))
+
+    def verify(self, body, signature):
+        if not signature or not hmac.compare_digest(sign_payload(body), signature):
+            raise WebhookError('Invalid webhook signature')
+        try:
+            events = json.loads(body)['events']
+        except (ValueError, KeyError, TypeError):
+            raise WebhookError('Malformed webhook body')
+        if not isinstance(events, list) or not all(
+            isinstance(event, dict) and event.get('id') and event.get('type') for event in events
+        ):
+            raise WebhookError('Malformed webhook body')
+        return events
+
+    def parse_webhook(self, request):
+        return self.verify(request.body, request.headers.get(self.signature_header))
+
+
+def get_gateway():
+    """The configured gateway backend, instantiated once per process."""
+    global _gateway
+    if _gateway is None:
+        _gateway = import_string(settings.PAYMENT_GATEWAY)()
+    return _gateway
@@ -0,0 +1,258 @@
+"""
+Invoice PDF rendering pipeline.
+
+PDFs are rendered in a bounded process pool, never in a request thread, and
+stored in media under a hash of the invoice content. An unchanged invoice
+maps to the same file, so it is rendered at most once; editing an invoice
+changes the hash and the next request renders a fresh copy.
+
+A failed render is recorded in the cache against the content hash. Requests
+get a 503 with the error until a backoff that doubles with each failure has
+passed, and only then is the render attempted again.
+"""
+import hashlib
+import json
+import math
+import multiprocessing
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import HttpResponse
+from rest_framework import renderers
+from .pdf import render_invoice_document
+
+INVOICE_RENDER_WORKERS = 2
+INVOICE_PDF_DIR = 'invoices'
+# Bump when the layout in payments.pdf changes so cached PDFs are re-rendered.
+INVOICE_LAYOUT_VERSION = 1
+# A failed render is retried after this many seconds, doubling per failure up to a day.
+RENDER_RETRY_SECONDS = 60
+RENDER_RETRY_MAX_SECONDS = 24 * 60 * 60
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = {}
+
+
+class PDFRenderer(renderers.BaseRenderer):
+    """
+    Lets clients send Accept: application/pdf. PDFs are written directly to
+    the HttpResponse, so only error payloads pass through render().
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode('utf-8')
+
+
+def invoice_document(invoice):
+    """Everything that appears on the PDF, as plain picklable data."""
+    return {
+        'layout': INVOICE_LAYOUT_VERSION,
+        'invoice_number': invoice.invoice_number,
+        'status': invoice.get_status_display(),
+        'created_at': invoice.created_at.date().isoformat(),
+        'due_date': invoice.due_date.date().isoformat(),
+        'paid_at': invoice.paid_at.date().isoformat() if invoice.paid_at else None,
+        'client': invoice.client.get_full_name() or invoice.client.username,
+        'freelancer': invoice.freelancer.get_full_name() or invoice.freelancer.username,
+        'project': invoice.project.title,
+        'items': [
+            {
+                'description': str(item.get('description', '')),
+                'amount': str(item.get('amount', '')),
+            }
+            for item in invoice.items if isinstance(item, dict)
+        ],
+        'amount': str(invoice.amount),
+        'tax_amount': str(invoice.tax_amount),
+        'total_amount': str(invoice.total_amount),
+        'currency': invoice.currency,
+        'notes': invoice.notes,
+    }
+
+
+def document_hash(document):
+    payload = json.dumps(document, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def invoice_pdf_path(content_hash):
+    return f'{INVOICE_PDF_DIR}/{content_hash[:2]}/{content_hash}.pdf'
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: forking a threaded web worker is unsafe, and the renderer
+            # only needs payments.pdf, which does not touch Django.
+            _executor = ProcessPoolExecutor(
+                max_workers=INVOICE_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def store_pdf(content_hash, pdf_bytes):
+    path = invoice_pdf_path(content_hash)
+    if not default_storage.exists(path):
+        default_storage.save(path, ContentFile(pdf_bytes))
+    return path
+
+
+def render_failure_key(content_hash):
+    return f'invoice-pdf:failed:{content_hash}'
+
+
+def render_failure(content_hash):
+    """The recorded failure for this content, as {'status', 'error', 'attempts', 'retry_at'}, or None."""
+    return cache.get(render_failure_key(content_hash))
+
+
+def render_retry_after(failure):
+    """Whole seconds until a failed render may be retried; 0 once the backoff has passed."""
+    return max(0, math.ceil(failure['retry_at'] - time.time()))
+
+
+def record_render_failure(content_hash, exc):
+    previous = render_failure(content_hash)
+    attempts = previous['attempts'] + 1 if previous else 1
+    backoff = min(RENDER_RETRY_SECONDS * 2 ** (attempts - 1), RENDER_RETRY_MAX_SECONDS)
+    entry = {
+        'status': 'failed',
+        'error': f'{type(exc).__name__}: {exc}',
+        'attempts': attempts,
+        'retry_at': time.time() + backoff,
+    }
+    # Outlives the backoff so the next failure keeps doubling it.
+    cache.set(render_failure_key(content_hash), entry, backoff + RENDER_RETRY_MAX_SECONDS)
+    return entry
+
+
+def schedule_render(document, content_hash):
+    """Queue a render without waiting for it; concurrent requests share one job."""
+    executor = get_executor()
+    with _executor_lock:
+        future = _in_flight.get(content_hash)
+        if future is not None:
+            return future
+        future = executor.submit(render_invoice_document, document)
+        _in_flight[content_hash] = future
+
+    def finished(done):
+        try:
+            exc = done.exception()
+            if exc is None:
+                store_pdf(content_hash, done.result())
+                cache.delete(render_failure_key(content_hash))
+            else:
+                record_render_failure(content_hash, exc)
+        finally:
+            with _executor_lock:
+                _in_flight.pop(content_hash, None)
+
+    future.add_done_callback(finished)
+    return future
+
+
+def render_invoices(invoices):
+    """
+    Render every invoice whose PDF is not cached yet, keeping at most two
+    jobs per worker outstanding. Failures are recorded as for on-demand
+    renders. Returns (rendered, cached, failed) counts.
+    """
+    executor = get_executor()
+    pending = {}
+    rendered = cached = failed = 0
+
+    def collect(done_futures):
+        nonlocal rendered, failed
+        for future in done_futures:
+            content_hash = pending.pop(future)
+            exc = future.exception()
+            if exc is not None:
+                record_render_failure(content_hash, exc)
+                failed += 1
+                continue
+            store_pdf(content_hash, future.result())
+            cache.delete(render_failure_key(content_hash))
+            rendered += 1
+
+    for invoice in invoices:
+        document = invoice_document(invoice)
+        content_hash = document_hash(document)
+        if default_storage.exists(invoice_pdf_path(content_hash)):
+            cached += 1
+            continue
+        if len(pending) >= INVOICE_RENDER_WORKERS * 2:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+        pending[executor.submit(render_invoice_document, document)] = content_hash
+
+    if pending:
+        done, _ = wait(pending)
+        collect(done)
+    return rendered, cached, failed
+
+
+def parse_byte_range(header, size):
+    """
+    Parse a single 'bytes=start-end' Range header. Returns (start, end)
+    inclusive, or None when the header should be ignored and the whole file
+    sent. Raises ValueError when the range cannot be satisfied.
+    """
+    units, _, spec = header.partition('=')
+    if units.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, _, last = spec.strip().partition('-')
+    if (first and not first.isdigit()) or (last and not last.isdigit()) or not (first or last):
+        return None
+
+    if not first:
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError('Range not satisfiable')
+        start, end = max(size - suffix, 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def pdf_file_response(request, path, etag, filename):
+    """Serve a cached PDF with ETag and single-range support."""
+    with default_storage.open(path, 'rb') as pdf_file:
+        data = pdf_file.read()
+    size = len(data)
+
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    byte_range = None
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range:
+        start, end = byte_range
+        response = HttpResponse(data[start:end + 1], status=206, content_type='application/pdf')
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        response = HttpResponse(data, content_type='application/pdf')
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
+    return response
@@ -0,0 +1,170 @@
+"""
+Invoice numbering and batch invoice generation.
+
+Invoice numbers come from InvoiceSequence in blocks: each worker reserves
+INVOICE_NUMBER_BLOCK_SIZE numbers with one short row lock and hands them out
+from memory. Numbers are unique and increasing per worker, but a worker that
+exits early leaves a gap, the usual trade-off for contention-free numbering.
+"""
+import threading
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .models import Escrow, Invoice, InvoiceSequence
+
+INVOICE_SEQUENCE_NAME = 'invoice'
+INVOICE_NUMBER_BLOCK_SIZE = 100
+INVOICE_BATCH_SIZE = 500
+
+
+def format_invoice_number(value):
+    return f"INV-{value:08d}"
+
+
+class InvoiceNumberAllocator:
+    """Hands out invoice numbers from a block reserved in InvoiceSequence."""
+
+    def __init__(self, name=INVOICE_SEQUENCE_NAME, block_size=INVOICE_NUMBER_BLOCK_SIZE):
+        self.name = name
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def reserve_block(self, size):
+        """Reserve `size` consecutive values; returns the first one."""
+        with transaction.atomic():
+            sequence, created = InvoiceSequence.objects.select_for_update().get_or_create(name=self.name)
+            start = sequence.next_value
+            sequence.next_value = start + size
+            sequence.save(update_fields=['next_value', 'updated_at'])
+        return start
+
+    def next_number(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._next = self.reserve_block(self.block_size)
+                self._end = self._next + self.block_size
+            value = self._next
+            self._next += 1
+        return format_invoice_number(value)
+
+    def take(self, count):
+        """Return `count` invoice numbers, reserving one block sized for the batch if needed."""
+        with self._lock:
+            available = self._end - self._next
+            if available < count:
+                # Drop the leftover of the current block rather than split a batch.
+                self._next = self.reserve_block(max(count, self.block_size))
+                self._end = self._next + max(count, self.block_size)
+            values = range(self._next, self._next + count)
+            self._next += count
+        return [format_invoice_number(value) for value in values]
+
+
+invoice_numbers = InvoiceNumberAllocator()
+
+
+def _milestone_amount(milestone):
+    for key in ('amount', 'price', 'cost'):
+        if key in milestone:
+            try:
+                return Decimal(str(milestone[key])).quantize(Decimal('0.01'))
+            except (InvalidOperation, TypeError, ValueError):
+                return None
+    return None
+
+
+def invoice_items_for_escrow(escrow):
+    """
+    Build Invoice.items from the accepted proposal's milestones. Milestones
+    without an amount are listed at zero. Any difference from the escrow
+    amount becomes a final line, positive for what the milestones do not
+    cover and negative when they add up to more, so the items always sum to
+    escrow.amount.
+    """
+    items = []
+    for index, milestone in enumerate(escrow.proposal.milestones or [], start=1):
+        if isinstance(milestone, dict):
+            description = (
+                milestone.get('title') or milestone.get('name')
+                or milestone.get('description') or f'Milestone {index}'
+            )
+            amount = _milestone_amount(milestone)
+        else:
+            description, amount = str(milestone), None
+        items.append({
+            'description': description,
+            'amount': str(amount or Decimal('0.00')),
+        })
+
+    covered = sum((Decimal(item['amount']) for item in items), Decimal('0.00'))
+    remaining = escrow.amount - covered
+    if remaining > 0 or not items:
+        items.append({
+            'description': f'Project: {escrow.project.title}',
+            'amount': str(remaining),
+        })
+    elif remaining < 0:
+        items.append({
+            'description': 'Adjustment: milestones exceed the escrowed amount',
+            'amount': str(remaining),
+        })
+    return items
+
+
+def escrows_missing_invoices():
+    """Released escrows that have no invoice for their project/proposal yet."""
+    has_invoice = Invoice.objects.filter(
+        project_id=OuterRef('project_id'),
+        proposal_id=OuterRef('proposal_id')
+    )
+    return Escrow.objects.filter(status='released').filter(~Exists(has_invoice))
+
+
+def build_invoice(escrow, invoice_number):
+    paid_at = escrow.released_at or timezone.now()
+    return Invoice(
+        invoice_number=invoice_number,
+        project=escrow.project,
+        proposal=escrow.proposal,
+        client_id=escrow.client_id,
+        freelancer_id=escrow.freelancer_id,
+        amount=escrow.amount,
+        currency=escrow.currency,
+        tax_amount=Decimal('0.00'),
+        total_amount=escrow.amount,
+        status='paid',
+        due_date=paid_at,
+        paid_at=paid_at,
+        items=invoice_items_for_escrow(escrow),
+    )
+
+
+def generate_missing_invoices(batch_size=INVOICE_BATCH_SIZE, allocator=None):
+    """
+    Create invoices for every released escrow lacking one, walking escrows in
+    primary-key order and writing each chunk with a single bulk_create.
+    Overlapping runs are safe: the unique (project, proposal) constraint
+    drops an invoice another run already wrote, leaving a gap in numbering.
+    Yields the number of invoices created per chunk.
+    """
+    allocator = allocator or invoice_numbers
+    last_id = 0
+    while True:
+        chunk = list(
+            escrows_missing_invoices()
+            .filter(id__gt=last_id)
+            .select_related('project', 'proposal')
+            .order_by('id')[:batch_size]
+        )
+        if not chunk:
+            return
+        last_id = chunk[-1].id
+
+        numbers = allocator.take(len(chunk))
+        invoices = [build_invoice(escrow, number) for escrow, number in zip(chunk, numbers)]
+        with transaction.atomic():
+            Invoice.objects.bulk_create(invoices, batch_size=batch_size, ignore_conflicts=True)
+        yield Invoice.objects.filter(invoice_number__in=numbers).count()
@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from payments.invoicing import INVOICE_BATCH_SIZE, escrows_missing_invoices, generate_missing_invoices
+
+
+class Command(BaseCommand):
+    help = 'Generate invoices for released escrows that do not have one yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=INVOICE_BATCH_SIZE,
+                            help='Escrows processed per bulk_create chunk')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many invoices would be created')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            pending = escrows_missing_invoices().count()
+            self.stdout.write(f'{pending} released escrows are missing an invoice')
+            return
+
+        started = time.monotonic()
+        total = 0
+        for created in generate_missing_invoices(batch_size=options['batch_size']):
+            total += created
+            self.stdout.write(f'  - created {created} invoices ({total} so far)')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'\n✓ Generated {total} invoices in {elapsed:.2f}s'))
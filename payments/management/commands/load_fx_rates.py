@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+from payments.fx import base_currency, load_rates_file
+
+
+class Command(BaseCommand):
+    help = 'Load daily FX rates from a CSV file with currency,date,rate columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file; rate is the value of one unit in the base currency')
+
+    def handle(self, *args, **options):
+        try:
+            loaded = load_rates_file(options['path'])
+        except (OSError, KeyError, ValueError, ArithmeticError) as e:
+            raise CommandError(f'Could not load FX rates: {e}')
+        self.stdout.write(self.style.SUCCESS(f'✓ Loaded {loaded} FX rates (base currency {base_currency()})'))
@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from payments.webhooks import WEBHOOK_BATCH_SIZE, pending_events, process_webhooks
+
+
+class Command(BaseCommand):
+    help = 'Apply received payment gateway webhook events in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=WEBHOOK_BATCH_SIZE,
+                            help='Events claimed and applied per batch')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the inbox instead of exiting once it is empty')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to sleep between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            processed = failed = 0
+            for batch_processed, batch_failed in process_webhooks(options['batch_size']):
+                processed += batch_processed
+                failed += batch_failed
+                self.stdout.write(f'  - applied {batch_processed} events, {batch_failed} failed')
+
+            if processed or failed or not options['loop']:
+                elapsed = time.monotonic() - started
+                self.stdout.write(self.style.SUCCESS(
+                    f'\n✓ Processed {processed} webhook events in {elapsed:.2f}s '
+                    f'({failed} failed, {pending_events().count()} still queued)'
+                ))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
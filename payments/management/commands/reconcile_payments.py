@@ -0,0 +1,41 @@
+import csv
+import json
+import time
+from django.core.management.base import BaseCommand
+from payments.reconciliation import CHECKS, RECONCILE_CHUNK_SIZE, reconcile_payments
+
+
+class Command(BaseCommand):
+    help = 'Check escrows against their escrow_release and commission transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=RECONCILE_CHUNK_SIZE,
+                            help='Escrows loaded per keyset chunk')
+        parser.add_argument('--output', default=None,
+                            help='Write every mismatch to this CSV file')
+        parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        report = reconcile_payments(chunk_size=options['chunk_size'])
+        report['elapsed_seconds'] = round(time.monotonic() - started, 3)
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                writer = csv.DictWriter(output, fieldnames=['check', 'escrow_id', 'project_id', 'expected', 'actual'])
+                writer.writeheader()
+                writer.writerows(report['mismatches'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+
+        self.stdout.write(f"Checked {report['escrows']} escrows against {report['transactions']} transactions")
+        for check, count in report['mismatch_counts'].items():
+            if count:
+                sample = [m['escrow_id'] for m in report['mismatches'] if m['check'] == check][:10]
+                self.stdout.write(f'  - {check}: {count} ({CHECKS[check]}), escrow ids: {sample}')
+
+        total = len(report['mismatches'])
+        message = f"\n✓ Reconciled in {report['elapsed_seconds']}s: {total} mismatches"
+        self.stdout.write(self.style.SUCCESS(message) if not total else self.style.WARNING(message))
@@ -0,0 +1,46 @@
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from payments.invoice_pdf import render_invoices
+from payments.models import Invoice
+
+CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Pre-render invoice PDFs into the content-hash cache (e.g. at month end)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Render invoices created in this month (YYYY-MM); defaults to the current month')
+        parser.add_argument('--all', action='store_true', help='Render every invoice')
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.select_related('project', 'client', 'freelancer')
+        if not options['all']:
+            try:
+                month = datetime.strptime(options['month'], '%Y-%m') if options['month'] else timezone.localtime()
+            except ValueError:
+                raise CommandError('--month must be in YYYY-MM format')
+            invoices = invoices.filter(created_at__year=month.year, created_at__month=month.month)
+
+        started = time.monotonic()
+        rendered = cached = failed = 0
+        last_id = 0
+        while True:
+            chunk = list(invoices.filter(id__gt=last_id).order_by('id')[:CHUNK_SIZE])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            chunk_rendered, chunk_cached, chunk_failed = render_invoices(chunk)
+            rendered += chunk_rendered
+            cached += chunk_cached
+            failed += chunk_failed
+            self.stdout.write(f'  - {rendered} rendered, {cached} already cached, {failed} failed')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✓ Rendered {rendered} invoice PDFs ({cached} cached) in {elapsed:.2f}s'
+        ))
+        if failed:
+            self.stdout.write(self.style.ERROR(f'{failed} invoices failed to render; they are retried after a backoff'))
@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from payments.payouts import run_payouts, unbatched_releases
+
+
+class Command(BaseCommand):
+    help = 'Group completed escrow releases into one payout per freelancer and currency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--currency', action='append', dest='currencies',
+                            help='Only pay out this currency (repeatable)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many releases are waiting')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            pending = unbatched_releases()
+            if options['currencies']:
+                pending = pending.filter(currency__in=options['currencies'])
+            self.stdout.write(f'{pending.count()} escrow releases are waiting for a payout run')
+            return
+
+        started = time.monotonic()
+        batches = run_payouts(options['currencies'])
+        for batch in batches:
+            self.stdout.write(
+                f'  - batch {batch.id}: {batch.release_count} releases -> '
+                f'{batch.payee_count} payouts, {batch.total_amount} {batch.currency} '
+                f'({batch.settlement_file.name})'
+            )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'\n✓ Created {len(batches)} payout batches in {elapsed:.2f}s'))
@@ -0,0 +1,48 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from payments.overdue import SCAN_CHUNK_SIZE, STALE_ESCROW_DAYS, flag_stale_escrows, mark_overdue_invoices
+
+
+class Command(BaseCommand):
+    help = 'Mark sent invoices past due as overdue and flag escrows stuck in pending/funded'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-days', type=int, default=STALE_ESCROW_DAYS,
+                            help='Days without change before a pending/funded escrow is flagged')
+        parser.add_argument('--chunk-size', type=int, default=SCAN_CHUNK_SIZE)
+        parser.add_argument('--max-rows', type=int, default=None,
+                            help='Stop each scan after this many rows to bound run time')
+        parser.add_argument('--dry-run', action='store_true', help='Report without updating anything')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        scan_options = {
+            'chunk_size': options['chunk_size'],
+            'max_rows': options['max_rows'],
+            'dry_run': options['dry_run'],
+        }
+        report = {
+            'invoices': mark_overdue_invoices(**scan_options),
+            'escrows': flag_stale_escrows(stale_days=options['stale_days'], **scan_options),
+            'dry_run': options['dry_run'],
+        }
+        report['elapsed_seconds'] = round(time.monotonic() - started, 3)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, cls=DjangoJSONEncoder))
+            return
+
+        invoices = report['invoices']
+        self.stdout.write(f"Invoices marked overdue: {invoices['overdue']}")
+        if invoices['overdue']:
+            self.stdout.write(f"  oldest due date: {invoices['oldest_due_date']:%Y-%m-%d}, ids: {invoices['sample_ids']}")
+        for escrow_status, escrows in report['escrows'].items():
+            self.stdout.write(f"Stale {escrow_status} escrows flagged: {escrows['flagged']}")
+            if escrows['flagged']:
+                self.stdout.write(f"  unchanged since: {escrows['oldest_update']:%Y-%m-%d}, ids: {escrows['sample_ids']}")
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(f"\n✓ {prefix}Scan finished in {report['elapsed_seconds']}s"))
@@ -0,0 +1,58 @@
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from payments.gateways import SimulatorGateway
+from payments.models import Transaction
+from payments.webhooks import WEBHOOK_BATCH_SIZE, process_webhooks
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Load-test settlement offline: charge deposits through the simulator and drain the webhook inbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--charges', type=int, default=1000,
+                            help='Number of simulated deposits to charge')
+        parser.add_argument('--user', default=None,
+                            help='Username the deposits belong to (defaults to the first superuser)')
+        parser.add_argument('--failure-rate', type=float, default=0.0,
+                            help='Fraction of charges the simulator declines')
+        parser.add_argument('--batch-size', type=int, default=WEBHOOK_BATCH_SIZE,
+                            help='Events applied per webhook batch')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('id').first()
+        if user is None:
+            raise CommandError('No user to charge; pass --user')
+
+        gateway = SimulatorGateway(failure_rate=options['failure_rate'])
+        started = time.monotonic()
+        with transaction.atomic():
+            for _ in range(options['charges']):
+                deposit = Transaction.objects.create(
+                    user=user,
+                    transaction_type='deposit',
+                    status='processing',
+                    amount=Decimal('10.00'),
+                    net_amount=Decimal('10.00'),
+                    payment_gateway=gateway.name,
+                    description='Simulated settlement load test'
+                )
+                deposit.gateway_transaction_id = gateway.charge(deposit)
+                deposit.save(update_fields=['gateway_transaction_id'])
+        charged = time.monotonic() - started
+        self.stdout.write(f'  - charged {options["charges"]} deposits in {charged:.2f}s')
+
+        started = time.monotonic()
+        processed = 0
+        for batch_processed, _ in process_webhooks(options['batch_size']):
+            processed += batch_processed
+        settled = time.monotonic() - started
+        rate = processed / settled if settled else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✓ Settled {processed} webhook events in {settled:.2f}s ({rate:.0f} events/s)'
+        ))
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_invoicesequence'),
+        ('projects', '0001_initial'),
+        ('proposals', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escrow',
+            name='stale_flagged_at',
+            field=models.DateTimeField(blank=True, help_text='Set by scan_overdue_payments when stuck in pending/funded', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='escrow',
+            index=models.Index(fields=['status', 'updated_at'], name='payments_es_status_e0b805_idx'),
+        ),
+    ]
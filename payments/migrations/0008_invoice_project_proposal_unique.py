@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_riskhold'),
+        ('projects', '0001_initial'),
+        ('proposals', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(fields=('project', 'proposal'), name='payments_invoice_project_proposal_uniq'),
+        ),
+    ]
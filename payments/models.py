@@ -48,6 +48,33 @@ class Wallet(models.Model):
     def __str__(self):
         return f"{self.user.username}'s Wallet - {self.balance} {self.currency}"
 
+class PayoutBatch(models.Model):
+    """
+    One payout run for one currency: all unpaid escrow releases grouped into
+    a single withdrawal per freelancer, plus the settlement file sent out.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('submitted', 'Submitted'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+    
+    currency = models.CharField(max_length=3, default='USD')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    payee_count = models.IntegerField(default=0)
+    release_count = models.IntegerField(default=0)
+    settlement_file = models.FileField(upload_to='settlements/', blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Payout batch {self.id} - {self.total_amount} {self.currency} to {self.payee_count} payees"
+
 class Transaction(models.Model):
     TRANSACTION_TYPES = (
         ('deposit', 'Deposit'),
@@ -87,6 +114,7 @@ class Transaction(models.Model):
     payment_method = models.ForeignKey(PaymentMethod, on_delete=models.SET_NULL, null=True, blank=True)
     payment_gateway = models.CharField(max_length=50, blank=True)
     gateway_transaction_id = models.CharField(max_length=200, blank=True)
+    payout_batch = models.ForeignKey(PayoutBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions')
     
     # Metadata
     description = models.TextField(blank=True)
@@ -131,12 +159,16 @@ class Escrow(models.Model):
     funded_at = models.DateTimeField(null=True, blank=True)
     released_at = models.DateTimeField(null=True, blank=True)
     refunded_at = models.DateTimeField(null=True, blank=True)
+    stale_flagged_at = models.DateTimeField(null=True, blank=True, help_text="Set by scan_overdue_payments when stuck in pending/funded")
     
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
     
     def __str__(self):
         return f"Escrow for {self.project.title} - {self.amount} {self.currency}"
@@ -179,6 +211,123 @@ class Invoice(models.Model):
             models.Index(fields=['invoice_number']),
             models.Index(fields=['status', 'due_date']),
         ]
+        constraints = [
+            # One invoice per accepted proposal, however many generate_invoices runs overlap
+            models.UniqueConstraint(fields=['project', 'proposal'], name='payments_invoice_project_proposal_uniq'),
+        ]
     
     def __str__(self):
         return f"Invoice {self.invoice_number} - {self.total_amount} {self.currency}"
+
+class InvoiceSequence(models.Model):
+    """
+    Counter behind Invoice.invoice_number. Workers reserve whole blocks of
+    numbers at a time (see payments.invoicing), so this row is locked once
+    per block instead of once per invoice.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} - next {self.next_value}"
+
+class FxRate(models.Model):
+    """
+    Daily exchange rate: one unit of `currency` is worth `rate` units of
+    settings.FX_BASE_CURRENCY. Loaded from a local file by load_fx_rates.
+    """
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=18, decimal_places=8)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['currency', '-date']
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_fx_rate_per_day'),
+        ]
+    
+    def __str__(self):
+        return f"{self.currency} {self.date} - {self.rate}"
+
+class WebhookEvent(models.Model):
+    """
+    Durable inbox for payment gateway webhooks. The webhook endpoint only
+    stores the event; process_webhooks applies them in batches. Gateways
+    redeliver freely, so (gateway, event_id) is unique and duplicates are
+    dropped on insert.
+    """
+    STATUS_CHOICES = (
+        ('received', 'Received'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    )
+    
+    gateway = models.CharField(max_length=50)
+    event_id = models.CharField(max_length=200)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='received')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['received_at']
+        constraints = [
+            models.UniqueConstraint(fields=['gateway', 'event_id'], name='unique_webhook_event'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.gateway} {self.event_type} {self.event_id} - {self.status}"
+
+class RiskHold(models.Model):
+    """
+    A payment operation stopped by a velocity rule (see payments.risk). The
+    operation is not performed; once staff approve the hold, the user's next
+    attempt at the same operation and target goes through, if it comes
+    within PAYMENT_RISK_APPROVAL_SECONDS of the review.
+    """
+    ACTION_CHOICES = (
+        ('create_escrow', 'Create Escrow'),
+        ('fund_escrow', 'Fund Escrow'),
+        ('release_escrow', 'Release Escrow'),
+        ('add_payment_method', 'Add Payment Method'),
+    )
+    
+    STATUS_CHOICES = (
+        ('pending', 'Pending Review'),
+        ('approved', 'Approved'),
+        ('rejected', 'Rejected'),
+    )
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='risk_holds')
+    action = models.CharField(max_length=30, choices=ACTION_CHOICES)
+    target = models.CharField(max_length=100, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    rules = models.JSONField(default=list, blank=True)
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='reviewed_risk_holds')
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    consumed_at = models.DateTimeField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'action', 'status']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.get_action_display()} - {self.status}"
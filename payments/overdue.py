@@ -0,0 +1,95 @@
+"""
+Overdue invoice and stale escrow scanning.
+
+Both scans walk their rows in index order with keyset chunks (never OFFSET)
+and change state with one set-based UPDATE per chunk, so time and memory per
+chunk stay constant however large the tables grow.
+"""
+from datetime import timedelta
+from django.db.models import Q
+from django.utils import timezone
+from .models import Escrow, Invoice
+
+SCAN_CHUNK_SIZE = 1000
+STALE_ESCROW_DAYS = 14
+STALE_ESCROW_STATUSES = ('pending', 'funded')
+
+
+def keyset_chunks(queryset, order_field, chunk_size, max_rows=None):
+    """
+    Yield lists of (id, order_value) from `queryset` in (order_field, id)
+    order, resuming each chunk after the last key of the previous one.
+    """
+    seen = 0
+    last = None
+    while max_rows is None or seen < max_rows:
+        limit = chunk_size if max_rows is None else min(chunk_size, max_rows - seen)
+        page = queryset
+        if last is not None:
+            page = page.filter(
+                Q(**{f'{order_field}__gt': last[1]}) |
+                Q(**{order_field: last[1], 'id__gt': last[0]})
+            )
+        rows = list(page.order_by(order_field, 'id').values_list('id', order_field)[:limit])
+        if not rows:
+            return
+        seen += len(rows)
+        last = rows[-1]
+        yield rows
+
+
+def mark_overdue_invoices(now=None, chunk_size=SCAN_CHUNK_SIZE, max_rows=None, dry_run=False):
+    """
+    Move 'sent' invoices past their due date to 'overdue', walking the
+    (status, due_date) index. Returns a report dict.
+    """
+    now = now or timezone.now()
+    candidates = Invoice.objects.filter(status='sent', due_date__lt=now)
+    report = {'overdue': 0, 'oldest_due_date': None, 'sample_ids': []}
+
+    for rows in keyset_chunks(candidates, 'due_date', chunk_size, max_rows):
+        ids = [row[0] for row in rows]
+        if report['oldest_due_date'] is None:
+            report['oldest_due_date'] = rows[0][1]
+        if dry_run:
+            report['overdue'] += len(ids)
+        else:
+            report['overdue'] += Invoice.objects.filter(id__in=ids, status='sent').update(
+                status='overdue', updated_at=now
+            )
+        report['sample_ids'].extend(ids[:10 - len(report['sample_ids'])])
+    return report
+
+
+def flag_stale_escrows(now=None, stale_days=STALE_ESCROW_DAYS, chunk_size=SCAN_CHUNK_SIZE,
+                       max_rows=None, dry_run=False):
+    """
+    Flag escrows that have sat in pending/funded with no change for
+    `stale_days`, walking the (status, updated_at) index one status at a time.
+    Flagging does not touch updated_at, so the staleness clock keeps running.
+    `max_rows` bounds each status separately.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=stale_days)
+    report = {}
+
+    for escrow_status in STALE_ESCROW_STATUSES:
+        candidates = Escrow.objects.filter(
+            status=escrow_status,
+            updated_at__lt=cutoff,
+            stale_flagged_at__isnull=True
+        )
+        status_report = {'flagged': 0, 'oldest_update': None, 'sample_ids': []}
+        for rows in keyset_chunks(candidates, 'updated_at', chunk_size, max_rows):
+            ids = [row[0] for row in rows]
+            if status_report['oldest_update'] is None:
+                status_report['oldest_update'] = rows[0][1]
+            if dry_run:
+                status_report['flagged'] += len(ids)
+            else:
+                status_report['flagged'] += Escrow.objects.filter(
+                    id__in=ids, stale_flagged_at__isnull=True
+                ).update(stale_flagged_at=now)
+            status_report['sample_ids'].extend(ids[:10 - len(status_report['sample_ids'])])
+        report[escrow_status] = status_report
+    return report
@@ -0,0 +1,136 @@
+"""
+Batched payout runs.
+
+Instead of paying each escrow release out on its own, a run claims every
+completed, unbatched release in one UPDATE, groups them by freelancer, and
+writes a single withdrawal per payee plus one settlement file per currency.
+External calls drop from one per project to one per payee per run.
+
+Settlement files sit in media storage, so they never carry provider tokens:
+each row names the PaymentMethod id, which the submitter resolves against
+the database. Their names carry a random part so they cannot be guessed,
+and they are written only once the batch has committed, so a rolled-back
+run leaves no file behind.
+"""
+import csv
+import io
+import secrets
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from .models import PaymentMethod, PayoutBatch, Transaction
+
+SETTLEMENT_COLUMNS = (
+    'batch_id', 'withdrawal_id', 'user_id', 'username', 'amount', 'currency',
+    'release_count', 'payment_method_id', 'method_type', 'last_four_digits',
+)
+
+
+def unbatched_releases():
+    return Transaction.objects.filter(
+        transaction_type='escrow_release',
+        status='completed',
+        payout_batch__isnull=True
+    )
+
+
+def payout_methods(user_ids):
+    """Preferred active payment method per user, in one query."""
+    methods = {}
+    for method in PaymentMethod.objects.filter(
+        user_id__in=user_ids, is_active=True
+    ).order_by('user_id', '-is_default', '-created_at'):
+        methods.setdefault(method.user_id, method)
+    return methods
+
+
+def settlement_file(batch, withdrawals, release_counts, usernames, methods):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(SETTLEMENT_COLUMNS)
+    for withdrawal in withdrawals:
+        method = methods.get(withdrawal.user_id)
+        writer.writerow([
+            batch.id, withdrawal.id, withdrawal.user_id, usernames[withdrawal.user_id],
+            withdrawal.amount, withdrawal.currency, release_counts[withdrawal.user_id],
+            method.id if method else '',
+            method.method_type if method else '',
+            method.last_four_digits if method else '',
+        ])
+    return ContentFile(buffer.getvalue().encode('utf-8'))
+
+
+def run_payout_batch(currency):
+    """
+    Pay out every unbatched release in `currency`. Returns the PayoutBatch,
+    or None when there was nothing to pay.
+    """
+    with transaction.atomic():
+        batch = PayoutBatch.objects.create(currency=currency)
+
+        # Claim first: a concurrent run's UPDATE skips rows claimed here.
+        claimed = unbatched_releases().filter(currency=currency).update(payout_batch=batch)
+        if not claimed:
+            batch.delete()
+            return None
+
+        payees = list(
+            Transaction.objects.filter(payout_batch=batch, transaction_type='escrow_release')
+            .order_by('user_id')
+            .values('user_id', 'user__username')
+            .annotate(total=Sum('net_amount'), releases=Count('id'))
+        )
+
+        now = timezone.now()
+        withdrawals = Transaction.objects.bulk_create([
+            Transaction(
+                user_id=payee['user_id'],
+                transaction_type='withdrawal',
+                status='processing',
+                amount=payee['total'],
+                currency=currency,
+                net_amount=payee['total'],
+                payout_batch=batch,
+                payment_gateway='payout_batch',
+                description=f"Payout batch {batch.id}: {payee['releases']} project payment(s)",
+                created_at=now,
+            )
+            for payee in payees
+        ])
+
+        release_counts = {payee['user_id']: payee['releases'] for payee in payees}
+        usernames = {payee['user_id']: payee['user__username'] for payee in payees}
+        methods = payout_methods(release_counts.keys())
+
+        batch.total_amount = sum(payee['total'] for payee in payees)
+        batch.payee_count = len(payees)
+        batch.release_count = claimed
+        batch.status = 'submitted'
+        batch.submitted_at = now
+        batch.save()
+
+        content = settlement_file(batch, withdrawals, release_counts, usernames, methods)
+        transaction.on_commit(lambda: write_settlement_file(batch, content))
+    return batch
+
+
+def write_settlement_file(batch, content):
+    batch.settlement_file.save(
+        f'payout-batch-{batch.id}-{batch.currency}-{secrets.token_urlsafe(16)}.csv',
+        content,
+        save=False
+    )
+    PayoutBatch.objects.filter(id=batch.id).update(settlement_file=batch.settlement_file.name)
+
+
+def run_payouts(currencies=None):
+    """Run one batch per currency with pending releases; returns the batches created."""
+    if currencies is None:
+        currencies = unbatched_releases().order_by().values_list('currency', flat=True).distinct()
+    batches = []
+    for currency in list(currencies):
+        batch = run_payout_batch(currency)
+        if batch is not None:
+            batches.append(batch)
+    return batches
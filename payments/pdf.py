@@ -0,0 +1,92 @@
+"""
+Dependency-free PDF writing for invoices.
+
+Nothing here imports Django, so these functions can run inside the invoice
+renderer's worker processes without configuring settings there.
+"""
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 56
+FONT_SIZE = 11
+LEADING = 16
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+
+
+def _escape(text):
+    text = str(text).encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def render_text_pdf(lines):
+    """Render lines of text as an A4 PDF in the built-in Courier font, so columns line up."""
+    pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)] or [[]]
+
+    # Objects 1-3 are the catalog, page tree and font; pages follow.
+    objects = [b'', b'', b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>']
+    page_ids = []
+    for page_lines in pages:
+        stream = ['BT', f'/F1 {FONT_SIZE} Tf', f'{LEADING} TL', f'{MARGIN} {PAGE_HEIGHT - MARGIN} Td']
+        stream.extend(f'({_escape(line)}) Tj T*' for line in page_lines)
+        stream.append('ET')
+        data = '\n'.join(stream).encode('latin-1')
+        objects.append(b'<< /Length %d >>\nstream\n' % len(data) + data + b'\nendstream')
+        content_id = len(objects)
+        objects.append((
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>'
+        ).encode('latin-1'))
+        page_ids.append(len(objects))
+
+    objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    kids = ' '.join(f'{page_id} 0 R' for page_id in page_ids)
+    objects[1] = f'<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>'.encode('latin-1')
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+
+    xref_offset = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    output += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_offset)
+    return bytes(output)
+
+
+def invoice_lines(document):
+    """Lay out an invoice document (see payments.invoice_pdf.invoice_document) as text lines."""
+    lines = [
+        f"INVOICE {document['invoice_number']}",
+        '',
+        f"Status: {document['status']}",
+        f"Issued: {document['created_at']}",
+        f"Due: {document['due_date']}",
+    ]
+    if document['paid_at']:
+        lines.append(f"Paid: {document['paid_at']}")
+    lines += [
+        '',
+        f"From: {document['freelancer']}",
+        f"Bill to: {document['client']}",
+        f"Project: {document['project']}",
+        '',
+        'Items',
+        '-' * 60,
+    ]
+    for item in document['items']:
+        lines.append(f"{item['description'][:48]:<48} {item['amount']:>10}")
+    lines += [
+        '-' * 60,
+        f"{'Subtotal':<48} {document['amount']:>10}",
+        f"{'Tax':<48} {document['tax_amount']:>10}",
+        f"{'Total (' + document['currency'] + ')':<48} {document['total_amount']:>10}",
+    ]
+    if document['notes']:
+        lines += ['', 'Notes:'] + document['notes'].splitlines()
+    return lines
+
+
+def render_invoice_document(document):
+    return render_text_pdf(invoice_lines(document))
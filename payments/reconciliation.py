@@ -0,0 +1,163 @@
+"""
+Escrow and ledger reconciliation.
+
+Escrows are walked in project order (Escrow.project is one-to-one) in keyset
+chunks. Each chunk, and the escrow_release / commission transactions in the
+same project range, are fetched as plain integer columns with amounts
+already in cents, then matched and checked with NumPy. Python only touches
+the rows that fail a check, so a clean ledger costs two queries and a few
+array operations per chunk.
+"""
+import numpy as np
+from django.db.models import BigIntegerField, Case, F, IntegerField, Value, When
+from django.db.models.functions import Cast, Round
+from .models import Escrow, Transaction
+
+RECONCILE_CHUNK_SIZE = 50000
+
+# Ledger entries; failed or cancelled transactions never moved money.
+LEDGER_STATUSES = ('pending', 'processing', 'completed')
+
+RELEASE = 1
+COMMISSION = 2
+
+CHECKS = {
+    'split_mismatch': 'amount != platform_fee + freelancer_amount',
+    'release_count': 'released escrow without exactly one escrow_release transaction',
+    'commission_count': 'released escrow without exactly one commission transaction',
+    'release_amount': 'escrow_release total differs from freelancer_amount',
+    'commission_amount': 'commission total differs from platform_fee',
+    'unexpected_entries': 'escrow not released but has release or commission transactions',
+}
+
+
+def cents(field):
+    return Cast(Round(F(field) * 100), output_field=BigIntegerField())
+
+
+def _columns(rows, width):
+    """`rows` of integer tuples as a (width, n) int64 array, one row per column."""
+    if not rows:
+        return np.empty((width, 0), dtype=np.int64)
+    return np.array(rows, dtype=np.int64).T
+
+
+def escrow_columns(after_project_id, chunk_size):
+    rows = list(
+        Escrow.objects.filter(project_id__gt=after_project_id)
+        .order_by('project_id')
+        .annotate(
+            is_released=Case(When(status='released', then=Value(1)), default=Value(0), output_field=IntegerField()),
+            amount_cents=cents('amount'),
+            fee_cents=cents('platform_fee'),
+            freelancer_cents=cents('freelancer_amount'),
+        )
+        .values_list('project_id', 'id', 'is_released', 'amount_cents', 'fee_cents', 'freelancer_cents')[:chunk_size]
+    )
+    return _columns(rows, 6)
+
+
+def ledger_columns(first_project_id, last_project_id):
+    rows = list(
+        Transaction.objects.filter(
+            project_id__gte=first_project_id,
+            project_id__lte=last_project_id,
+            transaction_type__in=['escrow_release', 'commission'],
+            status__in=LEDGER_STATUSES,
+        )
+        .order_by()
+        .annotate(
+            kind=Case(
+                When(transaction_type='escrow_release', then=Value(RELEASE)),
+                default=Value(COMMISSION),
+                output_field=IntegerField(),
+            ),
+            amount_cents=cents('amount'),
+        )
+        .values_list('project_id', 'kind', 'amount_cents')
+    )
+    return _columns(rows, 3)
+
+
+def check_chunk(escrows, ledger):
+    """
+    Vectorized invariant checks for one chunk. `escrows` is sorted by
+    project id. Returns {check: (escrow_index_array, expected, actual)}.
+    """
+    project_ids, _, released, amount, fee, freelancer = escrows
+    n = project_ids.size
+
+    # Join: position of each transaction's project among the chunk's escrows.
+    position = np.searchsorted(project_ids, ledger[0])
+    matched = position < n
+    matched[matched] = project_ids[position[matched]] == ledger[0][matched]
+    position, kind, value = position[matched], ledger[1][matched], ledger[2][matched]
+
+    is_release = kind == RELEASE
+    release_count = np.bincount(position[is_release], minlength=n)
+    commission_count = np.bincount(position[~is_release], minlength=n)
+    # Float sums of cents stay exact well past any real escrow amount (2**53).
+    release_total = np.bincount(
+        position[is_release], weights=value[is_release], minlength=n
+    ).round().astype(np.int64)
+    commission_total = np.bincount(
+        position[~is_release], weights=value[~is_release], minlength=n
+    ).round().astype(np.int64)
+
+    released = released == 1
+    entries = release_count + commission_count
+    return {
+        'split_mismatch': (np.flatnonzero(amount != fee + freelancer), fee + freelancer, amount),
+        'release_count': (np.flatnonzero(released & (release_count != 1)), np.ones(n, dtype=np.int64), release_count),
+        'commission_count': (np.flatnonzero(released & (commission_count != 1)), np.ones(n, dtype=np.int64), commission_count),
+        'release_amount': (
+            np.flatnonzero(released & (release_count > 0) & (release_total != freelancer)),
+            freelancer, release_total,
+        ),
+        'commission_amount': (
+            np.flatnonzero(released & (commission_count > 0) & (commission_total != fee)),
+            fee, commission_total,
+        ),
+        'unexpected_entries': (np.flatnonzero(~released & (entries > 0)), np.zeros(n, dtype=np.int64), entries),
+    }
+
+
+def _as_reported(check, value):
+    value = int(value)
+    if check.endswith('_count') or check == 'unexpected_entries':
+        return value
+    return f'{value / 100:.2f}'
+
+
+def reconcile_payments(chunk_size=RECONCILE_CHUNK_SIZE):
+    """
+    Check every escrow against its ledger. Returns a report dict with
+    per-check mismatch counts and one entry per mismatch.
+    """
+    report = {
+        'escrows': 0,
+        'transactions': 0,
+        'mismatch_counts': dict.fromkeys(CHECKS, 0),
+        'mismatches': [],
+    }
+    last_project_id = 0
+    while True:
+        escrows = escrow_columns(last_project_id, chunk_size)
+        if not escrows.shape[1]:
+            return report
+        project_ids, escrow_ids = escrows[0], escrows[1]
+        last_project_id = int(project_ids[-1])
+        ledger = ledger_columns(int(project_ids[0]), last_project_id)
+        report['escrows'] += project_ids.size
+        report['transactions'] += ledger.shape[1]
+
+        for check, (indexes, expected, actual) in check_chunk(escrows, ledger).items():
+            report['mismatch_counts'][check] += indexes.size
+            for index in indexes:
+                report['mismatches'].append({
+                    'check': check,
+                    'escrow_id': int(escrow_ids[index]),
+                    'project_id': int(project_ids[index]),
+                    'expected': _as_reported(check, expected[index]),
+                    'actual': _as_reported(check, actual[index]),
+                })
@@ -0,0 +1,187 @@
+"""
+Velocity checks for payment operations.
+
+Every guarded operation bumps sliding-window counters keyed by user, client
+IP and amount bucket, kept in the cache named by settings.PAYMENT_RISK_CACHE
+(a shared backend such as Redis makes the limits hold across workers). A
+check is a couple of cache round trips per rule and never reads Transaction;
+the database is only touched when a rule trips and a RiskHold is recorded.
+
+Rules come from settings.PAYMENT_RISK_RULES when set, else DEFAULT_RISK_RULES:
+    name       label stored on the hold
+    actions    operations the rule applies to (RiskHold.ACTION_CHOICES)
+    scope      'user', 'ip' or 'amount' (per user and order of magnitude)
+    limit      operations allowed within the window
+    window     window length in seconds
+    min_amount optional; the rule ignores smaller amounts
+
+A staff approval lets through one later attempt at the same action and
+target, and only within settings.PAYMENT_RISK_APPROVAL_SECONDS (default a
+day) of the review.
+"""
+import hashlib
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from .models import RiskHold
+
+ESCROW_ACTIONS = ['create_escrow', 'fund_escrow', 'release_escrow']
+
+RISK_APPROVAL_SECONDS = 24 * 60 * 60
+
+DEFAULT_RISK_RULES = [
+    {'name': 'escrows_created_per_minute', 'actions': ['create_escrow'], 'scope': 'user', 'limit': 5, 'window': 60},
+    {'name': 'escrows_funded_per_minute', 'actions': ['fund_escrow'], 'scope': 'user', 'limit': 5, 'window': 60},
+    {'name': 'escrows_released_per_minute', 'actions': ['release_escrow'], 'scope': 'user', 'limit': 10, 'window': 60},
+    {'name': 'payment_methods_per_hour', 'actions': ['add_payment_method'], 'scope': 'user', 'limit': 3, 'window': 3600},
+    {'name': 'payment_operations_per_ip', 'actions': ESCROW_ACTIONS + ['add_payment_method'],
+     'scope': 'ip', 'limit': 30, 'window': 60},
+    {'name': 'large_escrows_per_day', 'actions': ['create_escrow', 'fund_escrow'],
+     'scope': 'amount', 'min_amount': 5000, 'limit': 3, 'window': 86400},
+]
+
+
+class SlidingWindowCounter:
+    """
+    Approximate sliding window: counts live in fixed buckets of `window`
+    seconds, and the previous bucket is weighted by how much of it still
+    overlaps the window ending now.
+    """
+
+    def __init__(self, cache_alias='default', prefix='risk'):
+        self.cache = caches[cache_alias]
+        self.prefix = prefix
+
+    def hit(self, key, window, now=None):
+        """Record one event for `key` and return the count over the last `window` seconds."""
+        now = time.time() if now is None else now
+        slot, offset = divmod(now, window)
+        current_key = f'{self.prefix}:{key}:{window}:{int(slot)}'
+        previous_key = f'{self.prefix}:{key}:{window}:{int(slot) - 1}'
+
+        if self.cache.add(current_key, 1, timeout=window * 2):
+            current = 1
+        else:
+            try:
+                current = self.cache.incr(current_key)
+            except ValueError:
+                # Evicted between add() and incr().
+                self.cache.set(current_key, 1, timeout=window * 2)
+                current = 1
+        previous = self.cache.get(previous_key, 0)
+        return previous * (1 - offset / window) + current
+
+
+@dataclass
+class RiskDecision:
+    allowed: bool
+    tripped: list = field(default_factory=list)
+    hold: RiskHold = None
+
+
+def risk_rules():
+    return getattr(settings, 'PAYMENT_RISK_RULES', DEFAULT_RISK_RULES)
+
+
+def amount_bucket(amount):
+    """Order of magnitude of the amount: 0 for under 10, 3 for 1000-9999, ..."""
+    return max(len(str(int(abs(amount)))) - 1, 0)
+
+
+def approval_window():
+    return timedelta(seconds=getattr(settings, 'PAYMENT_RISK_APPROVAL_SECONDS', RISK_APPROVAL_SECONDS))
+
+
+def payment_method_target(method_type, last_four_digits='', provider_token=''):
+    """
+    Hold target for adding a payment method, so an approval covers that
+    card only: the type and last four digits, plus a fingerprint of the
+    provider token when there is one.
+    """
+    target = f'{method_type}:{last_four_digits}'
+    if provider_token:
+        target += ':' + hashlib.sha256(provider_token.encode()).hexdigest()[:16]
+    return target
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR')
+
+
+_counter = None
+
+
+def get_counter():
+    global _counter
+    if _counter is None:
+        _counter = SlidingWindowCounter(getattr(settings, 'PAYMENT_RISK_CACHE', 'default'))
+    return _counter
+
+
+def _scope_key(rule, user_id, ip, amount):
+    scope = rule['scope']
+    if scope == 'user':
+        return f'user:{user_id}'
+    if scope == 'ip':
+        return f'ip:{ip}' if ip else None
+    if scope == 'amount':
+        if amount is None or amount < Decimal(str(rule.get('min_amount', 0))):
+            return None
+        return f'amount:{user_id}:{amount_bucket(amount)}'
+    raise ValueError(f"Unknown risk rule scope {scope!r}")
+
+
+def tripped_rules(action, user_id, ip=None, amount=None, counter=None, now=None):
+    """Count this attempt against every rule for `action`; return the names of rules over their limit."""
+    counter = counter or get_counter()
+    tripped = []
+    for rule in risk_rules():
+        if action not in rule['actions']:
+            continue
+        key = _scope_key(rule, user_id, ip, amount)
+        if key is None:
+            continue
+        if counter.hit(f"{rule['name']}:{key}", rule['window'], now) > rule['limit']:
+            tripped.append(rule['name'])
+    return tripped
+
+
+def check_payment_risk(request, action, amount=None, target=''):
+    """
+    Run the velocity rules for `action` by request.user. When any rule trips
+    the operation is held: a RiskHold is recorded and returned on the
+    decision, unless staff approved one for this action and target within
+    the approval window, in which case that approval is used up and the
+    operation allowed.
+    """
+    ip = client_ip(request)
+    amount = Decimal(str(amount)) if amount is not None else None
+    tripped = tripped_rules(action, request.user.id, ip, amount)
+    if not tripped:
+        return RiskDecision(allowed=True)
+
+    with transaction.atomic():
+        approved = RiskHold.objects.select_for_update().filter(
+            user=request.user, action=action, target=target,
+            status='approved', consumed_at__isnull=True,
+            reviewed_at__gte=timezone.now() - approval_window()
+        ).order_by('created_at').first()
+        if approved is not None:
+            approved.consumed_at = timezone.now()
+            approved.save(update_fields=['consumed_at'])
+            return RiskDecision(allowed=True, tripped=tripped)
+
+        hold = RiskHold.objects.create(
+            user=request.user,
+            action=action,
+            target=target,
+            amount=amount,
+            ip_address=ip,
+            rules=tripped,
+        )
+    return RiskDecision(allowed=False, tripped=tripped, hold=hold)
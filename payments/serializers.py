@@ -35,6 +35,38 @@ class TransactionSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('user', 'created_at', 'completed_at')
 
+class TransactionHistorySerializer(serializers.ModelSerializer):
+    """
+    Compact transaction-history row: ids, titles and amounts only.
+    Related objects can be expanded in full with ?expand=project,proposal,...
+    """
+    EXPANDABLE_FIELDS = {
+        'user': UserSerializer,
+        'project': ProjectSerializer,
+        'proposal': ProposalSerializer,
+        'payment_method': PaymentMethodSerializer,
+    }
+
+    project_title = serializers.CharField(source='project.title', read_only=True, default=None)
+    payment_method_type = serializers.CharField(source='payment_method.method_type', read_only=True, default=None)
+    payment_method_last_four = serializers.CharField(source='payment_method.last_four_digits', read_only=True, default=None)
+
+    class Meta:
+        model = Transaction
+        fields = [
+            'id', 'transaction_type', 'status',
+            'amount', 'currency', 'fee', 'net_amount',
+            'project', 'project_title', 'proposal',
+            'payment_method', 'payment_method_type', 'payment_method_last_four',
+            'description', 'created_at', 'completed_at'
+        ]
+        read_only_fields = fields
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in self.context.get('expand', ()):
+            self.fields[name] = self.EXPANDABLE_FIELDS[name](read_only=True)
+
 class EscrowSerializer(serializers.ModelSerializer):
     project = ProjectSerializer(read_only=True)
     proposal = ProposalSerializer(read_only=True)
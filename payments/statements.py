@@ -0,0 +1,147 @@
+"""
+Streaming account statements built from a user's Transaction history.
+
+Rows are read through a server-side cursor with a values() projection, so a
+statement for a user with years of history never holds more than one chunk
+in memory. Monthly opening/closing balances are computed in the same pass.
+"""
+import csv
+import json
+from decimal import Decimal
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Case, F, Sum, When
+from django.utils import timezone
+from rest_framework import renderers
+
+# Transaction types that add to the user's balance; every other type is a debit.
+CREDIT_TYPES = ('deposit', 'refund', 'escrow_release', 'escrow_refund')
+
+STATEMENT_CHUNK_SIZE = 2000
+
+STATEMENT_VALUES = (
+    'id', 'created_at', 'transaction_type', 'status', 'currency',
+    'amount', 'fee', 'net_amount', 'project_id', 'project__title', 'description',
+)
+
+CSV_COLUMNS = (
+    'record_type', 'date', 'id', 'transaction_type', 'status', 'currency',
+    'amount', 'fee', 'net_amount', 'project_id', 'project_title', 'description',
+    'opening_balance', 'closing_balance',
+)
+
+
+class StatementRenderer(renderers.BaseRenderer):
+    """
+    Lets DRF's ?format= negotiation accept the statement formats. Statements
+    themselves are streamed, so only error payloads pass through render().
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode(self.charset)
+
+
+class CSVStatementRenderer(StatementRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONStatementRenderer(StatementRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+def signed_amount_expression():
+    return Case(
+        When(transaction_type__in=CREDIT_TYPES, then=F('net_amount')),
+        default=-F('net_amount'),
+    )
+
+
+def opening_balances(queryset, start):
+    """Per-currency balance of completed transactions before `start`, in one query."""
+    if start is None:
+        return {}
+    totals = queryset.filter(
+        created_at__lt=start,
+        status='completed'
+    ).order_by().values('currency').annotate(balance=Sum(signed_amount_expression()))
+    return {
+        entry['currency']: Decimal(entry['balance'] or 0).quantize(Decimal('0.01'))
+        for entry in totals
+    }
+
+
+def statement_records(queryset, balances):
+    """
+    Yield ('transaction', row) records in date order, followed after each
+    month by one ('month', summary) record per currency.
+    """
+    balances = dict(balances)
+    month = None
+    month_opening = {}
+
+    rows = queryset.order_by('created_at', 'id').values(*STATEMENT_VALUES)
+    for row in rows.iterator(chunk_size=STATEMENT_CHUNK_SIZE):
+        row_month = timezone.localtime(row['created_at']).strftime('%Y-%m')
+        if row_month != month:
+            if month is not None:
+                yield from month_summaries(month, month_opening, balances)
+            month = row_month
+            month_opening = dict(balances)
+
+        if row['status'] == 'completed':
+            amount = row['net_amount']
+            if row['transaction_type'] not in CREDIT_TYPES:
+                amount = -amount
+            balances[row['currency']] = balances.get(row['currency'], Decimal('0.00')) + amount
+
+        yield 'transaction', row
+
+    if month is not None:
+        yield from month_summaries(month, month_opening, balances)
+
+
+def month_summaries(month, opening, closing):
+    for currency in sorted(closing):
+        yield 'month', {
+            'month': month,
+            'currency': currency,
+            'opening_balance': opening.get(currency, Decimal('0.00')),
+            'closing_balance': closing[currency],
+        }
+
+
+class Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(records):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for record_type, data in records:
+        if record_type == 'transaction':
+            yield writer.writerow([
+                record_type, data['created_at'].isoformat(), data['id'],
+                data['transaction_type'], data['status'], data['currency'],
+                data['amount'], data['fee'], data['net_amount'],
+                data['project_id'] or '', data['project__title'] or '',
+                data['description'], '', '',
+            ])
+        else:
+            yield writer.writerow([
+                record_type, data['month'], '', '', '', data['currency'],
+                '', '', '', '', '', '',
+                data['opening_balance'], data['closing_balance'],
+            ])
+
+
+def stream_ndjson(records):
+    for record_type, data in records:
+        data = dict(data, type=record_type)
+        if record_type == 'transaction':
+            data['project_title'] = data.pop('project__title')
+        yield json.dumps(data, cls=DjangoJSONEncoder) + '\n'
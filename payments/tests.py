@@ -1,3 +1,411 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import User, UserProfile
+from projects.models import Project, ProjectCategory, ProjectTemplate
+from proposals.models import Proposal
+from .gateways import SimulatorGateway, WebhookError, sign_payload
+from .invoicing import InvoiceNumberAllocator, generate_missing_invoices, invoice_items_for_escrow
+from .models import Escrow, FxRate, Invoice, PaymentMethod, RiskHold, Transaction, WebhookEvent
+from .risk import DEFAULT_RISK_RULES, SlidingWindowCounter, approval_window, tripped_rules
+from .webhooks import EVENT_HANDLERS, WEBHOOK_MAX_ATTEMPTS, charge_succeeded, process_webhook_batch
 
-# Create your tests here.
+
+class TransactionListQueryCountTests(TestCase):
+    """A page of transaction history must cost a fixed number of queries."""
+
+    def setUp(self):
+        self.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='pass12345',
+            user_type='service_requester'
+        )
+        self.freelancer = User.objects.create_user(
+            username='freelancer', email='freelancer@example.com', password='pass12345'
+        )
+        UserProfile.objects.create(user=self.client_user)
+        UserProfile.objects.create(user=self.freelancer)
+        category = ProjectCategory.objects.create(name='Web')
+        self.template = ProjectTemplate.objects.create(
+            category=category, title='Landing page', description='Template'
+        )
+        self.payment_method = PaymentMethod.objects.create(
+            user=self.client_user, method_type='credit_card', last_four_digits='4242'
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+
+    def create_transactions(self, count):
+        for i in range(count):
+            project = Project.objects.create(
+                client=self.client_user,
+                title=f'Project {i}',
+                description='Test project',
+                category=self.template.category,
+                template=self.template,
+                budget_min=Decimal('10.00'),
+                budget_max=Decimal('100.00'),
+                deadline=timezone.now() + timedelta(days=30),
+            )
+            proposal = Proposal.objects.create(
+                freelancer=self.freelancer,
+                project=project,
+                cover_letter='Hello',
+                proposed_price=Decimal('50.00'),
+                proposed_timeline=7,
+            )
+            Transaction.objects.create(
+                user=self.client_user,
+                transaction_type='escrow_hold',
+                status='completed',
+                amount=Decimal('50.00'),
+                net_amount=Decimal('50.00'),
+                project=project,
+                proposal=proposal,
+                payment_method=self.payment_method,
+            )
+
+    def test_compact_page_is_constant_queries(self):
+        self.create_transactions(5)
+        # count + page
+        with self.assertNumQueries(2):
+            response = self.api.get(reverse('transaction-list'))
+        self.assertEqual(response.status_code, 200)
+        row = response.data['results'][0]
+        self.assertIn('project_title', row)
+        self.assertIsInstance(row['project'], int)
+        self.assertNotIn('user', row)
+
+    def test_expanded_page_is_constant_queries(self):
+        url = reverse('transaction-list') + '?expand=project,proposal,payment_method,user'
+        self.create_transactions(2)
+        with self.assertNumQueries(6):
+            self.api.get(url)
+
+        self.create_transactions(8)
+        with self.assertNumQueries(6):
+            response = self.api.get(url)
+        self.assertEqual(response.status_code, 200)
+        row = response.data['results'][0]
+        self.assertEqual(row['project']['client']['username'], 'client')
+        self.assertEqual(row['proposal']['freelancer']['username'], 'freelancer')
+
+
+class EscrowFixtureMixin:
+    """A client, a freelancer and helpers to create projects with accepted proposals and escrows."""
+
+    def create_parties(self):
+        self.client_user = User.objects.create_user(
+            username='client', email='client@example.com', password='pass12345',
+            user_type='service_requester'
+        )
+        self.freelancer = User.objects.create_user(
+            username='freelancer', email='freelancer@example.com', password='pass12345'
+        )
+        self.category = ProjectCategory.objects.create(name='Web')
+
+    def create_escrow(self, amount='100.00', milestones=None, status='pending', currency='USD'):
+        project = Project.objects.create(
+            client=self.client_user,
+            title=f'Project {Project.objects.count() + 1}',
+            description='Test project',
+            category=self.category,
+            budget_min=Decimal('10.00'),
+            budget_max=Decimal('1000.00'),
+            deadline=timezone.now() + timedelta(days=30),
+        )
+        proposal = Proposal.objects.create(
+            freelancer=self.freelancer,
+            project=project,
+            cover_letter='Hello',
+            proposed_price=Decimal(amount),
+            proposed_timeline=7,
+            milestones=milestones or [],
+        )
+        return Escrow.objects.create(
+            project=project,
+            proposal=proposal,
+            client=self.client_user,
+            freelancer=self.freelancer,
+            amount=Decimal(amount),
+            currency=currency,
+            platform_fee=Decimal('0.00'),
+            freelancer_amount=Decimal(amount),
+            status=status,
+            released_at=timezone.now() if status == 'released' else None,
+        )
+
+
+class InvoiceGenerationTests(EscrowFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_parties()
+
+    def item_total(self, items):
+        return sum(Decimal(item['amount']) for item in items)
+
+    def test_items_cover_the_rest_of_the_escrow(self):
+        escrow = self.create_escrow('100.00', [{'title': 'Design', 'amount': 30}, {'title': 'Build', 'amount': 50}])
+        items = invoice_items_for_escrow(escrow)
+        self.assertEqual(len(items), 3)
+        self.assertEqual(Decimal(items[-1]['amount']), Decimal('20.00'))
+        self.assertEqual(self.item_total(items), escrow.amount)
+
+    def test_items_adjust_down_when_milestones_exceed_the_escrow(self):
+        escrow = self.create_escrow('100.00', [{'title': 'Design', 'amount': 80}, {'title': 'Build', 'amount': 50}])
+        items = invoice_items_for_escrow(escrow)
+        self.assertEqual(len(items), 3)
+        self.assertEqual(Decimal(items[-1]['amount']), Decimal('-30.00'))
+        self.assertEqual(self.item_total(items), escrow.amount)
+
+    def test_overlapping_runs_invoice_each_escrow_once(self):
+        escrows = [self.create_escrow(status='released') for _ in range(3)]
+        self.assertEqual(sum(generate_missing_invoices(allocator=InvoiceNumberAllocator())), 3)
+
+        # A second run whose candidate query ran before the first one committed
+        stale = mock.patch(
+            'payments.invoicing.escrows_missing_invoices',
+            lambda: Escrow.objects.filter(status='released'),
+        )
+        with stale:
+            self.assertEqual(sum(generate_missing_invoices(allocator=InvoiceNumberAllocator())), 0)
+        self.assertEqual(Invoice.objects.count(), len(escrows))
+        invoice = Invoice.objects.get(project=escrows[0].project)
+        self.assertEqual(self.item_total(invoice.items), invoice.amount)
+
+
+class ProviderEarningsTests(EscrowFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_parties()
+        self.api = APIClient()
+        self.api.force_authenticate(self.freelancer)
+        FxRate.objects.create(currency='EUR', date=timezone.now().date() - timedelta(days=400), rate=Decimal('2'))
+
+    def pay_out(self, net_amount, currency, when):
+        escrow = self.create_escrow(net_amount, status='released', currency=currency)
+        return Transaction.objects.create(
+            user=self.freelancer,
+            transaction_type='escrow_release',
+            status='completed',
+            amount=Decimal(net_amount),
+            currency=currency,
+            net_amount=Decimal(net_amount),
+            project=escrow.project,
+            created_at=when,
+        )
+
+    def test_trend_and_top_projects_report_unconverted_amounts(self):
+        this_month = timezone.now()
+        last_year = this_month - timedelta(days=365)
+        usd = self.pay_out('100.00', 'USD', this_month)
+        eur = self.pay_out('80.00', 'EUR', last_year)
+        jpy = self.pay_out('5000.00', 'JPY', this_month)
+
+        response = self.api.get(reverse('provider-earnings'))
+        self.assertEqual(response.status_code, 200)
+
+        trend = {entry['month']: entry for entry in response.data['monthly_trend']}
+        self.assertEqual(trend[last_year.strftime('%Y-%m')]['total'], 160.0)
+        self.assertEqual(trend[last_year.strftime('%Y-%m')]['unconverted'], {})
+        self.assertEqual(trend[this_month.strftime('%Y-%m')]['total'], 100.0)
+        self.assertEqual(trend[this_month.strftime('%Y-%m')]['unconverted'], {'JPY': 5000.0})
+
+        top = response.data['top_projects']
+        self.assertEqual([entry['title'] for entry in top], [eur.project.title, usd.project.title, jpy.project.title])
+        self.assertEqual(top[0]['earned'], 160.0)
+        self.assertEqual(top[2]['earned'], 0.0)
+        self.assertEqual(top[2]['unconverted'], {'JPY': 5000.0})
+
+
+class WebhookProcessingTests(EscrowFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_parties()
+        self.gateway = SimulatorGateway(failure_rate=0)
+        self.escrow = self.create_escrow('250.00')
+        self.payment = Transaction.objects.create(
+            user=self.client_user,
+            transaction_type='escrow_hold',
+            status='processing',
+            amount=self.escrow.amount,
+            currency='USD',
+            net_amount=self.escrow.amount,
+            project=self.escrow.project,
+            payment_gateway=self.gateway.name,
+            gateway_transaction_id='sim_ch_test',
+        )
+
+    def charge_event(self, event_id='sim_evt_1', amount='250.00', currency='USD', event_type='charge.succeeded'):
+        return {'id': event_id, 'type': event_type, 'data': {'charge': 'sim_ch_test', 'amount': amount, 'currency': currency}}
+
+    def assert_unsettled(self):
+        self.payment.refresh_from_db()
+        self.escrow.refresh_from_db()
+        self.assertEqual(self.payment.status, 'processing')
+        self.assertEqual(self.escrow.status, 'pending')
+
+    def test_funding_settles_when_the_charge_succeeded_event_is_processed(self):
+        self.payment.delete()
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+        with mock.patch('payments.views.get_gateway', return_value=self.gateway):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = api.post(reverse('escrow-fund', args=[self.escrow.pk]))
+        self.assertEqual(response.status_code, 202)
+        payment = Transaction.objects.get(pk=response.data['transaction_id'])
+        self.assertEqual(payment.status, 'processing')
+        self.assertEqual(WebhookEvent.objects.get().payload['charge'], payment.gateway_transaction_id)
+
+        self.assertEqual(process_webhook_batch(), (1, 0))
+        payment.refresh_from_db()
+        self.escrow.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertIsNotNone(payment.completed_at)
+        self.assertEqual(self.escrow.status, 'funded')
+        self.assertIsNotNone(self.escrow.funded_at)
+        self.assertEqual(WebhookEvent.objects.get().status, 'processed')
+
+    def test_signature_is_checked(self):
+        body, signature = self.gateway.webhook_body([self.charge_event()])
+        with self.assertRaises(WebhookError):
+            self.gateway.verify(body, sign_payload(body, secret='not-the-secret'))
+
+        url = reverse('payment-webhook', args=[self.gateway.name])
+        with mock.patch('payments.views.get_gateway', return_value=self.gateway):
+            forged = self.client.post(url, body, content_type='application/json',
+                                      HTTP_X_SIMULATOR_SIGNATURE='0' * len(signature))
+            tampered = self.client.post(url, body.replace(b'250.00', b'2.50'), content_type='application/json',
+                                        HTTP_X_SIMULATOR_SIGNATURE=signature)
+            self.assertEqual(forged.status_code, 400)
+            self.assertEqual(tampered.status_code, 400)
+            self.assertFalse(WebhookEvent.objects.exists())
+
+            signed = self.client.post(url, body, content_type='application/json',
+                                      HTTP_X_SIMULATOR_SIGNATURE=signature)
+        self.assertEqual(signed.status_code, 200)
+        self.assertEqual(WebhookEvent.objects.get().event_id, 'sim_evt_1')
+
+    def test_redelivered_events_are_applied_once(self):
+        self.gateway.deliver([self.charge_event()])
+        self.gateway.deliver([self.charge_event(), self.charge_event()])
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+        self.assertEqual(process_webhook_batch(), (1, 0))
+        self.gateway.deliver([self.charge_event()])
+        self.assertEqual(process_webhook_batch(), (0, 0))
+        self.assertEqual(WebhookEvent.objects.get().attempts, 1)
+
+    def test_charge_for_the_wrong_amount_or_currency_is_rejected(self):
+        self.gateway.deliver([
+            self.charge_event('sim_evt_short', amount='25.00'),
+            self.charge_event('sim_evt_eur', currency='EUR'),
+        ])
+        self.assertEqual(process_webhook_batch(), (0, 2))
+        self.assert_unsettled()
+        for event in WebhookEvent.objects.all():
+            self.assertEqual(event.status, 'failed')
+            self.assertIn('expected 250.00 USD', event.last_error)
+
+        # The charge stays open, so a correct event still settles it.
+        self.gateway.deliver([self.charge_event('sim_evt_ok')])
+        self.assertEqual(process_webhook_batch(), (1, 0))
+        self.escrow.refresh_from_db()
+        self.assertEqual(self.escrow.status, 'funded')
+
+    def test_failing_batch_rolls_back_and_retries_until_max_attempts(self):
+        def settle_then_fail(gateway, events, now):
+            charge_succeeded(gateway, events, now)
+            raise RuntimeError('handler crashed')
+
+        self.gateway.deliver([self.charge_event()])
+        with mock.patch.dict(EVENT_HANDLERS, {'charge.succeeded': settle_then_fail}):
+            self.assertEqual(process_webhook_batch(), (0, 0))
+            self.assert_unsettled()
+            event = WebhookEvent.objects.get()
+            self.assertEqual((event.status, event.attempts, event.last_error), ('received', 1, 'handler crashed'))
+
+            for _ in range(WEBHOOK_MAX_ATTEMPTS - 2):
+                self.assertEqual(process_webhook_batch(), (0, 0))
+            self.assertEqual(process_webhook_batch(), (0, 1))
+            self.assertEqual(process_webhook_batch(), (0, 0))
+
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('failed', WEBHOOK_MAX_ATTEMPTS))
+        self.assert_unsettled()
+
+
+class RiskRuleTests(EscrowFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_parties()
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+
+    def test_each_rule_trips_past_its_limit(self):
+        # Middle of a window, so the previous bucket carries no weight.
+        now = 10 ** 6 * 86400 + 30
+        for rule in DEFAULT_RISK_RULES:
+            with self.subTest(rule=rule['name']):
+                counter = SlidingWindowCounter('default', prefix=f"test:{rule['name']}")
+                action = rule['actions'][0]
+                amount = Decimal(rule.get('min_amount', 100))
+                attempt = lambda: tripped_rules(action, self.client_user.id, '10.0.0.1', amount, counter, now)
+                for _ in range(rule['limit']):
+                    self.assertNotIn(rule['name'], attempt())
+                self.assertIn(rule['name'], attempt())
+
+    def test_amount_rule_ignores_small_amounts(self):
+        counter = SlidingWindowCounter('default', prefix='test:small')
+        for _ in range(10):
+            self.assertNotIn('large_escrows_per_day', tripped_rules(
+                'fund_escrow', self.client_user.id, None, Decimal('4999'), counter
+            ))
+
+    def add_card(self, last_four='4242'):
+        return self.api.post('/api/payments/methods/', {
+            'method_type': 'credit_card',
+            'last_four_digits': last_four,
+            'provider_token': f'tok_{last_four}',
+        }, format='json')
+
+    @override_settings(PAYMENT_RISK_RULES=[
+        {'name': 'cards', 'actions': ['add_payment_method'], 'scope': 'user', 'limit': 1, 'window': 3600},
+    ])
+    def test_tripped_rule_holds_the_request(self):
+        self.assertEqual(self.add_card('1111').status_code, 201)
+        response = self.add_card('2222')
+        self.assertEqual(response.status_code, 202)
+        hold = RiskHold.objects.get(pk=response.data['hold_id'])
+        self.assertEqual((hold.user, hold.action, hold.rules), (self.client_user, 'add_payment_method', ['cards']))
+        self.assertFalse(PaymentMethod.objects.filter(last_four_digits='2222').exists())
+
+    @override_settings(PAYMENT_RISK_RULES=[
+        {'name': 'cards', 'actions': ['add_payment_method'], 'scope': 'user', 'limit': 0, 'window': 3600},
+    ])
+    def test_approval_lets_exactly_the_matching_retry_through(self):
+        hold = RiskHold.objects.get(pk=self.add_card('4242').data['hold_id'])
+        hold.status = 'approved'
+        hold.reviewed_at = timezone.now()
+        hold.save()
+
+        self.assertEqual(self.add_card('9999').status_code, 202)
+        self.assertEqual(self.add_card('4242').status_code, 201)
+        self.assertEqual(self.add_card('4242').status_code, 202)
+        hold.refresh_from_db()
+        self.assertIsNotNone(hold.consumed_at)
+
+    @override_settings(PAYMENT_RISK_RULES=[
+        {'name': 'cards', 'actions': ['add_payment_method'], 'scope': 'user', 'limit': 0, 'window': 3600},
+    ])
+    def test_approval_expires(self):
+        hold = RiskHold.objects.get(pk=self.add_card('4242').data['hold_id'])
+        hold.status = 'approved'
+        hold.reviewed_at = timezone.now() - approval_window() - timedelta(seconds=1)
+        hold.save()
+
+        self.assertEqual(self.add_card('4242').status_code, 202)
+        hold.refresh_from_db()
+        self.assertIsNone(hold.consumed_at)
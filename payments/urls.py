@@ -11,6 +11,7 @@ urlpatterns = [
     
     # Transactions
     path('transactions/', views.TransactionList.as_view(), name='transaction-list'),
+    path('transactions/export/', views.export_transactions, name='transaction-export'),
     path('transactions/<int:pk>/', views.TransactionDetail.as_view(), name='transaction-detail'),
     
     # Escrow
@@ -22,6 +23,10 @@ urlpatterns = [
     # Invoices
     path('invoices/', views.InvoiceList.as_view(), name='invoice-list'),
     path('invoices/<int:pk>/', views.InvoiceDetail.as_view(), name='invoice-detail'),
+    path('invoices/<int:pk>/pdf/', views.download_invoice_pdf, name='invoice-pdf'),
+    
+    # Gateway webhooks
+    path('webhooks/<str:gateway>/', views.payment_webhook, name='payment-webhook'),
     
     # Earnings
     path('earnings/', views.provider_earnings, name='provider-earnings'),
@@ -1,17 +1,66 @@
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from decimal import Decimal
-from django.db.models import Q, Sum
+from django.core.files.storage import default_storage
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import transaction as db_transaction
+from django.db.models import Prefetch, Q
 from django.db.models.functions import TruncMonth
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import generics, permissions, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import PaymentMethod, Wallet, Transaction, Escrow, Invoice
 from .serializers import (
     PaymentMethodSerializer, WalletSerializer, TransactionSerializer,
-    EscrowSerializer, InvoiceSerializer
+    TransactionHistorySerializer, EscrowSerializer, InvoiceSerializer
 )
+from .fx import base_currency, converted_groups, converted_totals, unconverted_report
+from .gateways import WebhookError, get_gateway
+from .risk import check_payment_risk, payment_method_target
+from .invoice_pdf import (
+    PDFRenderer, document_hash, invoice_document, invoice_pdf_path,
+    pdf_file_response, render_failure, render_retry_after, schedule_render
+)
+from .statements import (
+    CSVStatementRenderer, NDJSONStatementRenderer,
+    opening_balances, statement_records, stream_csv, stream_ndjson
+)
+from .webhooks import OPEN_STATUSES, record_events
+from skills.models import Skill
+
+# select_related / prefetch_related needed by each TransactionList ?expand= option,
+# so an expanded page stays a fixed number of queries regardless of its size.
+TRANSACTION_EXPAND_PLANS = {
+    'user': {
+        'select': ['user__profile'],
+        'prefetch': [],
+    },
+    'project': {
+        'select': ['project__client__profile', 'project__category', 'project__template__category'],
+        'prefetch': [
+            Prefetch('project__required_skills', queryset=Skill.objects.select_related('category')),
+            Prefetch('project__template__required_skills', queryset=Skill.objects.select_related('category')),
+            'project__attachments',
+        ],
+    },
+    'proposal': {
+        'select': ['proposal__freelancer__profile', 'proposal__project__client__profile'],
+        'prefetch': ['proposal__attachments'],
+    },
+    'payment_method': {
+        'select': ['payment_method__user__profile'],
+        'prefetch': [],
+    },
+}
+
+def held_for_review(decision):
+    return Response({
+        'message': 'This operation has been held for review',
+        'hold_id': decision.hold.id
+    }, status=status.HTTP_202_ACCEPTED)
 
 class PaymentMethodList(generics.ListCreateAPIView):
     serializer_class = PaymentMethodSerializer
@@ -20,6 +69,22 @@ class PaymentMethodList(generics.ListCreateAPIView):
     def get_queryset(self):
         return PaymentMethod.objects.filter(user=self.request.user, is_active=True)
     
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # An approved hold only lets this particular card through
+        target = payment_method_target(
+            serializer.validated_data.get('method_type', ''),
+            serializer.validated_data.get('last_four_digits', ''),
+            serializer.validated_data.get('provider_token', ''),
+        )
+        decision = check_payment_risk(request, 'add_payment_method', target=target)
+        if not decision.allowed:
+            return held_for_review(decision)
+        self.perform_create(serializer)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+    
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
@@ -39,13 +104,83 @@ class WalletDetail(generics.RetrieveAPIView):
         return wallet
 
 class TransactionList(generics.ListAPIView):
-    serializer_class = TransactionSerializer
+    """
+    Compact transaction history for the current user.
+    Pass ?expand=project,proposal,payment_method,user for full nested objects.
+    """
+    serializer_class = TransactionHistorySerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['transaction_type', 'status', 'project']
     
+    def get_expand(self):
+        requested = self.request.query_params.get('expand', '')
+        names = [name.strip() for name in requested.split(',')]
+        return [name for name in TRANSACTION_EXPAND_PLANS if name in names]
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+    
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user).order_by('-created_at')
+        queryset = Transaction.objects.filter(
+            user=self.request.user
+        ).select_related('project', 'payment_method')
+        
+        for name in self.get_expand():
+            plan = TRANSACTION_EXPAND_PLANS[name]
+            queryset = queryset.select_related(*plan['select']).prefetch_related(*plan['prefetch'])
+        
+        return queryset.order_by('-created_at')
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@renderer_classes([CSVStatementRenderer, NDJSONStatementRenderer])
+def export_transactions(request):
+    """
+    Stream the current user's full statement as CSV or NDJSON.
+    ?format=csv|ndjson&from=YYYY-MM-DD&to=YYYY-MM-DD (both dates inclusive).
+    Monthly opening/closing balances are emitted after each month's rows.
+    """
+    bounds = {}
+    for param in ('from', 'to'):
+        value = request.query_params.get(param)
+        if value:
+            try:
+                day = parse_date(value)
+            except ValueError:
+                # Well-formed but not a real date, e.g. 2024-02-30
+                day = None
+            if day is None:
+                return Response({'error': f'Invalid {param} date, expected YYYY-MM-DD'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            bounds[param] = timezone.make_aware(datetime.combine(day, time.min))
+    
+    start = bounds.get('from')
+    end = bounds['to'] + timedelta(days=1) if 'to' in bounds else None
+    
+    history = Transaction.objects.filter(user=request.user)
+    balances = opening_balances(history, start)
+    
+    rows = history
+    if start:
+        rows = rows.filter(created_at__gte=start)
+    if end:
+        rows = rows.filter(created_at__lt=end)
+    records = statement_records(rows, balances)
+    
+    renderer = request.accepted_renderer
+    if renderer.format == 'csv':
+        content = stream_csv(records)
+    else:
+        content = stream_ndjson(records)
+    
+    response = StreamingHttpResponse(content, content_type=renderer.media_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="statement-{request.user.username}.{renderer.format}"'
+    )
+    return response
 
 class TransactionDetail(generics.RetrieveAPIView):
     serializer_class = TransactionSerializer
@@ -71,6 +206,12 @@ def create_escrow(request):
         if Escrow.objects.filter(project=project).exists():
             return Response({'error': 'Escrow already exists for this project'}, status=status.HTTP_400_BAD_REQUEST)
         
+        decision = check_payment_risk(
+            request, 'create_escrow', amount=proposal.proposed_price, target=f'proposal:{proposal.id}'
+        )
+        if not decision.allowed:
+            return held_for_review(decision)
+        
         # Calculate platform fee (e.g., 10%)
         platform_fee_rate = Decimal('0.10')
         platform_fee = proposal.proposed_price * platform_fee_rate
@@ -108,29 +249,43 @@ class EscrowDetail(generics.RetrieveAPIView):
 @permission_classes([permissions.IsAuthenticated])
 def fund_escrow(request, pk):
     try:
-        escrow = Escrow.objects.get(pk=pk, client=request.user)
-        if escrow.status != 'pending':
-            return Response({'error': 'Escrow cannot be funded'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Create transaction for escrow hold
-        transaction = Transaction.objects.create(
-            user=request.user,
-            transaction_type='escrow_hold',
-            status='completed',
-            amount=escrow.amount,
-            currency=escrow.currency,
-            net_amount=escrow.amount,
-            project=escrow.project,
-            description=f'Escrow hold for project: {escrow.project.title}'
-        )
+        # Start the charge; the escrow becomes funded when the gateway's
+        # charge.succeeded webhook is processed (see payments.webhooks).
+        gateway = get_gateway()
+        with db_transaction.atomic():
+            # Lock the escrow so concurrent requests check for an open hold one at a time.
+            escrow = Escrow.objects.select_for_update().select_related('project').get(pk=pk, client=request.user)
+            if escrow.status != 'pending':
+                return Response({'error': 'Escrow cannot be funded'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            if Transaction.objects.filter(
+                project=escrow.project, transaction_type='escrow_hold', status__in=OPEN_STATUSES
+            ).exists():
+                return Response({'error': 'Escrow funding is already in progress'}, status=status.HTTP_409_CONFLICT)
+            
+            decision = check_payment_risk(request, 'fund_escrow', amount=escrow.amount, target=f'escrow:{escrow.id}')
+            if not decision.allowed:
+                return held_for_review(decision)
+            
+            transaction = Transaction.objects.create(
+                user=request.user,
+                transaction_type='escrow_hold',
+                status='processing',
+                amount=escrow.amount,
+                currency=escrow.currency,
+                net_amount=escrow.amount,
+                project=escrow.project,
+                payment_gateway=gateway.name,
+                description=f'Escrow hold for project: {escrow.project.title}'
+            )
+            transaction.gateway_transaction_id = gateway.charge(transaction)
+            transaction.save(update_fields=['gateway_transaction_id'])
         
-        # Update escrow status
-        from django.utils import timezone
-        escrow.status = 'funded'
-        escrow.funded_at = timezone.now()
-        escrow.save()
-        
-        return Response({'message': 'Escrow funded successfully'}, status=status.HTTP_200_OK)
+        return Response({
+            'message': 'Escrow funding submitted',
+            'transaction_id': transaction.id,
+            'status': transaction.status
+        }, status=status.HTTP_202_ACCEPTED)
     except Escrow.DoesNotExist:
         return Response({'error': 'Escrow not found'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -142,6 +297,10 @@ def release_escrow(request, pk):
         if escrow.status != 'funded':
             return Response({'error': 'Escrow cannot be released'}, status=status.HTTP_400_BAD_REQUEST)
         
+        decision = check_payment_risk(request, 'release_escrow', amount=escrow.amount, target=f'escrow:{escrow.id}')
+        if not decision.allowed:
+            return held_for_review(decision)
+        
         # Create transactions
         from django.utils import timezone
         
@@ -202,6 +361,66 @@ class InvoiceDetail(generics.RetrieveAPIView):
             Q(client=self.request.user) | Q(freelancer=self.request.user)
         )
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@renderer_classes([JSONRenderer, PDFRenderer])
+def download_invoice_pdf(request, pk):
+    """
+    Serve the invoice as a PDF from the content-hash cache, with ETag and
+    Range support. A cache miss queues a background render and returns 202.
+    """
+    try:
+        invoice = Invoice.objects.select_related('project', 'client', 'freelancer').get(
+            Q(client=request.user) | Q(freelancer=request.user),
+            pk=pk
+        )
+    except Invoice.DoesNotExist:
+        return Response({'error': 'Invoice not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    document = invoice_document(invoice)
+    content_hash = document_hash(document)
+    etag = f'"{content_hash}"'
+    
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        return response
+    
+    path = invoice_pdf_path(content_hash)
+    if not default_storage.exists(path):
+        failure = render_failure(content_hash)
+        retry_after = render_retry_after(failure) if failure else 0
+        if retry_after:
+            response = Response({
+                'status': failure['status'],
+                'error': f'Invoice PDF could not be rendered: {failure["error"]}',
+                'attempts': failure['attempts'],
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(retry_after)
+            return response
+        schedule_render(document, content_hash)
+        response = Response({'status': 'rendering'}, status=status.HTTP_202_ACCEPTED)
+        response['Retry-After'] = '2'
+        return response
+    
+    return pdf_file_response(request, path, etag, f'{invoice.invoice_number}.pdf')
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def payment_webhook(request, gateway):
+    """Store signed gateway events in the inbox; process_webhooks applies them."""
+    backend = get_gateway()
+    if gateway != backend.name:
+        return Response({'error': 'Unknown payment gateway'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        events = backend.parse_webhook(request)
+    except WebhookError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    received = record_events(backend.name, events)
+    return Response({'received': received}, status=status.HTTP_200_OK)
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def provider_earnings(request):
@@ -219,33 +438,38 @@ def provider_earnings(request):
         status='completed'
     )
     
-    total_earnings = payouts.aggregate(total=Sum('net_amount'))['total'] or Decimal('0.00')
-    last_30_days = payouts.filter(
+    # Payouts can be in several currencies; totals are converted to the base currency in SQL.
+    # Amounts in currencies without a rate are reported separately rather than dropped.
+    total_earnings, unconverted_earnings = converted_totals(payouts, 'net_amount')
+    last_30_days, unconverted_last_30_days = converted_totals(payouts.filter(
         created_at__gte=timezone.now() - timedelta(days=30)
-    ).aggregate(total=Sum('net_amount'))['total'] or Decimal('0.00')
+    ), 'net_amount')
     
-    outstanding = Escrow.objects.filter(
+    outstanding, unconverted_outstanding = converted_totals(Escrow.objects.filter(
         freelancer=request.user,
         status__in=['funded', 'in_progress']
-    ).aggregate(total=Sum('freelancer_amount'))['total'] or Decimal('0.00')
+    ), 'freelancer_amount')
     
-    monthly_qs = payouts.annotate(
-        month=TruncMonth('created_at')
-    ).values('month').annotate(
-        total=Sum('net_amount')
-    ).order_by('month')
+    monthly = sorted(converted_groups(
+        payouts.annotate(month=TruncMonth('created_at')), ['month'], 'net_amount'
+    ).items())
     
-    top_projects_qs = payouts.filter(
-        project__isnull=False
-    ).values('project__title').annotate(
-        total=Sum('net_amount')
-    ).order_by('-total')[:5]
+    # Ranked on the converted total; a project paid only in unconvertible currencies ranks last.
+    top_projects = sorted(converted_groups(
+        payouts.filter(project__isnull=False), ['project_id', 'project__title'], 'net_amount'
+    ).items(), key=lambda item: item[1][0], reverse=True)[:5]
     
     data = {
         'summary': {
+            'currency': base_currency(),
             'lifetime': float(total_earnings),
             'last_30_days': float(last_30_days),
             'outstanding': float(outstanding or Decimal('0.00')),
+            'unconverted': unconverted_report(
+                lifetime=unconverted_earnings,
+                last_30_days=unconverted_last_30_days,
+                outstanding=unconverted_outstanding,
+            ),
         },
         'mode': {
             'provider_mode': getattr(profile, 'provider_mode', 'offline'),
@@ -255,17 +479,19 @@ def provider_earnings(request):
         },
         'monthly_trend': [
             {
-                'month': entry['month'].strftime('%Y-%m') if entry['month'] else 'N/A',
-                'total': float(entry['total'] or Decimal('0.00'))
+                'month': month.strftime('%Y-%m') if month else 'N/A',
+                'total': float(total),
+                'unconverted': {currency: float(amount) for currency, amount in unconverted.items()},
             }
-            for entry in monthly_qs
+            for (month,), (total, unconverted) in monthly
         ],
         'top_projects': [
             {
-                'title': entry['project__title'] or 'Untitled Project',
-                'earned': float(entry['total'] or Decimal('0.00'))
+                'title': title or 'Untitled Project',
+                'earned': float(total),
+                'unconverted': {currency: float(amount) for currency, amount in unconverted.items()},
             }
-            for entry in top_projects_qs
+            for (_, title), (total, unconverted) in top_projects
         ]
     }
     
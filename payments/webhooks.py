@@ -0,0 +1,179 @@
+"""
+Webhook inbox processing.
+
+record_events() is all the webhook endpoint does: one INSERT that silently
+drops event ids already in the inbox. process_webhook_batch() later claims a
+batch of received events, skipping rows another worker holds, and applies
+each event type with set-based UPDATEs, so a batch costs a handful of
+queries however many charges it settles.
+"""
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Escrow, Transaction, WebhookEvent
+
+WEBHOOK_BATCH_SIZE = 200
+WEBHOOK_MAX_ATTEMPTS = 5
+
+# Transactions a charge event may still move to completed / failed.
+OPEN_STATUSES = ('pending', 'processing')
+
+
+def record_events(gateway, events):
+    """Store events in the inbox, ignoring ones already received. Returns the count offered."""
+    WebhookEvent.objects.bulk_create(
+        [
+            WebhookEvent(
+                gateway=gateway,
+                event_id=str(event['id'])[:200],
+                event_type=str(event['type'])[:100],
+                payload=event.get('data') or {},
+            )
+            for event in events
+        ],
+        ignore_conflicts=True,
+    )
+    return len(events)
+
+
+def _charge_references(events):
+    return [event.payload.get('charge') for event in events if event.payload.get('charge')]
+
+
+def _mismatched_charges(events, payments):
+    """
+    {event id: reason} for events whose amount or currency differ from the
+    Transaction they would settle. Those charges are not applied.
+    """
+    expected = {
+        reference: (amount, currency)
+        for reference, amount, currency in payments.values_list('gateway_transaction_id', 'amount', 'currency')
+    }
+    mismatched = {}
+    for event in events:
+        reference = event.payload.get('charge')
+        if reference not in expected:
+            continue
+        amount, currency = expected[reference]
+        try:
+            paid = Decimal(str(event.payload.get('amount')))
+        except InvalidOperation:
+            paid = None
+        paid_currency = str(event.payload.get('currency') or '').upper()
+        if paid != amount or paid_currency != currency.upper():
+            mismatched[event.id] = (
+                f"Charge {reference} reported {event.payload.get('amount')} {event.payload.get('currency')}, "
+                f"expected {amount} {currency}"
+            )
+    return mismatched
+
+
+def _settle_charges(gateway, events, new_status, now):
+    """Move the charged Transactions to `new_status`. Returns {event id: reason} for rejected events."""
+    payments = Transaction.objects.filter(
+        payment_gateway=gateway,
+        gateway_transaction_id__in=_charge_references(events),
+        status__in=OPEN_STATUSES,
+    )
+    rejected = {}
+    if new_status == 'completed':
+        # Money is only accepted for exactly what was charged; anything else stays open for review.
+        rejected = _mismatched_charges(events, payments)
+        payments = payments.filter(
+            gateway_transaction_id__in=_charge_references(event for event in events if event.id not in rejected)
+        )
+    held_projects = list(
+        payments.filter(transaction_type='escrow_hold', project__isnull=False)
+        .order_by().values_list('project_id', flat=True)
+    )
+    updates = {'status': new_status}
+    if new_status == 'completed':
+        updates['completed_at'] = now
+    payments.update(**updates)
+
+    if held_projects and new_status == 'completed':
+        Escrow.objects.filter(project_id__in=held_projects, status='pending').update(
+            status='funded', funded_at=now, updated_at=now
+        )
+    return rejected
+
+
+def charge_succeeded(gateway, events, now):
+    return _settle_charges(gateway, events, 'completed', now)
+
+
+def charge_failed(gateway, events, now):
+    return _settle_charges(gateway, events, 'failed', now)
+
+
+EVENT_HANDLERS = {
+    'charge.succeeded': charge_succeeded,
+    'charge.failed': charge_failed,
+}
+
+
+def pending_events():
+    return WebhookEvent.objects.filter(status='received', attempts__lt=WEBHOOK_MAX_ATTEMPTS)
+
+
+def process_webhook_batch(batch_size=WEBHOOK_BATCH_SIZE):
+    """
+    Apply up to `batch_size` received events. Returns (processed, failed).
+    A charge.succeeded whose amount or currency does not match its
+    Transaction is rejected: the event fails and the charge stays open.
+    A batch that raises is rolled back and its events retried on a later
+    run, until WEBHOOK_MAX_ATTEMPTS marks them failed.
+    """
+    with transaction.atomic():
+        events = list(
+            pending_events()
+            .select_for_update(skip_locked=True)
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0, 0
+        ids = [event.id for event in events]
+        now = timezone.now()
+
+        groups = {}
+        for event in events:
+            groups.setdefault((event.gateway, event.event_type), []).append(event)
+
+        rejected = {}
+        try:
+            with transaction.atomic():
+                for (gateway, event_type), group in groups.items():
+                    # Unknown event types are acknowledged and ignored.
+                    handler = EVENT_HANDLERS.get(event_type)
+                    if handler is not None:
+                        rejected.update(handler(gateway, group, now))
+        except Exception as exc:
+            WebhookEvent.objects.filter(id__in=ids).update(
+                attempts=F('attempts') + 1, last_error=str(exc)[:1000]
+            )
+            failed = WebhookEvent.objects.filter(
+                id__in=ids, attempts__gte=WEBHOOK_MAX_ATTEMPTS
+            ).update(status='failed')
+            return 0, failed
+
+        # Rejected events will not apply on a retry either, so they fail straight away.
+        for event_id, reason in rejected.items():
+            WebhookEvent.objects.filter(id=event_id).update(
+                status='failed', processed_at=now, attempts=F('attempts') + 1, last_error=reason[:1000]
+            )
+        WebhookEvent.objects.filter(id__in=ids).exclude(id__in=rejected).update(
+            status='processed', processed_at=now, attempts=F('attempts') + 1
+        )
+        return len(ids) - len(rejected), len(rejected)
+
+
+def process_webhooks(batch_size=WEBHOOK_BATCH_SIZE, max_batches=None):
+    """Drain the inbox batch by batch. Yields (processed, failed) per batch."""
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        processed, failed = process_webhook_batch(batch_size)
+        if not processed and not failed:
+            return
+        batches += 1
+        yield processed, failed
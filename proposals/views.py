@@ -7,8 +7,17 @@ from django.utils import timezone
 from .models import Proposal, ProposalAttachment, ProposalComparison
 from .serializers import ProposalSerializer, ProposalAttachmentSerializer, ProposalComparisonSerializer
 from projects.models import Project
+from messaging.events import publish_event
 
 
+def publish_status_change(proposal_id, project_id, freelancer_id, client_id, new_status):
+    """Push a proposal status change to the freelancer's and client's event streams."""
+    publish_event([freelancer_id, client_id], 'proposal.status', {
+        'id': proposal_id,
+        'project': project_id,
+        'status': new_status,
+    })
+
 class ProposalList(generics.ListCreateAPIView):
     """
     List proposals or create a new proposal.
@@ -262,10 +271,17 @@ def accept_proposal(request, pk):
         proposal.project.save(update_fields=['status'])
 
         # Reject other pending proposals for the same project
-        rejected_count = Proposal.objects.filter(
+        others = Proposal.objects.filter(
             project=proposal.project,
             status='pending'
-        ).exclude(pk=pk).update(status='rejected', responded_at=timezone.now())
+        ).exclude(pk=pk)
+        rejected = list(others.values_list('id', 'freelancer_id'))
+        rejected_count = others.update(status='rejected', responded_at=timezone.now())
+        
+        client_id = proposal.project.client_id
+        publish_status_change(proposal.id, proposal.project_id, proposal.freelancer_id, client_id, 'accepted')
+        for other_id, freelancer_id in rejected:
+            publish_status_change(other_id, proposal.project_id, freelancer_id, client_id, 'rejected')
 
         return Response({
             'message': 'Proposal accepted successfully',
@@ -304,6 +320,9 @@ def reject_proposal(request, pk):
         proposal.status = 'rejected'
         proposal.responded_at = timezone.now()
         proposal.save()
+        publish_status_change(
+            proposal.id, proposal.project_id, proposal.freelancer_id, proposal.project.client_id, 'rejected'
+        )
 
         return Response({
             'message': 'Proposal rejected',
@@ -333,6 +352,9 @@ def withdraw_proposal(request, pk):
         # Withdraw the proposal
         proposal.status = 'withdrawn'
         proposal.save()
+        publish_status_change(
+            proposal.id, proposal.project_id, proposal.freelancer_id, proposal.project.client_id, 'withdrawn'
+        )
 
         # Update project proposals count
         if proposal.project:
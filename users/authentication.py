@@ -0,0 +1,119 @@
+"""
+JWT authentication that resolves the user from the cache.
+
+JWTAuthentication loads the User row on every request, and most views then
+load the profile as well. CachedJWTAuthentication keeps both for
+AUTH_USER_CACHE_SECONDS in the default cache (per process with LocMemCache,
+shared with Redis or Memcached), so an authenticated request usually costs
+no query at all before the view runs.
+
+Only the fields below are cached. Anything else is left deferred and loads
+on first access, and saving such a user writes only the cached fields, so a
+cached user can never write stale values over columns it did not load. The
+password hash itself is never cached; with CHECK_REVOKE_TOKEN only its MD5
+token version is.
+
+User.save() and UserProfile.save() drop the entry. Writes that bypass
+save(), such as QuerySet.update(), are picked up when the entry expires.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .models import User, UserProfile
+
+USER_CACHE_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'phone', 'user_type',
+    'is_active', 'is_staff', 'is_superuser', 'is_email_verified', 'is_phone_verified',
+    'last_login', 'date_joined', 'created_at', 'updated_at',
+)
+
+PROFILE_CACHE_FIELDS = (
+    'id', 'user_id', 'profile_picture', 'city', 'country', 'hustle_score', 'provider_mode',
+    'base_hourly_rate', 'online_rate_multiplier', 'is_team_member', 'team_id',
+)
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def forget_user(user_id):
+    """
+    Drop the cached user now, and again once the current transaction
+    commits in case a concurrent request re-cached the old row meanwhile.
+    """
+    key = user_cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def load_user_entry(user_id):
+    """The cacheable fields of a user and their profile, in one query; None if there is no such user."""
+    profile_columns = [f'profile__{field}' for field in PROFILE_CACHE_FIELDS]
+    row = User.objects.filter(id=user_id).values(*USER_CACHE_FIELDS, *profile_columns, 'password').first()
+    if row is None:
+        return None
+    profile = {field: row[f'profile__{field}'] for field in PROFILE_CACHE_FIELDS}
+    return {
+        'user': {field: row[field] for field in USER_CACHE_FIELDS},
+        'profile': profile if profile['id'] is not None else None,
+        'token_version': get_md5_hash_password(row['password']),
+    }
+
+
+def _instance(model, values):
+    """A model instance as if loaded with .only(*values); from_db wants values in field order."""
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+
+
+def build_user(entry):
+    user = _instance(User, entry['user'])
+    profile = None
+    if entry['profile'] is not None:
+        profile = _instance(UserProfile, entry['profile'])
+        UserProfile.user.field.set_cached_value(profile, user)
+    # A cached None makes user.profile raise DoesNotExist without a query, as usual.
+    User.profile.related.set_cached_value(user, profile)
+    return user
+
+
+def cached_user(user_id):
+    """(user, token_version) for `user_id`, from the cache when possible; (None, None) if there is no such user."""
+    key = user_cache_key(user_id)
+    entry = cache.get(key)
+    if entry is None:
+        entry = load_user_entry(user_id)
+        if entry is None:
+            return None, None
+        cache.set(key, entry, settings.AUTH_USER_CACHE_SECONDS)
+    return build_user(entry), entry['token_version']
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication with the user, and their profile, served from the cache."""
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_FIELD != 'id':
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+        user, token_version = cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != token_version:
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
@@ -1,37 +1,37 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.db.models.functions import Lower
 
 UserModel = get_user_model()
 
 class EmailBackend(ModelBackend):
+    """
+    Log in with an email address or a username, case-insensitively.
+    Identifiers containing '@' are looked up by email, everything else by
+    username, each with one query on the matching Lower() index.
+    """
+    
+    def get_login_user(self, identifier):
+        field = 'email' if '@' in identifier else 'username'
+        return (
+            UserModel._default_manager.alias(login=Lower(field))
+            .filter(login=identifier.lower())
+            .order_by('id')
+            .first()
+        )
+    
     def authenticate(self, request, username=None, password=None, **kwargs):
-        print(f"🔐 AUTHENTICATION BACKEND CALLED")
-        print(f"📧 Username/Email provided: {username}")
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
         
-        try:
-            # Try to find user by email or username
-            user = UserModel.objects.get(
-                Q(email__iexact=username) | Q(username__iexact=username)
-            )
-            print(f"✅ User found in backend: {user.email}")
-        except UserModel.DoesNotExist:
-            print("❌ User not found in backend")
+        user = self.get_login_user(username)
+        if user is None:
+            # Run the hasher anyway so unknown accounts take as long as wrong passwords.
+            UserModel().set_password(password)
             return None
-        except UserModel.MultipleObjectsReturned:
-            print("⚠️ Multiple users found")
-            user = UserModel.objects.filter(
-                Q(email__iexact=username) | Q(username__iexact=username)
-            ).order_by('id').first()
-
-        if user and user.check_password(password):
-            print("✅ Backend password check PASSED")
-            if self.user_can_authenticate(user):
-                print("✅ User can authenticate")
-                return user
-            else:
-                print("❌ User cannot authenticate (inactive or other issue)")
-        else:
-            print("❌ Backend password check FAILED")
-            
-        return None
\ No newline at end of file
+        
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
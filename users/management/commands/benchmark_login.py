@@ -0,0 +1,110 @@
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from users.backends import EmailBackend
+from users.models import User
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+
+def legacy_lookup(identifier):
+    """The lookup EmailBackend used before: an OR of two iexact filters, with a retry on duplicates."""
+    try:
+        return User.objects.get(Q(email__iexact=identifier) | Q(username__iexact=identifier))
+    except User.DoesNotExist:
+        return None
+    except User.MultipleObjectsReturned:
+        return User.objects.filter(
+            Q(email__iexact=identifier) | Q(username__iexact=identifier)
+        ).order_by('id').first()
+
+
+def full_login(identifier):
+    return authenticate(username=identifier, password=BENCHMARK_PASSWORD)
+
+
+class Command(BaseCommand):
+    help = 'Measure login lookup latency (p50/p99) under concurrent load, before and after the Lower() indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000, help='Accounts to create for the run')
+        parser.add_argument('--logins', type=int, default=5000, help='Logins per path')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--with-password', action='store_true',
+                            help='Run full authenticate() including the password hasher')
+
+    def identifiers(self, users, count):
+        """Emails and usernames in mixed case, with one in ten for accounts that do not exist."""
+        rng = random.Random(count)
+        identifiers = []
+        for i in range(count):
+            if i % 10 == 9:
+                identifiers.append(f'missing_{i}@example.com' if i % 20 == 9 else f'missing_{i}')
+                continue
+            username, email = rng.choice(users)
+            identifier = email if i % 2 else username
+            identifiers.append(identifier.upper() if i % 3 == 0 else identifier)
+        return identifiers
+
+    def run(self, label, login, identifiers, threads):
+        def client(batch):
+            timings = []
+            try:
+                for identifier in batch:
+                    started = time.perf_counter()
+                    login(identifier)
+                    timings.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+            return timings
+
+        batches = [identifiers[i::threads] for i in range(threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            timings = [t for batch in pool.map(client, batches) for t in batch]
+        elapsed = time.perf_counter() - started
+
+        percentiles = statistics.quantiles(timings, n=100)
+        p50, p99 = percentiles[49] * 1000, percentiles[98] * 1000
+        self.stdout.write(
+            f'  - {label}: p50 {p50:.2f}ms, p99 {p99:.2f}ms, {len(timings) / elapsed:,.0f} logins/s'
+        )
+        return p50, p99
+
+    def handle(self, *args, **options):
+        stamp = int(time.time())
+        password = make_password(BENCHMARK_PASSWORD)
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f'bench_login_{stamp}_{i}',
+                    email=f'Bench.Login.{stamp}.{i}@Example.com',
+                    password=password,
+                )
+                for i in range(options['users'])
+            ],
+            batch_size=2000,
+        )
+        accounts = User.objects.filter(username__startswith=f'bench_login_{stamp}_')
+        try:
+            users = list(accounts.values_list('username', 'email'))
+            identifiers = self.identifiers(users, options['logins'])
+            backend = EmailBackend()
+            paths = [('before (iexact OR)', legacy_lookup), ('after (Lower() index)', backend.get_login_user)]
+            if options['with_password']:
+                paths.append(('authenticate() with hasher', full_login))
+            self.stdout.write(
+                f'{options["logins"]} logins per path, {options["threads"]} threads, {len(users)} accounts'
+            )
+            results = [self.run(label, login, identifiers, options['threads']) for label, login in paths]
+        finally:
+            accounts.delete()
+
+        (_, before_p99), (_, after_p99) = results[:2]
+        self.stdout.write(self.style.SUCCESS(f'\n✓ p99 lookup latency {before_p99:.2f}ms -> {after_p99:.2f}ms'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from users.revocation import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete revoked refresh tokens that have expired anyway'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'✓ Deleted {deleted} expired token revocations'))
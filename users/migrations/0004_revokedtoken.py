@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_login_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(max_length=255, unique=True)),
+                ('expires_at', models.DateTimeField()),
+                ('revoked_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='users_revok_expires_1dfdca_idx'), models.Index(fields=['revoked_at'], name='users_revok_revoked_ff9d01_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Trigram indexes for user search (see users.search). PostgreSQL only: SQLite
+# has no trigram operator class and falls back to LIKE scans.
+
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS users_user_username_trgm_idx ON users_user USING gin (username gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS users_user_email_trgm_idx ON users_user USING gin (email gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS users_userprofile_city_trgm_idx ON users_userprofile USING gin (city gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS users_userprofile_bio_trgm_idx ON users_userprofile USING gin (bio gin_trgm_ops)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS users_userprofile_bio_trgm_idx",
+    "DROP INDEX IF EXISTS users_userprofile_city_trgm_idx",
+    "DROP INDEX IF EXISTS users_user_email_trgm_idx",
+    "DROP INDEX IF EXISTS users_user_username_trgm_idx",
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgres(POSTGRES_FORWARD), run_on_postgres(POSTGRES_BACKWARD)),
+    ]
@@ -1,6 +1,7 @@
 from decimal import Decimal
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 class User(AbstractUser):
@@ -18,8 +19,27 @@ class User(AbstractUser):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Case-insensitive login lookups (users.backends.EmailBackend)
+            models.Index(Lower('email'), name='users_user_email_lower_idx'),
+            models.Index(Lower('username'), name='users_user_username_lower_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.username} ({self.user_type})"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from .authentication import forget_user
+        forget_user(self.pk)
+    
+    def delete(self, *args, **kwargs):
+        user_id = self.pk
+        result = super().delete(*args, **kwargs)
+        from .authentication import forget_user
+        forget_user(user_id)
+        return result
 
 class UserProfile(models.Model):
     PROVIDER_MODES = (
@@ -51,6 +71,18 @@ class UserProfile(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # The cached request.user carries profile essentials
+        from .authentication import forget_user
+        forget_user(self.user_id)
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from .authentication import forget_user
+        forget_user(self.user_id)
+        return result
+    
     def update_hustle_score(self):
         # Calculate hustle score based on various factors
         # This will be implemented with business logic
@@ -92,4 +124,22 @@ class VerificationCode(models.Model):
         return not self.is_used and self.expires_at > timezone.now()
     
     def __str__(self):
-        return f"{self.verification_type} code for {self.user.email}"
\ No newline at end of file
+        return f"{self.verification_type} code for {self.user.email}"
+
+class RevokedToken(models.Model):
+    """
+    A revoked refresh token (rotated or logged out), kept only until the
+    token would have expired anyway; see users.revocation.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at']),
+            models.Index(fields=['revoked_at']),
+        ]
+    
+    def __str__(self):
+        return f"Revoked token {self.jti}"
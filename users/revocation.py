@@ -0,0 +1,157 @@
+"""
+Refresh token revocation with bounded memory and storage.
+
+Only revoked tokens are stored: one RevokedToken row per rotated or
+logged-out refresh token, kept until the token's own expiry and then deleted
+by purge_revoked_tokens. The table therefore never holds more than one
+REFRESH_TOKEN_LIFETIME of revocations, however many tokens are issued.
+
+Each process keeps a Bloom filter of the revoked JTIs. A token the filter
+has never seen is accepted without a query; only possible matches (real
+ones, plus the configured false-positive rate) are confirmed against the
+table. The filter picks up other processes' revocations incrementally every
+TOKEN_BLACKLIST_SYNC_SECONDS, re-reading a short overlap so slow commits
+are not skipped, and is rebuilt from the live rows every
+TOKEN_BLACKLIST_REBUILD_SECONDS so purged tokens stop occupying it.
+
+That sync interval is never a hole for rotation: RevocableRefreshToken
+revokes by INSERT against the unique jti index, so a rotated token replayed
+on another process before it syncs still fails there.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+from .models import RevokedToken
+
+# Revocations committed this long after they were stamped are still picked up by sync().
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter over strings, sized for `capacity` items at `error_rate`."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationFilter:
+    """The process-wide Bloom filter of revoked JTIs, kept in step with RevokedToken."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bloom = None
+        self.synced_until = None
+        self.synced_at = 0
+        self.built_at = 0
+
+    def rebuild(self):
+        started = timezone.now()
+        bloom = BloomFilter(settings.TOKEN_BLACKLIST_BLOOM_CAPACITY, settings.TOKEN_BLACKLIST_BLOOM_ERROR_RATE)
+        for jti in RevokedToken.objects.filter(expires_at__gt=started).values_list('jti', flat=True).iterator(chunk_size=10000):
+            bloom.add(jti)
+        self.bloom, self.synced_until = bloom, started
+        self.built_at = self.synced_at = time.monotonic()
+
+    def sync(self):
+        started = timezone.now()
+        rows = RevokedToken.objects.filter(revoked_at__gte=self.synced_until - SYNC_OVERLAP).values_list('jti', flat=True)
+        for jti in rows.iterator(chunk_size=10000):
+            self.bloom.add(jti)
+        self.synced_until = started
+        self.synced_at = time.monotonic()
+
+    def refresh(self):
+        now = time.monotonic()
+        if self.bloom is not None and now - self.synced_at < settings.TOKEN_BLACKLIST_SYNC_SECONDS:
+            return
+        with self._lock:
+            if self.bloom is None or now - self.built_at >= settings.TOKEN_BLACKLIST_REBUILD_SECONDS:
+                self.rebuild()
+            elif now - self.synced_at >= settings.TOKEN_BLACKLIST_SYNC_SECONDS:
+                self.sync()
+
+    def might_contain(self, jti):
+        self.refresh()
+        return jti in self.bloom
+
+    def add(self, jti):
+        if self.bloom is not None:
+            self.bloom.add(jti)
+
+
+revocations = RevocationFilter()
+
+
+def is_revoked(jti):
+    """Bloom filter first; the table is only queried for possible matches."""
+    if not revocations.might_contain(jti):
+        return False
+    return RevokedToken.objects.filter(jti=jti).exists()
+
+
+def revoke(jti, expires_at):
+    """Record `jti` as revoked. Returns False if it already was."""
+    try:
+        with transaction.atomic():
+            RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+    except IntegrityError:
+        return False
+    revocations.add(jti)
+    return True
+
+
+def purge_expired(batch_size=10000):
+    """Delete revocations whose tokens have expired anyway. Returns the number deleted."""
+    deleted = 0
+    now = timezone.now()
+    while True:
+        ids = list(RevokedToken.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        RevokedToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+
+class RevocableRefreshToken(RefreshToken):
+    """
+    A refresh token checked against, and revoked into, the RevokedToken
+    blacklist instead of simplejwt's token_blacklist app. No list of
+    outstanding tokens is kept.
+    """
+
+    def verify(self, *args, **kwargs):
+        if is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+        super().verify(*args, **kwargs)
+
+    def blacklist(self):
+        """Revoke this token; raises TokenError if it already was, e.g. a replayed rotation."""
+        if not revoke(self.payload[api_settings.JTI_CLAIM], datetime_from_epoch(self.payload['exp'])):
+            raise TokenError(_('Token is blacklisted'))
+
+    def outstand(self):
+        return None
@@ -0,0 +1,159 @@
+"""
+Ranked user search over username, city and bio (and email, for staff).
+
+On PostgreSQL every searched column has a pg_trgm GIN index (migration
+0005), so substring matches are answered from the indexes instead of a scan
+of both tables. Matching ids are collected per table, so each side can use
+its own indexes, and are then joined once for ranking. Usernames also match
+on trigram similarity, so near misses are found as well. SQLite has no
+trigram support. It falls back to LIKE matching with a fixed rank for each
+kind of match, which is enough for development and tests.
+
+Email is only matched for staff callers, and the predicate is left out of
+the SQL for everyone else rather than disabled by a parameter. Queries
+shorter than three characters have no trigrams and still scan.
+
+The score blends match quality with hustle score (0-100), so a strong
+provider outranks a slightly better text match. Results are ordered by
+(score, id) descending and paginated by keyset on that pair.
+"""
+import re
+from django.db import connection
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+
+# Share of the score taken by hustle score; the rest is match quality.
+HUSTLE_WEIGHT = 0.3
+
+POSTGRES = {
+    'user_match': "username ILIKE %(pattern)s OR username %% %(q)s",
+    'email_match': " OR email ILIKE %(pattern)s",
+    'profile_match': "city ILIKE %(pattern)s OR bio ILIKE %(pattern)s",
+    'similarity': """GREATEST(
+        similarity(u.username, %(q)s),
+        word_similarity(%(q)s, coalesce(p.city, '')),
+        word_similarity(%(q)s, coalesce(p.bio, '')) * 0.5{email}
+    )""",
+    'email_similarity': ",\n        similarity(u.email, %(q)s) * 0.8",
+    'hustle': "LEAST(GREATEST(coalesce(p.hustle_score, 0), 0), 100)::double precision / 100",
+    'float': '::double precision',
+}
+
+SQLITE = {
+    'user_match': "username LIKE %(pattern)s ESCAPE '\\'",
+    'email_match': " OR email LIKE %(pattern)s ESCAPE '\\'",
+    'profile_match': "city LIKE %(pattern)s ESCAPE '\\' OR bio LIKE %(pattern)s ESCAPE '\\'",
+    'similarity': """CASE
+        WHEN lower(u.username) = lower(%(q)s) THEN 1.0
+        WHEN u.username LIKE %(prefix)s ESCAPE '\\' THEN 0.8
+        WHEN u.username LIKE %(pattern)s ESCAPE '\\' THEN 0.6
+        WHEN p.city LIKE %(pattern)s ESCAPE '\\' THEN 0.5{email}
+        WHEN p.bio LIKE %(pattern)s ESCAPE '\\' THEN 0.3
+        ELSE 0.0
+    END""",
+    'email_similarity': "\n        WHEN u.email LIKE %(pattern)s ESCAPE '\\' THEN 0.4",
+    'hustle': "min(max(coalesce(p.hustle_score, 0), 0), 100) / 100.0",
+    'float': '',
+}
+
+SEARCH_SQL = """
+    SELECT * FROM (
+        SELECT u.id, {score} AS score
+        FROM users_user u
+        LEFT JOIN users_userprofile p ON p.user_id = u.id
+        WHERE {where}
+    ) ranked
+    {after}
+    ORDER BY ranked.score DESC, ranked.id DESC
+    LIMIT %(limit)s
+"""
+
+MATCHES_SQL = """u.id IN (
+            SELECT id FROM users_user WHERE {user_match}{email_match}
+            UNION
+            SELECT user_id FROM users_userprofile WHERE {profile_match}
+        )"""
+
+
+class SearchNotSupported(Exception):
+    pass
+
+
+def like_pattern(text, prefix=False):
+    escaped = re.sub(r'([\\%_])', r'\\\1', text)
+    return f'{escaped}%' if prefix else f'%{escaped}%'
+
+
+def encode_cursor(score, user_id):
+    return f'{score!r}_{user_id}'
+
+
+def decode_cursor(cursor):
+    """Returns (score, id); raises ValueError for anything malformed."""
+    score, _, user_id = cursor.rpartition('_')
+    return float(score), int(user_id)
+
+
+def search_sql(dialect, text, include_email, user_type, provider_mode, after):
+    """The search statement for one combination of filters; only the predicates in use are included."""
+    hustle = f"{HUSTLE_WEIGHT} * {dialect['hustle']}"
+    where = ['u.id <> %(user_id)s']
+    if text:
+        similarity = dialect['similarity'].format(email=dialect['email_similarity'] if include_email else '')
+        score = f"({1 - HUSTLE_WEIGHT} * {similarity} + {hustle}){dialect['float']}"
+        where.append(MATCHES_SQL.format(
+            user_match=dialect['user_match'],
+            email_match=dialect['email_match'] if include_email else '',
+            profile_match=dialect['profile_match'],
+        ))
+    else:
+        score = f"({hustle}){dialect['float']}"
+    if user_type:
+        where.append('u.user_type = %(user_type)s')
+    if provider_mode:
+        where.append('p.provider_mode = %(provider_mode)s')
+
+    float_param = dialect['float']
+    after_sql = ''
+    if after:
+        after_sql = (
+            f"WHERE ranked.score < %(score)s{float_param}"
+            f" OR (ranked.score = %(score)s{float_param} AND ranked.id < %(last_id)s)"
+        )
+    return SEARCH_SQL.format(score=score, where='\n          AND '.join(where), after=after_sql)
+
+
+def search_users(user, text, user_type=None, provider_mode=None, cursor=None, limit=SEARCH_PAGE_SIZE):
+    """
+    One page of users other than `user` matching `text`, best first; an
+    empty `text` ranks everyone by hustle score. Email is searched only for
+    staff. Returns (user_ids, next_cursor).
+    """
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        dialect = POSTGRES
+    elif vendor == 'sqlite':
+        dialect = SQLITE
+    else:
+        raise SearchNotSupported(f'User search is not available on {vendor}')
+
+    score, last_id = decode_cursor(cursor) if cursor else (None, None)
+    sql = search_sql(dialect, text, user.is_staff, user_type, provider_mode, after=cursor is not None)
+    params = {
+        'q': text,
+        'pattern': like_pattern(text),
+        'prefix': like_pattern(text, prefix=True),
+        'user_id': user.id,
+        'user_type': user_type,
+        'provider_mode': provider_mode,
+        'score': score,
+        'last_id': last_id,
+        'limit': limit + 1,
+    }
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+
+    next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+    return [user_id for user_id, _ in rows[:limit]], next_cursor
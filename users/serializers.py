@@ -1,8 +1,10 @@
 from rest_framework import serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
 from django.contrib.auth import authenticate
 from django.utils import timezone
 from datetime import timedelta
 from .models import User, UserProfile, VerificationCode
+from .revocation import RevocableRefreshToken
 import random
 import string
 
@@ -34,9 +36,6 @@ class UserLoginSerializer(serializers.Serializer):
         email = attrs.get('email')
         password = attrs.get('password')
         
-        print(f"🔐 LOGIN VALIDATION STARTED")
-        print(f"📧 Email: {email}")
-        
         if not email or not password:
             raise serializers.ValidationError('Email and password are required')
         
@@ -44,20 +43,11 @@ class UserLoginSerializer(serializers.Serializer):
         user = authenticate(username=email, password=password)
         
         if user:
-            print(f"✅ Django authentication SUCCESSFUL: {user.email}")
             if not user.is_active:
                 raise serializers.ValidationError('Account is disabled')
             attrs['user'] = user
             return attrs
-        else:
-            print("❌ Django authentication FAILED")
-            # Additional debugging
-            try:
-                test_user = User.objects.get(email=email)
-                print(f"⚠️ User exists but auth failed. Password check: {test_user.check_password(password)}")
-            except User.DoesNotExist:
-                print("⚠️ User does not exist")
-            raise serializers.ValidationError('Invalid credentials')
+        raise serializers.ValidationError('Invalid credentials')
 
 class UserProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
@@ -150,4 +140,12 @@ class VerifyCodeSerializer(serializers.Serializer):
         except (User.DoesNotExist, VerificationCode.DoesNotExist):
             raise serializers.ValidationError('Invalid verification code')
         
-        return attrs
\ No newline at end of file
+        return attrs
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """Refresh with rotation; the old refresh token is revoked through users.revocation"""
+    token_class = RevocableRefreshToken
+
+class TokenBlacklistSerializer(jwt_serializers.TokenBlacklistSerializer):
+    """Logout: revokes the given refresh token"""
+    token_class = RevocableRefreshToken
@@ -1,3 +1,204 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from .authentication import cached_user, user_cache_key
+from .models import RevokedToken, User, UserProfile
+from .revocation import SYNC_OVERLAP, RevocableRefreshToken, RevocationFilter, is_revoked, purge_expired
 
-# Create your tests here.
+
+# Small buckets that refill slowly, so none refills while a test runs.
+TEST_THROTTLE_RATES = {scope: (3, 3600) for scope in settings.AUTH_THROTTLE_RATES}
+
+
+@override_settings(
+    AUTH_THROTTLE_RATES=TEST_THROTTLE_RATES,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class AuthThrottleTests(TestCase):
+    def setUp(self):
+        caches[settings.AUTH_THROTTLE_CACHE].clear()
+        self.client = APIClient()
+        User.objects.create_user(username='throttled', email='throttled@example.com', password='Secret-pass-123')
+
+    def login(self, email, ip, **headers):
+        return self.client.post(
+            '/api/auth/login/', {'email': email, 'password': 'wrong'}, format='json', REMOTE_ADDR=ip, **headers
+        )
+
+    def test_account_bucket_rejects_with_retry_after(self):
+        capacity, _ = settings.AUTH_THROTTLE_RATES['login_account']
+        for i in range(capacity):
+            self.assertNotEqual(self.login('throttled@example.com', f'10.0.0.{i}').status_code, 429)
+
+        with self.assertNumQueries(0):
+            response = self.login('Throttled@Example.com', '10.0.1.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_forwarded_for_does_not_reset_ip_bucket(self):
+        capacity, _ = settings.AUTH_THROTTLE_RATES['login_ip']
+        for i in range(capacity):
+            response = self.login(f'user{i}@example.com', '10.0.0.1', HTTP_X_FORWARDED_FOR=f'192.0.2.{i}')
+            self.assertNotEqual(response.status_code, 429)
+
+        response = self.login('another@example.com', '10.0.0.1', HTTP_X_FORWARDED_FOR='192.0.2.250')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+@override_settings(TOKEN_BLACKLIST_BLOOM_CAPACITY=1000)
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='revoked', email='revoked@example.com', password='Secret-pass-123')
+        self.client = APIClient()
+        # A fresh filter per test; the process-wide one would carry other tests' revocations.
+        self.revocations = RevocationFilter()
+        patcher = mock.patch('users.revocation.revocations', self.revocations)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def refresh(self, token):
+        return self.client.post(reverse('token-refresh'), {'refresh': str(token)}, format='json')
+
+    def test_replaying_a_rotated_refresh_token_is_rejected(self):
+        token = RevocableRefreshToken.for_user(self.user)
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['refresh'], str(token))
+
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(self.refresh(response.data['refresh']).status_code, 200)
+
+    def test_refresh_after_logout_is_rejected(self):
+        token = RevocableRefreshToken.for_user(self.user)
+        self.assertEqual(self.client.post(reverse('logout'), {'refresh': str(token)}, format='json').status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertTrue(RevokedToken.objects.filter(jti=token['jti']).exists())
+
+    def test_purge_deletes_only_expired_revocations(self):
+        now = timezone.now()
+        for n in range(5):
+            RevokedToken.objects.create(jti=f'expired-{n}', expires_at=now - timedelta(minutes=n + 1))
+        RevokedToken.objects.create(jti='live', expires_at=now + timedelta(days=1))
+
+        self.assertEqual(purge_expired(batch_size=2), 5)
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+        self.assertEqual(purge_expired(), 0)
+
+    def test_sync_picks_up_revocations_from_other_processes(self):
+        self.revocations.rebuild()
+        expires_at = timezone.now() + timedelta(days=1)
+        # Inserted directly, as another process would, so this filter never saw them.
+        RevokedToken.objects.create(jti='elsewhere', expires_at=expires_at)
+        RevokedToken.objects.create(
+            jti='slow-commit', expires_at=expires_at,
+            revoked_at=self.revocations.synced_until - SYNC_OVERLAP / 2,
+        )
+        self.assertNotIn('elsewhere', self.revocations.bloom)
+
+        self.revocations.sync()
+        self.assertIn('elsewhere', self.revocations.bloom)
+        self.assertIn('slow-commit', self.revocations.bloom)
+        self.assertTrue(is_revoked('elsewhere'))
+        self.assertFalse(is_revoked('never-revoked'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cached', email='cached@example.com', password='Secret-pass-123')
+        self.profile = UserProfile.objects.create(user=self.user, city='Accra', bio='Original bio')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def is_cached(self):
+        return cache.get(user_cache_key(self.user.id)) is not None
+
+    def test_user_and_profile_saves_drop_the_entry(self):
+        self.assertEqual(self.client.get(reverse('user-detail')).status_code, 200)
+        self.assertTrue(self.is_cached())
+
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertFalse(self.is_cached())
+        self.assertEqual(cached_user(self.user.id)[0].first_name, 'Renamed')
+
+        self.profile.city = 'Kumasi'
+        self.profile.save()
+        self.assertFalse(self.is_cached())
+        self.assertEqual(cached_user(self.user.id)[0].profile.city, 'Kumasi')
+
+    def test_inactive_user_is_rejected_from_a_cached_entry(self):
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        cached_user(self.user.id)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('user-detail'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_saving_a_cached_user_keeps_uncached_columns(self):
+        user, _ = cached_user(self.user.id)
+        profile = user.profile
+        # Written elsewhere after the entry was cached
+        User.objects.filter(id=self.user.id).update(password='changed-elsewhere')
+        UserProfile.objects.filter(id=self.profile.id).update(bio='Updated bio')
+
+        user.first_name = 'Cached'
+        user.save()
+        profile.city = 'Tamale'
+        profile.save()
+
+        self.user.refresh_from_db()
+        self.profile.refresh_from_db()
+        self.assertEqual((self.user.first_name, self.user.password), ('Cached', 'changed-elsewhere'))
+        self.assertEqual((self.profile.city, self.profile.bio), ('Tamale', 'Updated bio'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserSearchTests(TestCase):
+    def setUp(self):
+        self.searcher = User.objects.create_user(username='searcher', email='searcher@example.com', password='x')
+        UserProfile.objects.create(user=self.searcher, bio='designer looking for designers')
+        self.expected = set()
+        for n in range(12):
+            # Repeated hustle scores and match kinds give equal scores, so the id tiebreak is exercised.
+            username = f'designer{n}' if n % 2 else f'member{n}'
+            user = User.objects.create_user(username=username, email=f'{username}@example.com', password='x')
+            UserProfile.objects.create(user=user, bio='Graphic designer' if n % 4 == 0 else '', hustle_score=(n % 3) * 10)
+            if n % 2 or n % 4 == 0:
+                self.expected.add(user.id)
+        self.hidden = User.objects.create_user(username='quiet', email='needle@example.com', password='x')
+
+    def walk(self, user, text, limit):
+        """Every result id from following `next` through the pages, in order."""
+        api = APIClient()
+        api.force_authenticate(user)
+        response = api.get(reverse('user-search'), {'q': text, 'limit': limit})
+        found = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), limit)
+            found.extend(result['id'] for result in response.data['results'])
+            if not response.data['next']:
+                return found
+            response = api.get(response.data['next'])
+
+    def test_pages_return_every_match_once(self):
+        everyone = set(User.objects.exclude(id=self.searcher.id).values_list('id', flat=True))
+        for text, expected in (('designer', self.expected), ('', everyone)):
+            for limit in (1, 4, 50):
+                with self.subTest(q=text, limit=limit):
+                    found = self.walk(self.searcher, text, limit)
+                    self.assertEqual(len(found), len(set(found)))
+                    self.assertEqual(set(found), expected)
+
+    def test_email_is_only_searched_for_staff(self):
+        self.assertEqual(self.walk(self.searcher, 'needle', 10), [])
+        staff = User.objects.create_user(username='staff', email='staff@example.com', password='x', is_staff=True)
+        self.assertEqual(self.walk(staff, 'needle', 10), [self.hidden.id])
@@ -0,0 +1,135 @@
+"""
+Token-bucket throttles for the unauthenticated account endpoints.
+
+Login, sending a verification code and checking one are AllowAny, and each
+attempt costs a password hash or several queries. These DRF throttles run
+before the view, so a rejected attempt never reaches the database or the
+hasher. Every endpoint has one bucket per client IP and one per targeted
+account (the email in the request), so neither a single source nor a
+distributed attack on one account gets more than its bucket.
+
+A bucket holds up to `capacity` attempts and refills at capacity / period
+per second; it is stored as (tokens, timestamp) in the cache named by
+settings.AUTH_THROTTLE_CACHE. LocMemCache keeps the buckets per process,
+which is enough for tests; production should point it at a shared cache
+such as Redis so the limits hold across workers. The read-modify-write is
+not atomic, so concurrent requests racing on one bucket can overshoot it by
+a request each, which is acceptable for a brute-force limit.
+
+Rates are settings.AUTH_THROTTLE_RATES: {scope: (capacity, period_seconds)}.
+"""
+import hashlib
+import math
+import time
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucket:
+    def __init__(self, cache_alias='default', prefix='throttle'):
+        self.cache = caches[cache_alias]
+        self.prefix = prefix
+
+    def take(self, key, capacity, period, now=None):
+        """
+        Spend one token from `key`'s bucket. Returns (allowed, retry_after),
+        where retry_after is the seconds until a token is available again.
+        """
+        now = time.time() if now is None else now
+        rate = capacity / period
+        cache_key = f'{self.prefix}:{key}'
+        state = self.cache.get(cache_key)
+        if state is None:
+            tokens = capacity
+        else:
+            tokens, updated_at = state
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+        if tokens < 1:
+            return False, (1 - tokens) / rate
+        # Expires once it would have refilled completely anyway.
+        self.cache.set(cache_key, (tokens - 1, now), timeout=math.ceil(period))
+        return True, 0
+
+
+_bucket = None
+
+
+def get_bucket():
+    global _bucket
+    if _bucket is None:
+        _bucket = TokenBucket(settings.AUTH_THROTTLE_CACHE)
+    return _bucket
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle on one bucket per identity; subclasses set `scope` and get_identity()."""
+    scope = None
+
+    def get_identity(self, request):
+        raise NotImplementedError('.get_identity() must be overridden')
+
+    def allow_request(self, request, view):
+        identity = self.get_identity(request)
+        if not identity:
+            return True
+        capacity, period = settings.AUTH_THROTTLE_RATES[self.scope]
+        allowed, self.retry_after = get_bucket().take(f'{self.scope}:{identity}', capacity, period)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class IPThrottle(TokenBucketThrottle):
+    """
+    Keyed by REMOTE_ADDR. Only when REST_FRAMEWORK['NUM_PROXIES'] says how
+    many proxies to trust is X-Forwarded-For used; without it, DRF's
+    get_ident() would take the header as sent, letting a client pick a
+    fresh bucket on every request.
+    """
+
+    def get_identity(self, request):
+        if api_settings.NUM_PROXIES is None:
+            return request.META.get('REMOTE_ADDR')
+        return self.get_ident(request)
+
+
+class EmailThrottle(TokenBucketThrottle):
+    """Keyed by the normalized email in the request body, hashed to keep addresses out of cache keys."""
+
+    def get_identity(self, request):
+        email = request.data.get('email')
+        if not isinstance(email, str) or not email.strip():
+            return None
+        return hashlib.md5(email.strip().lower().encode()).hexdigest()
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login_ip'
+
+
+class LoginAccountThrottle(EmailThrottle):
+    scope = 'login_account'
+
+
+class SendCodeIPThrottle(IPThrottle):
+    scope = 'send_code_ip'
+
+
+class SendCodeEmailThrottle(EmailThrottle):
+    scope = 'send_code_email'
+
+
+class VerifyCodeIPThrottle(IPThrottle):
+    scope = 'verify_code_ip'
+
+
+class VerifyCodeEmailThrottle(EmailThrottle):
+    scope = 'verify_code_email'
+
+
+LOGIN_THROTTLES = [LoginIPThrottle, LoginAccountThrottle]
+SEND_CODE_THROTTLES = [SendCodeIPThrottle, SendCodeEmailThrottle]
+VERIFY_CODE_THROTTLES = [VerifyCodeIPThrottle, VerifyCodeEmailThrottle]
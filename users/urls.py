@@ -1,9 +1,12 @@
 from django.urls import path
+from rest_framework_simplejwt.views import TokenBlacklistView, TokenRefreshView
 from . import views
 
 urlpatterns = [
     path('register/', views.register_user, name='register'),
     path('login/', views.login_user, name='login'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('logout/', TokenBlacklistView.as_view(), name='logout'),
     path('send-verification/', views.send_verification_code, name='send-verification'),
     path('verify-code/', views.verify_code, name='verify-code'),
 ]
\ No newline at end of file
@@ -1,11 +1,13 @@
 from rest_framework import status, generics, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.utils.urls import replace_query_param
 from django.core.mail import send_mail
 from django.conf import settings
-from django.db.models import Q
+from . import search
 from .models import User, UserProfile, VerificationCode
+from .revocation import RevocableRefreshToken
+from .throttling import LOGIN_THROTTLES, SEND_CODE_THROTTLES, VERIFY_CODE_THROTTLES
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, UserSerializer,
     UserProfileSerializer, VerificationSerializer, VerifyCodeSerializer
@@ -39,13 +41,14 @@ def register_user(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes(LOGIN_THROTTLES)
 def login_user(request):
     serializer = UserLoginSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.validated_data['user']
 
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = RevocableRefreshToken.for_user(user)
 
         return Response({
             'access': str(refresh.access_token),
@@ -58,6 +61,7 @@ def login_user(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes(SEND_CODE_THROTTLES)
 def send_verification_code(request):
     serializer = VerificationSerializer(data=request.data)
     if serializer.is_valid():
@@ -79,6 +83,7 @@ def send_verification_code(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes(VERIFY_CODE_THROTTLES)
 def verify_code(request):
     serializer = VerifyCodeSerializer(data=request.data)
     if serializer.is_valid():
@@ -133,37 +138,35 @@ def search_users(request):
     """
     Lightweight user search so providers/requesters can find each other before messaging.
     Supports filtering by user_type and provider_mode (online/offline).
+    Results are ranked by match quality and hustle score and paginated with ?cursor=.
     """
     query = request.query_params.get('q', '').strip()
     user_type = request.query_params.get('user_type')
     provider_mode = request.query_params.get('mode')
-    limit = int(request.query_params.get('limit', 20))
 
-    # Start with all users except the current user
-    qs = User.objects.exclude(id=request.user.id).select_related('profile')
+    try:
+        limit = min(max(int(request.query_params.get('limit', search.SEARCH_PAGE_SIZE)), 1), search.SEARCH_MAX_PAGE_SIZE)
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            search.decode_cursor(cursor)
+    except ValueError:
+        return Response({'error': 'Invalid limit or cursor'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Filter by search query if provided
-    if query:
-        qs = qs.filter(
-            Q(username__icontains=query) |
-            Q(email__icontains=query) |
-            Q(profile__bio__icontains=query) |
-            Q(profile__city__icontains=query)
+    try:
+        user_ids, next_cursor = search.search_users(
+            request.user, query, user_type=user_type, provider_mode=provider_mode, cursor=cursor, limit=limit
         )
+    except search.SearchNotSupported as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_501_NOT_IMPLEMENTED)
 
-    # Filter by user type
-    if user_type:
-        qs = qs.filter(user_type=user_type)
-
-    # Filter by provider mode (online/offline)
-    if provider_mode:
-        qs = qs.filter(profile__provider_mode=provider_mode)
-
-    # Order by hustle score (best providers first)
-    qs = qs.order_by('-profile__hustle_score', 'username')
+    # Load the page in rank order
+    users = User.objects.select_related('profile').in_bulk(user_ids)
+    serializer = UserSerializer([users[user_id] for user_id in user_ids if user_id in users], many=True)
 
-    serializer = UserSerializer(qs[:limit], many=True)
-    return Response({'results': serializer.data}, status=status.HTTP_200_OK)
+    next_url = None
+    if next_cursor:
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor)
+    return Response({'next': next_url, 'results': serializer.data}, status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])